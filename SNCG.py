@@ -4,6 +4,8 @@ import sys
 import os
 import re
 
+import instrument
+
 class SNGCTool:
     MAGIC_SNCG = b'SNCG'
     MAGIC_SNSC = b'SNSC'
@@ -11,9 +13,10 @@ class SNGCTool:
     SNSC_HEADER = 0x0C
     SNSC_MARK = '$'  # 有SNSC配合的标记
     
-    def __init__(self):
+    def __init__(self, indexed=False):
         self.success = 0
         self.fail = 0
+        self.indexed = indexed  # True: 解码为 P 模式 PNG（原调色板 + 原索引）
     
     def strip_number(self, filename):
         return re.sub(r'^\d+\.', '', filename)
@@ -45,6 +48,19 @@ class SNGCTool:
             palette.append((0, 0, 0))
         return palette
     
+    def tile_indices(self, pixels, t, bpp):
+        """第 t 个瓦片的 64 个调色板索引（行优先），数据不足时补 0"""
+        if bpp == 8:
+            tile = bytes(pixels[t * 64:t * 64 + 64])
+        else:
+            tile = bytes(v for byte in pixels[t * 32:t * 32 + 32] for v in (byte & 0x0F, byte >> 4))
+        return tile.ljust(64, b'\0')
+    
+    def indexed_image(self, size, indices, palette):
+        img = Image.frombytes('P', size, indices)
+        img.putpalette([v for rgb in palette for v in rgb])
+        return img
+    
     def decode_tiles(self, data, bpp, px_off, palette):
         pixels = data[px_off:]
         tiles = []
@@ -72,15 +88,24 @@ class SNGCTool:
             tiles.append(tile)
         return tiles
     
+    @instrument.timed('SNGCTool.decode_with_snsc')
     def decode_with_snsc(self, sncg_data, snsc_data):
         w_tiles_g, h_tiles_g, px_off, bpp, colors_per_pal, num_pals = self.read_sncg_header(sncg_data)
         palette = self.parse_palette(sncg_data, px_off)
-        tiles = self.decode_tiles(sncg_data, bpp, px_off, palette)
+        if self.indexed:
+            pixels = sncg_data[px_off:]
+            num_tiles = len(pixels) // (32 if bpp == 4 else 64)
+            tiles = [Image.frombytes('P', (8, 8), self.tile_indices(pixels, t, bpp)) for t in range(num_tiles)]
+        else:
+            tiles = self.decode_tiles(sncg_data, bpp, px_off, palette)
         
         snsc_w, snsc_h, tilemap_off = self.read_snsc_header(snsc_data)
         w, h = snsc_w * 8, snsc_h * 8
         
-        img = Image.new('RGB', (w, h))
+        if self.indexed:
+            img = self.indexed_image((w, h), bytes(w * h), palette)
+        else:
+            img = Image.new('RGB', (w, h))
         
         for ty in range(snsc_h):
             for tx in range(snsc_w):
@@ -102,6 +127,7 @@ class SNGCTool:
         img = img.transpose(Image.ROTATE_90)
         return img
     
+    @instrument.timed('SNGCTool.decode')
     def decode(self, data):
         if data[:4] != self.MAGIC_SNCG:
             raise ValueError('Invalid magic')
@@ -111,6 +137,16 @@ class SNGCTool:
         palette = self.parse_palette(data, px_off)
         pixels = data[px_off:]
         
+        if self.indexed:
+            indices = bytearray(w * h)
+            for t in range(w_tiles * h_tiles):
+                ty, tx = divmod(t, w_tiles)
+                tile = self.tile_indices(pixels, t, bpp)
+                for py in range(8):
+                    row = (ty * 8 + py) * w + tx * 8
+                    indices[row:row + 8] = tile[py * 8:py * 8 + 8]
+            return self.indexed_image((w, h), bytes(indices), palette).transpose(Image.ROTATE_90)
+        
         img = Image.new('RGB', (w, h))
         px = img.load()
         
@@ -136,6 +172,7 @@ class SNGCTool:
         img = img.transpose(Image.ROTATE_90)
         return img
     
+    @instrument.timed('SNGCTool.encode')
     def encode(self, img, orig_data):
         w_tiles, h_tiles, px_off, bpp, colors_per_pal, num_pals = self.read_sncg_header(orig_data)
         w, h = w_tiles * 8, h_tiles * 8
@@ -149,29 +186,39 @@ class SNGCTool:
         if num_colors > 256:
             num_colors = 256
         
-        img_p = img.convert('RGB').quantize(colors=num_colors)
-        pal = img_p.getpalette()
+        # P 模式且索引都在调色板范围内（如 -p 导出的 PNG）：直接写回索引，不量化
+        max_index = 16 if bpp == 4 else num_colors
+        if img.mode == 'P' and max(img.tobytes(), default=0) < max_index:
+            indices = img.tobytes()
+            pal = img.getpalette() or []
+        else:
+            with instrument.span('SNGCTool.quantize', colors=num_colors):
+                img_p = img.convert('RGB').quantize(colors=num_colors)
+            indices = img_p.tobytes()
+            pal = img_p.getpalette() or []
+        # 图像颜色数少于 num_colors 时调色板会被截短
+        pal = pal + [0] * (num_colors * 3 - len(pal))
         
         new_pal = bytearray()
         for i in range(num_colors):
             r, g, b = pal[i*3] >> 3, pal[i*3+1] >> 3, pal[i*3+2] >> 3
-            new_pal += struct.pack('<H', r | (g << 5) | (b << 10))
+            c = r | (g << 5) | (b << 10)
+            # 颜色未变时保留原值（含最高位）
+            orig = struct.unpack_from('<H', orig_data, self.SNCG_HEADER + i*2)[0]
+            if orig & 0x7FFF == c:
+                c = orig
+            new_pal += struct.pack('<H', c)
         
-        img_data = list(img_p.getdata())
         new_px = bytearray()
-        
         for ty in range(h_tiles):
             for tx in range(w_tiles):
-                if bpp == 8:
-                    for py in range(8):
-                        for ppx in range(8):
-                            new_px.append(img_data[(ty*8 + py) * w + tx*8 + ppx])
-                else:
-                    for py in range(8):
-                        for ppx in range(0, 8, 2):
-                            c1 = img_data[(ty*8 + py) * w + tx*8 + ppx] & 0x0F
-                            c2 = img_data[(ty*8 + py) * w + tx*8 + ppx + 1] & 0x0F
-                            new_px.append(c1 | (c2 << 4))
+                for py in range(8):
+                    row = (ty*8 + py) * w + tx*8
+                    if bpp == 8:
+                        new_px += indices[row:row + 8]
+                    else:
+                        new_px += bytes((indices[row + ppx] & 0x0F) | ((indices[row + ppx + 1] & 0x0F) << 4)
+                                        for ppx in range(0, 8, 2))
         
         return orig_data[:self.SNCG_HEADER] + new_pal + new_px
     
@@ -204,6 +251,36 @@ class SNGCTool:
         
         return sorted(matches, key=lambda x: self.strip_number(x[0]))
     
+    def decode_images(self, sncg_name, sncg_data, snsc_list):
+        """
+        按输出命名规则解码，返回 [(相对输出路径, Image)]。
+        snsc_list: [(SNSC文件名, SNSC数据)]，顺序同 find_snsc_files
+        """
+        if len(snsc_list) > 1:
+            # 多表情: 创建文件夹
+            folder_name = self.SNSC_MARK + sncg_name
+            return [(os.path.join(folder_name, snsc_name + '.png'), self.decode_with_snsc(sncg_data, snsc_data))
+                    for snsc_name, snsc_data in snsc_list]
+        if len(snsc_list) == 1:
+            # 单个SNSC: 加$标记
+            return [(self.SNSC_MARK + sncg_name + '.png', self.decode_with_snsc(sncg_data, snsc_list[0][1]))]
+        # 无SNSC: 无标记
+        return [(sncg_name + '.png', self.decode(sncg_data))]
+    
+    def find_png(self, png_dir, sncg_name):
+        """decode_images 的反向查找：返回 SNCG 对应的 PNG 路径（多表情取第一张），找不到时返回 None"""
+        for name in (sncg_name + '.png', self.SNSC_MARK + sncg_name + '.png'):
+            path = os.path.join(png_dir, name)
+            if os.path.isfile(path):
+                return path
+        folder = os.path.join(png_dir, self.SNSC_MARK + sncg_name)
+        if os.path.isdir(folder):
+            pngs = sorted(f for f in os.listdir(folder) if f.endswith('.png'))
+            if pngs:
+                return os.path.join(folder, pngs[0])
+        return None
+    
+    @instrument.timed('SNGCTool.decode_file')
     def decode_file(self, src, dst_dir, dir_files, rel_path=''):
         sncg_name = os.path.basename(src)
         
@@ -211,42 +288,14 @@ class SNGCTool:
             with open(src, 'rb') as f:
                 sncg_data = f.read()
             
-            snsc_files = self.find_snsc_files(sncg_name, dir_files)
-            
-            if len(snsc_files) > 1:
-                # 多表情: 创建文件夹
-                folder_name = self.SNSC_MARK + sncg_name
-                out_folder = os.path.join(dst_dir, rel_path, folder_name)
-                os.makedirs(out_folder, exist_ok=True)
-                
-                for snsc_name_f, snsc_path in snsc_files:
-                    with open(snsc_path, 'rb') as f:
-                        snsc_data = f.read()
-                    img = self.decode_with_snsc(sncg_data, snsc_data)
-                    out_path = os.path.join(out_folder, snsc_name_f + '.png')
-                    img.save(out_path)
-                    self.success += 1
-                
-            elif len(snsc_files) == 1:
-                # 单个SNSC: 加$标记
-                out_dir = os.path.join(dst_dir, rel_path)
-                os.makedirs(out_dir, exist_ok=True)
-                
-                snsc_name_f, snsc_path = snsc_files[0]
+            snsc_list = []
+            for snsc_name_f, snsc_path in self.find_snsc_files(sncg_name, dir_files):
                 with open(snsc_path, 'rb') as f:
-                    snsc_data = f.read()
-                img = self.decode_with_snsc(sncg_data, snsc_data)
-                out_path = os.path.join(out_dir, self.SNSC_MARK + sncg_name + '.png')
-                img.save(out_path)
-                self.success += 1
-                
-            else:
-                # 无SNSC: 无标记
-                out_dir = os.path.join(dst_dir, rel_path)
-                os.makedirs(out_dir, exist_ok=True)
-                
-                img = self.decode(sncg_data)
-                out_path = os.path.join(out_dir, sncg_name + '.png')
+                    snsc_list.append((snsc_name_f, f.read()))
+            
+            for out_name, img in self.decode_images(sncg_name, sncg_data, snsc_list):
+                out_path = os.path.join(dst_dir, rel_path, out_name)
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
                 img.save(out_path)
                 self.success += 1
                 
@@ -254,6 +303,7 @@ class SNGCTool:
             print(f'[NG] {src}: {e}')
             self.fail += 1
     
+    @instrument.timed('SNGCTool.encode_file')
     def encode_file(self, png_path, orig_dir, dst_dir, rel_path=''):
         png_name = os.path.basename(png_path)
         
@@ -292,6 +342,7 @@ class SNGCTool:
             print(f'[NG] {png_path}: {e}')
             self.fail += 1
     
+    @instrument.timed('SNGCTool.encode_folder')
     def encode_folder(self, folder_path, orig_dir, dst_dir, rel_path=''):
         # 处理表情文件夹
         folder_name = os.path.basename(folder_path)
@@ -373,20 +424,27 @@ class SNGCTool:
         print(f'\nDone: {self.success} ok, {self.fail} failed')
 
 def main():
+    instrument.setup_from_argv()
     if len(sys.argv) < 2:
         print('SNCG/SNSC Tool')
         print('')
         print('Usage:')
-        print('  Decode: python sncg_tool.py d <input_dir> <output_dir>')
+        print('  Decode: python sncg_tool.py d <input_dir> <output_dir> [-p]')
         print('  Encode: python sncg_tool.py e <png_dir> <orig_dir> <output_dir>')
         print('')
         print('Output naming:')
         print('  $folder/  - Multiple expressions (with SNSC)')
         print('  $file.png - Single expression (with SNSC)')
         print('  file.png  - No SNSC')
+        print('')
+        print('  -p: save palette-indexed PNGs (original palette and indices);')
+        print('      encode writes such PNGs back without quantizing')
         return
     
-    tool = SNGCTool()
+    indexed = '-p' in sys.argv[2:]
+    if indexed:
+        sys.argv.remove('-p')
+    tool = SNGCTool(indexed)
     mode = sys.argv[1].lower()
     
     if mode == 'd' and len(sys.argv) >= 4:
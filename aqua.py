@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统一入口：各工具的子命令 + 单进程 build 流水线
+Usage:
+    python aqua.py unpack <dat_folder> <output_folder> [选择器...]
+    python aqua.py unpack inspect <.dat文件或文件夹> [--verify] [--jobs N]
+    python aqua.py pack   <input_folder> <output_folder> [--budget <字节数|原.dat文件夹>]
+    python aqua.py pack   <input_folder> --estimate [--check] [--budget ...]
+    python aqua.py asm    e|w|s ...
+    python aqua.py dat    e|w ...
+    python aqua.py sncg   d|e ...
+    python aqua.py gfx    e|w ...
+    python aqua.py xref   build|label|flag|func|cond|file|find ...
+    python aqua.py font   [--nftr] [--scan <dir>] [--verify]
+    python aqua.py browse <dat_folder> [--port 8000] [--cache-mb 128]
+    python aqua.py patch  d|a|i ...
+    python aqua.py text   e|w ...
+    python aqua.py profile <脚本目录> [hist|op|ngram|cooc ...] [--cache profile.npz]
+    python aqua.py build  <dat_folder> <edit_folder> <output_folder>
+任意命令后加 --trace <文件> 记录各阶段耗时（见 instrument.py）
+
+build: 以原 .dat 为底，直接在内存中 解压 -> 汇编/编码 -> 压缩 -> 封包，不落地中间文件。
+edit_folder 的结构与 dat e / unpack + sncg d 的输出一致:
+    <edit_folder>/<封包名>/<序号>.<名称>.asm       脚本 (_DAT)
+    <edit_folder>/<封包名>/<序号>.<名称>.png       图像 (_SNCG，无SNSC)
+    <edit_folder>/<封包名>/$<序号>.<名称>.png      图像 (_SNCG，单个SNSC)
+    <edit_folder>/<封包名>/$<序号>.<名称>/*.png    图像 (_SNCG，多个SNSC，取第一张)
+内容与原成员相同的文件不重新压缩；没有对应编辑目录的封包直接复制。
+"""
+
+import os
+import runpy
+import shutil
+import sys
+from pathlib import Path
+
+# 子命令 -> 模块（按需导入，只用到脚本工具时不会加载 PIL）
+TOOLS = {
+    'unpack': 'unpack',
+    'pack': 'pack',
+    'asm': 'diasm',
+    'dat': 'dat_script',
+    'sncg': 'SNCG',
+    'xref': 'xref',
+    'font': 'font',
+    'gfx': 'dat_sncg',
+    'browse': 'browser',
+    'patch': 'script_patch',
+    'text': 'text_inject',
+    'profile': 'script_profile',
+}
+
+class BuildPipeline:
+    """build 模式的共享状态：汇编器/SNCG工具只创建一次，统计替换与跳过数量"""
+
+    def __init__(self, edit_folder):
+        self.edit_folder = Path(edit_folder)
+        self._assembler = None
+        self._sncg = None
+        self.replaced = 0
+        self.unchanged = 0
+
+    @property
+    def assembler(self):
+        if self._assembler is None:
+            from diasm import ScriptAssembler
+            self._assembler = ScriptAssembler()
+        return self._assembler
+
+    @property
+    def sncg(self):
+        if self._sncg is None:
+            from SNCG import SNGCTool
+            self._sncg = SNGCTool()
+        return self._sncg
+
+    def build_member(self, edit_dir, i, name, member):
+        """返回新的未压缩数据；无编辑或内容未变时返回 None"""
+        from dat_script import is_script_name
+        from diasm import convert_dat_to_asm_name
+        from unpack import decompress_cm
+
+        if not name:
+            return None
+        member_name = f"{i}.{name}"
+
+        if is_script_name(name):
+            asm_file = edit_dir / convert_dat_to_asm_name(member_name)
+            if not asm_file.is_file():
+                return None
+            raw = self.assembler.assemble(str(asm_file))
+        elif name.endswith('_SNCG'):
+            png = self.sncg.find_png(str(edit_dir), member_name)
+            if png is None:
+                return None
+            from PIL import Image
+            with Image.open(png) as img:
+                raw = self.sncg.encode(img, decompress_cm(member))
+        else:
+            return None
+
+        # 压缩是最慢的一步，内容未改动的成员保留原压缩数据
+        if raw == decompress_cm(member):
+            self.unchanged += 1
+            return None
+        self.replaced += 1
+        return raw
+
+    def build_dat(self, dat_file, output_folder):
+        from pack import create_header_file, repack_dat
+        from unpack import parse_header_file
+
+        dat_file = Path(dat_file)
+        h_file = dat_file.with_suffix('.h')
+        out_dat = Path(output_folder) / dat_file.name
+        out_h = out_dat.with_suffix('.h')
+        edit_dir = self.edit_folder / dat_file.stem
+
+        if not edit_dir.is_dir():
+            shutil.copyfile(dat_file, out_dat)
+            if h_file.exists():
+                shutil.copyfile(h_file, out_h)
+            return 0
+
+        with open(dat_file, 'rb') as f:
+            data = f.read()
+        name_mapping = parse_header_file(str(h_file))
+
+        before = self.replaced
+        output_data = repack_dat(data, name_mapping,
+                                 lambda i, name, member: self.build_member(edit_dir, i, name, member))
+        with open(out_dat, 'wb') as f:
+            f.write(output_data)
+        if name_mapping:
+            create_header_file(str(out_h), {name: i for i, name in name_mapping.items()})
+        return self.replaced - before
+
+def build(dat_folder, edit_folder, output_folder):
+    os.makedirs(output_folder, exist_ok=True)
+    pipeline = BuildPipeline(edit_folder)
+    for dat_file in sorted(Path(dat_folder).glob('*.dat')):
+        try:
+            count = pipeline.build_dat(dat_file, output_folder)
+            print(f"{dat_file.name}: {count}")
+        except Exception as e:
+            print(f"{dat_file.name}: {e}")
+    print(f"替换: {pipeline.replaced} | 未改动: {pipeline.unchanged}")
+
+def run_tool(module, args):
+    """以 __main__ 身份运行原工具脚本，参数与单独调用时相同"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    if here not in sys.path:
+        sys.path.insert(0, here)
+    sys.argv = [module + '.py'] + args
+    runpy.run_module(module, run_name='__main__', alter_sys=True)
+
+def main():
+    import instrument
+    instrument.setup_from_argv()
+    command = sys.argv[1].lower() if len(sys.argv) > 1 else ''
+
+    if command == 'build' and len(sys.argv) == 5:
+        build(sys.argv[2], sys.argv[3], sys.argv[4])
+    elif command in TOOLS:
+        run_tool(TOOLS[command], sys.argv[2:])
+    else:
+        print(__doc__.strip())
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+各工具的吞吐基准（全部使用随机生成的数据，不需要游戏文件）
+Usage:
+    python bench.py [结果.json] [--baseline 基准.json] [--tolerance 0.15] [--only 名称,...] [--quick]
+
+结果 JSON 记录每项的 MB/s 与单项耗时；给出 --baseline 时与之比较，
+MB/s 低于基准 (1 - tolerance) 倍的项标记为退化，退出码为 1。
+"""
+
+import json
+import os
+import platform
+import random
+import struct
+import sys
+import tempfile
+import time
+
+from diasm import CHUNK_SIZE, OPCODES, TEXT_LAYOUTS, TEXT_OFFSET, ScriptAssembler, ScriptDisassembler
+from pack import compress_cm, compress_cm_fast, compress_cm_lazy, compress_cm_optimal
+from unpack import decompress_cm
+
+SEED = 0x5EED
+DEFAULT_TOLERANCE = 0.15
+
+# 常用字（平假名 + 常用汉字），用于生成脚本文本
+SAMPLE_TEXT = ("あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+               "、。！？「」……私は彼女の手を取った。世界が少しだけ変わった気がする。")
+
+# ================= 合成数据 =================
+
+def make_script(rng, chunks):
+    """生成可反汇编/汇编往返的脚本：常见指令 + UTF-16LE 文本"""
+    # 重名指令（如 NEXT 0x02/0x03）汇编时只会得到其中一个，排除另一个以保证往返一致
+    mnemonic_to_opcode = ScriptAssembler().mnemonic_to_opcode
+    ops = [op for op in OPCODES if op < 0x40 and mnemonic_to_opcode[OPCODES[op][0]] == op]
+    text_ops = [op for op in ops if OPCODES[op][1]]
+    buf = bytearray()
+    for _ in range(chunks):
+        op = rng.choice(text_ops) if rng.random() < 0.4 else rng.choice(ops)
+        _, segments, enabled = OPCODES[op]
+        args = [rng.randrange(0, 2000) if on else 0 for on in enabled]
+        chunk = bytearray(CHUNK_SIZE)
+        for offset, size in TEXT_LAYOUTS[segments]:
+            n = rng.randrange(4, size // 2 - 1)
+            start = rng.randrange(len(SAMPLE_TEXT) - n) if n < len(SAMPLE_TEXT) else 0
+            encoded = SAMPLE_TEXT[start:start + n].encode('utf-16-le')[:size - 2]
+            chunk[TEXT_OFFSET + offset:TEXT_OFFSET + offset + len(encoded)] = encoded
+            if op == 0x01:
+                args[0] = len(encoded) // 2
+        struct.pack_into('<Iiii', chunk, 0, op, *args)
+        if OPCODES[op][0] == 'MSG_SHOW_EX':
+            # 0x08 起为4个头像ID，汇编时固定写 -1
+            struct.pack_into('<4i', chunk, 8, -1, -1, -1, -1)
+        buf += chunk
+    return bytes(buf)
+
+def make_sncg(rng, w_tiles, h_tiles, bpp):
+    """生成 SNCG：头 + 随机 BGR555 调色板 + 按瓦片排列的像素"""
+    colors = 16 if bpp == 4 else 256
+    px_off = 0x10 + colors * 2
+    header = b'SNCG' + struct.pack('<HHHHH', colors, 1, w_tiles, h_tiles, px_off) + b'\0\0'
+    palette = bytes(rng.getrandbits(8) for _ in range(colors * 2))
+    tile_bytes = 32 if bpp == 4 else 64
+    # 块状图案，比纯随机更接近实际图像
+    pixels = bytearray()
+    for _ in range(w_tiles * h_tiles):
+        base = rng.randrange(256)
+        pixels += bytes((base + rng.randrange(4)) & 0xFF for _ in range(tile_bytes))
+    return header + palette + bytes(pixels)
+
+def make_snsc(rng, w_tiles, h_tiles, num_tiles):
+    entries = (rng.randrange(num_tiles) | (rng.getrandbits(2) << 10) for _ in range(w_tiles * h_tiles))
+    body = b''.join(struct.pack('<H', e) for e in entries)
+    # 0x08/0x0A 为宽/高（瓦片数），0x0C 起为映射表
+    return b'SNSC' + struct.pack('<IHH', 0, w_tiles, h_tiles) + body
+
+# ================= 基准项 =================
+# 每项: 名称 -> setup(rng, scale) 返回 (调用函数, 处理字节数, 单项数)
+
+def case_cm_compress(rng, scale):
+    # compress_cm 为纯Python窗口搜索，数据量取小
+    data = make_script(rng, 4 * scale)
+    return (lambda: compress_cm(data)), len(data), 1
+
+def case_cm_compress_fast(rng, scale):
+    data = make_script(rng, 64 * scale)
+    return (lambda: compress_cm_fast(data)), len(data), 1
+
+def case_cm_compress_lazy(rng, scale):
+    data = make_script(rng, 64 * scale)
+    return (lambda: compress_cm_lazy(data)), len(data), 1
+
+def case_cm_compress_optimal(rng, scale):
+    data = make_script(rng, 16 * scale)
+    return (lambda: compress_cm_optimal(data)), len(data), 1
+
+def case_cm_decompress(rng, scale):
+    data = make_script(rng, 64 * scale)
+    packed = compress_cm(data)
+    return (lambda: decompress_cm(packed)), len(data), 1
+
+def case_disasm_export(rng, scale):
+    data = make_script(rng, 128 * scale)
+    path = os.path.join(tempfile.gettempdir(), 'bench_export.asm')
+    return (lambda: ScriptDisassembler(data).export(path)), len(data), len(data) // CHUNK_SIZE
+
+def case_asm_assemble(rng, scale):
+    data = make_script(rng, 128 * scale)
+    path = os.path.join(tempfile.gettempdir(), 'bench_assemble.asm')
+    ScriptDisassembler(data).export(path)
+    assembler = ScriptAssembler()
+    return (lambda: assembler.assemble(path)), len(data), len(data) // CHUNK_SIZE
+
+def _sncg_tool(indexed=False):
+    from SNCG import SNGCTool
+    return SNGCTool(indexed)
+
+def case_sncg_decode_4bpp(rng, scale):
+    data = make_sncg(rng, 32, 8 * scale, 4)
+    tool = _sncg_tool()
+    return (lambda: tool.decode(data)), len(data), 1
+
+def case_sncg_decode_8bpp(rng, scale):
+    data = make_sncg(rng, 32, 8 * scale, 8)
+    tool = _sncg_tool()
+    return (lambda: tool.decode(data)), len(data), 1
+
+def case_sncg_encode_8bpp(rng, scale):
+    data = make_sncg(rng, 32, 8 * scale, 8)
+    tool = _sncg_tool()
+    img = tool.decode(data)
+    return (lambda: tool.encode(img, data)), len(data), 1
+
+def case_sncg_decode_indexed(rng, scale):
+    data = make_sncg(rng, 32, 8 * scale, 8)
+    tool = _sncg_tool(indexed=True)
+    return (lambda: tool.decode(data)), len(data), 1
+
+def case_sncg_encode_indexed(rng, scale):
+    data = make_sncg(rng, 32, 8 * scale, 8)
+    tool = _sncg_tool(indexed=True)
+    img = tool.decode(data)
+    return (lambda: tool.encode(img, data)), len(data), 1
+
+def case_snsc_decode(rng, scale):
+    w_tiles, h_tiles = 32, 8 * scale
+    sncg = make_sncg(rng, 16, 16, 4)
+    snsc = make_snsc(rng, w_tiles, h_tiles, 256)
+    tool = _sncg_tool()
+    return (lambda: tool.decode_with_snsc(sncg, snsc)), len(sncg) + len(snsc), 1
+
+def case_font_glyph(rng, scale):
+    import font
+    cfg = dict(font.CONFIG)
+    fnt = font.load_font(cfg)
+    chars = rng.sample(SAMPLE_TEXT, min(len(SAMPLE_TEXT), 16 * scale))
+    def run():
+        for char in chars:
+            font.process_glyph(char, fnt, cfg)
+    return run, len(chars) * cfg['box_w'] * cfg['box_h'], len(chars)
+
+CASES = {
+    'cm_compress': case_cm_compress,
+    'cm_compress_fast': case_cm_compress_fast,
+    'cm_compress_lazy': case_cm_compress_lazy,
+    'cm_compress_optimal': case_cm_compress_optimal,
+    'cm_decompress': case_cm_decompress,
+    'disasm_export': case_disasm_export,
+    'asm_assemble': case_asm_assemble,
+    'sncg_decode_4bpp': case_sncg_decode_4bpp,
+    'sncg_decode_8bpp': case_sncg_decode_8bpp,
+    'sncg_encode_8bpp': case_sncg_encode_8bpp,
+    'sncg_decode_indexed': case_sncg_decode_indexed,
+    'sncg_encode_indexed': case_sncg_encode_indexed,
+    'snsc_decode': case_snsc_decode,
+    'font_glyph': case_font_glyph,
+}
+
+# ================= 计时与比较 =================
+
+def time_case(func, repeat, min_time=0.2):
+    """预热一次后重复计时，取最短一次（受干扰最小）"""
+    func()
+    best = float('inf')
+    runs = 0
+    start = time.perf_counter()
+    while runs < repeat or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+        runs += 1
+        if runs >= repeat * 10:
+            break
+    return best, runs
+
+def run_benchmarks(names, quick=False):
+    scale, repeat = (1, 3) if quick else (4, 5)
+    results = {}
+    for name in names:
+        rng = random.Random(f"{SEED}:{name}")
+        try:
+            func, nbytes, items = CASES[name](rng, scale)
+        except ImportError as e:
+            print(f"{name:<20} 跳过 ({e})")
+            continue
+        try:
+            best, runs = time_case(func, repeat)
+        except Exception as e:
+            print(f"{name:<20} 失败 ({type(e).__name__}: {e})")
+            continue
+        results[name] = {
+            'mb_s': nbytes / best / 1e6,
+            'item_ms': best * 1000 / items,
+            'bytes': nbytes,
+            'items': items,
+            'runs': runs,
+        }
+        r = results[name]
+        print(f"{name:<20} {r['mb_s']:10.3f} MB/s {r['item_ms']:10.3f} ms/项 ({items} 项, {nbytes} 字节)")
+    return results
+
+def compare(results, baseline, tolerance):
+    """返回退化项 [(名称, 当前MB/s, 基准MB/s)]"""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get('cases', {}).get(name)
+        if not base:
+            continue
+        ratio = r['mb_s'] / base['mb_s']
+        mark = '退化' if ratio < 1 - tolerance else ''
+        print(f"{name:<20} {ratio:6.2f}x {mark}")
+        if mark:
+            regressions.append((name, r['mb_s'], base['mb_s']))
+    return regressions
+
+def main():
+    args = sys.argv[1:]
+    out_path = baseline_path = None
+    tolerance = DEFAULT_TOLERANCE
+    names = list(CASES)
+    quick = False
+
+    while args:
+        arg = args.pop(0)
+        if arg == '--baseline' and args:
+            baseline_path = args.pop(0)
+        elif arg == '--tolerance' and args:
+            tolerance = float(args.pop(0))
+        elif arg == '--only' and args:
+            names = [n for n in args.pop(0).split(',') if n]
+        elif arg == '--quick':
+            quick = True
+        elif not arg.startswith('-') and out_path is None:
+            out_path = arg
+        else:
+            print(__doc__.strip())
+            sys.exit(1)
+
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        print(f"未知基准: {', '.join(unknown)} (可选: {', '.join(CASES)})")
+        sys.exit(1)
+
+    results = run_benchmarks(names, quick)
+
+    if out_path:
+        report = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'quick': quick,
+            'cases': results,
+        }
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"结果: {out_path}")
+
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n对比基准: {baseline_path} (容差 {tolerance:.0%})")
+        regressions = compare(results, baseline, tolerance)
+        if regressions:
+            print(f"退化: {len(regressions)} 项")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地素材浏览服务：直接读取 .dat 封包，按需解码，不需要先解包
+Usage:
+    python browser.py <dat_folder> [--port 8000] [--cache-mb 128]
+
+只监听 127.0.0.1，且拒绝 Host 不是本机的请求（防止 DNS rebinding），不访问外网。
+    /                           封包列表
+    /<封包>.dat/                成员列表（序号、名称、大小、魔数）
+    /<封包>.dat/<序号>.png      SNCG 图像；有配对的 SNSC 时用 ?snsc=<序号> 选择，默认第一个
+    /<封包>.dat/<序号>.asm      脚本反汇编文本（与 diasm.py e 的输出相同）
+    /<封包>.dat/<序号>.bin      解压后的原始数据
+解码结果按成员内容哈希放入 LRU 缓存（按字节数限制），内容相同的成员跨封包共用。
+"""
+
+import hashlib
+import html
+import io
+import mmap
+import sys
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import instrument
+from SNCG import SNGCTool
+from dat_sncg import member_file_name
+from dat_script import is_script_name
+from diasm import CHUNK_SIZE, ScriptDisassembler
+from unpack import decompress_cm, inspect_dat_file
+
+HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+DEFAULT_CACHE_MB = 128
+
+class LRUCache:
+    """按值的总字节数限制大小的 LRU，多线程共用"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.items[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self.items.popitem(last=False)
+                self.size -= len(evicted)
+
+class Archive:
+    """mmap 打开的 .dat：打开时只读索引与各成员 CM 头部，成员数据按需切出"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.rows = inspect_dat_file(str(self.path))
+        self._file = open(self.path, 'rb')
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.sncg = {}
+        self.snsc = {}
+        for i, name, _, _, _, magic in self.rows:
+            if magic == 'SNCG':
+                self.sncg[member_file_name(i, name)] = i
+            elif magic == 'SNSC':
+                self.snsc[member_file_name(i, name)] = i
+
+    def member(self, i):
+        _, _, start, end, out_len, _ = self.rows[i]
+        if out_len is None:
+            raise KeyError(i)
+        return self.mm[start:end]
+
+    def close(self):
+        self.mm.close()
+        self._file.close()
+
+class AssetBrowser:
+    """HTTP 处理之外的全部逻辑：封包按需打开，解码结果走缓存"""
+
+    def __init__(self, dat_folder, cache_bytes):
+        self.paths = {p.name: p for p in sorted(Path(dat_folder).glob('*.dat'))}
+        self.archives = {}
+        self.lock = threading.Lock()
+        self.cache = LRUCache(cache_bytes)
+        self.sncg = SNGCTool(indexed=True)
+
+    def archive(self, name):
+        with self.lock:
+            if name not in self.archives:
+                self.archives[name] = Archive(self.paths[name])
+            return self.archives[name]
+
+    def cached(self, key, build):
+        value = self.cache.get(key)
+        if value is None:
+            value = build()
+            self.cache.put(key, value)
+        return value
+
+    @staticmethod
+    def member_hash(member):
+        return hashlib.blake2b(member, digest_size=16).hexdigest()
+
+    def raw(self, archive, i):
+        member = archive.member(i)
+        return self.cached((self.member_hash(member), 'bin'), lambda: decompress_cm(member))
+
+    def snsc_choices(self, archive, i):
+        """成员 i 对应的 [(SNSC 成员名, 序号)]，规则同 SNCG.py"""
+        sncg_name = member_file_name(i, archive.rows[i][1])
+        return self.sncg.find_snsc_files(sncg_name, archive.snsc)
+
+    def render_png(self, archive, i, snsc_index=None):
+        choices = self.snsc_choices(archive, i)
+        if snsc_index is None and choices:
+            snsc_index = choices[0][1]
+        if snsc_index is not None and snsc_index not in [j for _, j in choices]:
+            raise KeyError(snsc_index)
+
+        member = archive.member(i)
+        snsc_hash = self.member_hash(archive.member(snsc_index)) if snsc_index is not None else ''
+
+        def build():
+            sncg_data = self.raw(archive, i)
+            if sncg_data[:4] != SNGCTool.MAGIC_SNCG:
+                raise KeyError(i)
+            if snsc_index is None:
+                img = self.sncg.decode(sncg_data)
+            else:
+                img = self.sncg.decode_with_snsc(sncg_data, self.raw(archive, snsc_index))
+            buf = io.BytesIO()
+            img.save(buf, 'PNG')
+            return buf.getvalue()
+
+        return self.cached((self.member_hash(member), 'png', snsc_hash), build)
+
+    def render_asm(self, archive, i):
+        member = archive.member(i)
+
+        def build():
+            raw = self.raw(archive, i)
+            if not raw or len(raw) % CHUNK_SIZE:
+                raise KeyError(i)
+            return ScriptDisassembler(raw).to_text().encode('utf-8')
+
+        return self.cached((self.member_hash(member), 'asm'), build)
+
+    def index_page(self):
+        rows = ''.join(f'<li><a href="{quote(name)}/">{html.escape(name)}</a></li>' for name in self.paths)
+        return _page('封包', f'<ul>{rows}</ul>')
+
+    def archive_page(self, name):
+        archive = self.archive(name)
+        lines = []
+        for i, member_name, start, end, out_len, magic in archive.rows:
+            links = []
+            if out_len is not None:
+                links.append(f'<a href="{i}.bin">bin</a>')
+                if magic == 'SNCG':
+                    choices = self.snsc_choices(archive, i)
+                    links += [f'<a href="{i}.png?snsc={j}">{html.escape(snsc_name)}</a>' for snsc_name, j in choices]
+                    if not choices:
+                        links.append(f'<a href="{i}.png">png</a>')
+                elif is_script_name(member_name) and out_len % CHUNK_SIZE == 0:
+                    links.append(f'<a href="{i}.asm">asm</a>')
+            lines.append(f'<tr><td>{i}</td><td>{html.escape(member_name)}</td><td>{end - start}</td>'
+                         f'<td>{out_len if out_len is not None else ""}</td>'
+                         f'<td>{html.escape(magic or "")}</td><td>{" ".join(links)}</td></tr>')
+        table = ('<table><tr><th>序号</th><th>名称</th><th>压缩</th><th>解压</th><th>魔数</th><th></th></tr>'
+                 + ''.join(lines) + '</table>')
+        return _page(name, f'<p><a href="../">返回</a></p>{table}')
+
+    def stats(self):
+        c = self.cache
+        return f"缓存 {len(c.items)} 项 {c.size / 1e6:.1f} MB | 命中 {c.hits} 未命中 {c.misses}"
+
+def _page(title, body):
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+            '<style>body{font-family:sans-serif}td,th{padding:2px 8px;text-align:left}</style>'
+            f'</head><body><h1>{html.escape(title)}</h1>{body}</body></html>').encode('utf-8')
+
+class BrowserHandler(BaseHTTPRequestHandler):
+    server_version = 'AssetBrowser'
+
+    def do_GET(self):
+        host = (self.headers.get('Host') or '').rsplit(':', 1)[0]
+        if host not in ('127.0.0.1', 'localhost'):
+            self.send_error(HTTPStatus.FORBIDDEN, 'localhost only')
+            return
+
+        browser = self.server.browser
+        url = urlsplit(self.path)
+        parts = [unquote(p) for p in url.path.split('/') if p]
+        try:
+            with instrument.span('browser.request', path=url.path):
+                if not parts:
+                    self.reply(browser.index_page(), 'text/html; charset=utf-8')
+                elif parts[0] not in browser.paths:
+                    self.send_error(HTTPStatus.NOT_FOUND)
+                elif len(parts) == 1:
+                    if not url.path.endswith('/'):
+                        self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+                        self.send_header('Location', url.path + '/')
+                        self.end_headers()
+                    else:
+                        self.reply(browser.archive_page(parts[0]), 'text/html; charset=utf-8')
+                elif len(parts) == 2:
+                    self.serve_member(browser, browser.archive(parts[0]), parts[1], parse_qs(url.query))
+                else:
+                    self.send_error(HTTPStatus.NOT_FOUND)
+        except (KeyError, IndexError, ValueError):
+            self.send_error(HTTPStatus.NOT_FOUND)
+        except Exception as e:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f'{type(e).__name__}: {e}')
+
+    def serve_member(self, browser, archive, filename, query):
+        stem, _, ext = filename.partition('.')
+        i = int(stem)
+        if ext == 'png':
+            snsc = int(query['snsc'][0]) if 'snsc' in query else None
+            self.reply(browser.render_png(archive, i, snsc), 'image/png')
+        elif ext == 'asm':
+            self.reply(browser.render_asm(archive, i), 'text/plain; charset=utf-8')
+        elif ext == 'bin':
+            self.reply(browser.raw(archive, i), 'application/octet-stream')
+        else:
+            self.send_error(HTTPStatus.NOT_FOUND)
+
+    def reply(self, body, content_type):
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+def serve(dat_folder, port=DEFAULT_PORT, cache_mb=DEFAULT_CACHE_MB):
+    browser = AssetBrowser(dat_folder, cache_mb * 1024 * 1024)
+    server = ThreadingHTTPServer((HOST, port), BrowserHandler)
+    server.browser = browser
+    print(f"http://{HOST}:{server.server_port}/ ({len(browser.paths)} 个封包，Ctrl+C 退出)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(browser.stats())
+        for archive in browser.archives.values():
+            archive.close()
+
+def main():
+    instrument.setup_from_argv()
+    args = sys.argv[1:]
+    folder = None
+    port, cache_mb = DEFAULT_PORT, DEFAULT_CACHE_MB
+
+    while args:
+        arg = args.pop(0)
+        if arg == '--port' and args:
+            port = int(args.pop(0))
+        elif arg == '--cache-mb' and args:
+            cache_mb = int(args.pop(0))
+        elif not arg.startswith('-') and folder is None:
+            folder = arg
+        else:
+            folder = None
+            break
+
+    if folder is None:
+        print(__doc__.strip())
+        sys.exit(1)
+    serve(folder, port, cache_mb)
+
+if __name__ == '__main__':
+    main()
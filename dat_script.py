@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+.dat封包 <-> .asm 直通工具（脚本成员在内存中解压/压缩，不落地中间文件）
+Usage:
+    python dat_script.py e <dat_folder> <asm_folder>
+    python dat_script.py w <dat_folder> <asm_folder> <output_folder>
+
+asm目录结构与 unpack.py + diasm.py e 的输出一致:
+    <asm_folder>/<封包名>/<序号>.<名称>.asm
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from diasm import (CHUNK_SIZE, ScriptAssembler, ScriptDisassembler,
+                   convert_dat_to_asm_name)
+from pack import create_header_file, repack_dat
+from unpack import decompress_cm, parse_header_file, read_dat_index
+
+def is_script_name(name) -> bool:
+    return bool(name) and name.endswith('_DAT')
+
+def extract_dat_scripts(dat_file_path, output_dir) -> int:
+    """把.dat中的脚本成员直接反汇编为.asm，返回导出数量"""
+    with open(dat_file_path, 'rb') as f:
+        data = f.read()
+
+    base_name = os.path.splitext(dat_file_path)[0]
+    name_mapping = parse_header_file(base_name + '.h')
+    output_folder = Path(output_dir) / os.path.basename(base_name)
+
+    exported = 0
+    for i, (start, end) in enumerate(read_dat_index(data)):
+        name = name_mapping.get(i)
+        if not is_script_name(name) or start >= end:
+            continue
+
+        member_name = f"{i}.{name}"
+        try:
+            raw = decompress_cm(data[start:end])
+            if len(raw) == 0 or len(raw) % CHUNK_SIZE != 0:
+                print(f"{dat_file_path}: {member_name}")
+                continue
+
+            output_folder.mkdir(parents=True, exist_ok=True)
+            ScriptDisassembler(raw).export(str(output_folder / convert_dat_to_asm_name(member_name)))
+            exported += 1
+        except Exception as e:
+            print(f"{dat_file_path}: {member_name} - {e}")
+
+    return exported
+
+def pack_dat_scripts(dat_file_path, asm_dir, dat_output_path) -> int:
+    """以原.dat为底，用asm_dir中的.asm替换脚本成员，其余成员原样保留。返回替换数量"""
+    with open(dat_file_path, 'rb') as f:
+        data = f.read()
+
+    base_name = os.path.splitext(dat_file_path)[0]
+    name_mapping = parse_header_file(base_name + '.h')
+    asm_path = Path(asm_dir)
+    assembler = ScriptAssembler()
+    replaced = 0
+
+    def transform(i, name, member):
+        nonlocal replaced
+        if not is_script_name(name):
+            return None
+        asm_file = asm_path / convert_dat_to_asm_name(f"{i}.{name}")
+        if not asm_file.exists():
+            return None
+        replaced += 1
+        return assembler.assemble(str(asm_file))
+
+    output_data = repack_dat(data, name_mapping, transform)
+    with open(dat_output_path, 'wb') as f:
+        f.write(output_data)
+
+    h_output_path = os.path.splitext(dat_output_path)[0] + '.h'
+    if name_mapping and os.path.abspath(h_output_path) != os.path.abspath(base_name + '.h'):
+        create_header_file(h_output_path, {name: i for i, name in name_mapping.items()})
+
+    return replaced
+
+def process_extract(dat_folder, asm_folder):
+    for dat_file in sorted(Path(dat_folder).glob('*.dat')):
+        try:
+            count = extract_dat_scripts(str(dat_file), asm_folder)
+            print(f"{dat_file.name}: {count}")
+        except Exception as e:
+            print(f"{dat_file.name}: {e}")
+
+def process_write(dat_folder, asm_folder, output_folder):
+    os.makedirs(output_folder, exist_ok=True)
+    for dat_file in sorted(Path(dat_folder).glob('*.dat')):
+        asm_dir = Path(asm_folder) / dat_file.stem
+        out_path = os.path.join(output_folder, dat_file.name)
+        try:
+            count = pack_dat_scripts(str(dat_file), str(asm_dir), out_path)
+            print(f"{dat_file.name}: {count}")
+        except Exception as e:
+            print(f"{dat_file.name}: {e}")
+
+def main():
+    mode = sys.argv[1].lower() if len(sys.argv) > 1 else ''
+
+    if mode == 'e' and len(sys.argv) == 4:
+        process_extract(sys.argv[2], sys.argv[3])
+    elif mode == 'w' and len(sys.argv) == 5:
+        process_write(sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        print(__doc__.strip())
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
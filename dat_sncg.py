@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+.dat封包 <-> PNG 直通工具（图像成员在内存中解压/解码/编码/压缩，不落地中间文件）
+Usage:
+    python dat_sncg.py e <dat_folder> <png_folder> [-p]
+    python dat_sncg.py w <dat_folder> <png_folder> <output_folder>
+
+png目录结构与 unpack.py + SNCG.py d 的输出一致:
+    <png_folder>/<封包名>/<序号>.<名称>.png            无SNSC
+    <png_folder>/<封包名>/$<序号>.<名称>.png           单个SNSC
+    <png_folder>/<封包名>/$<序号>.<名称>/<SNSC成员>.png 多个SNSC（写回时取第一张）
+导出时只解出各成员开头4字节识别 SNCG/SNSC，再按 SNCG.py 的规则用 .h 中的名称配对。
+-p 导出 P 模式 PNG（原调色板 + 原索引），写回时不经量化。
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+from SNCG import SNGCTool
+from pack import create_header_file, repack_dat
+from unpack import decompress_cm, parse_header_file, read_dat_index, sniff_magic
+
+def member_file_name(i, name) -> str:
+    """与 unpack.py 解包出的文件名一致"""
+    return f"{i}.{name}" if name else str(i)
+
+def classify_members(data, members, name_mapping):
+    """按魔数分类，返回 ({成员名: 序号} SNCG, {成员名: 序号} SNSC)"""
+    sncg, snsc = {}, {}
+    for i, (start, end) in enumerate(members):
+        if start >= end:
+            continue
+        try:
+            magic = sniff_magic(data, start, end)
+        except ValueError:
+            continue
+        if magic == SNGCTool.MAGIC_SNCG:
+            sncg[member_file_name(i, name_mapping.get(i))] = i
+        elif magic == SNGCTool.MAGIC_SNSC:
+            snsc[member_file_name(i, name_mapping.get(i))] = i
+    return sncg, snsc
+
+def extract_dat_images(dat_file_path, output_dir, tool=None) -> int:
+    """把.dat中的 SNCG 成员（配合对应 SNSC）直接解码为 PNG，返回导出数量"""
+    tool = tool or SNGCTool()
+    with open(dat_file_path, 'rb') as f:
+        data = f.read()
+
+    base_name = os.path.splitext(dat_file_path)[0]
+    name_mapping = parse_header_file(base_name + '.h')
+    output_folder = Path(output_dir) / os.path.basename(base_name)
+    members = read_dat_index(data)
+    sncg, snsc = classify_members(data, members, name_mapping)
+
+    # 同一 SNSC 可能被多个 SNCG（如 _ALL_SNCG 与单张）引用，只解压一次
+    raw_cache = {}
+    def member_raw(i):
+        if i not in raw_cache:
+            start, end = members[i]
+            raw_cache[i] = decompress_cm(data[start:end])
+        return raw_cache[i]
+
+    exported = 0
+    for sncg_name, i in sncg.items():
+        try:
+            snsc_list = [(snsc_name, member_raw(j)) for snsc_name, j in tool.find_snsc_files(sncg_name, snsc)]
+            for out_name, img in tool.decode_images(sncg_name, member_raw(i), snsc_list):
+                out_path = output_folder / out_name
+                out_path.parent.mkdir(parents=True, exist_ok=True)
+                img.save(out_path)
+                exported += 1
+        except Exception as e:
+            print(f"{dat_file_path}: {sncg_name} - {e}")
+
+    return exported
+
+def pack_dat_images(dat_file_path, png_dir, dat_output_path, tool=None) -> int:
+    """以原.dat为底，用png_dir中的PNG重新编码 SNCG 成员，其余成员原样保留。返回替换数量"""
+    tool = tool or SNGCTool()
+    with open(dat_file_path, 'rb') as f:
+        data = f.read()
+
+    base_name = os.path.splitext(dat_file_path)[0]
+    name_mapping = parse_header_file(base_name + '.h')
+    replaced = 0
+
+    def transform(i, name, member):
+        nonlocal replaced
+        if not member:
+            return None
+        png = tool.find_png(str(png_dir), member_file_name(i, name))
+        if png is None:
+            return None
+        orig = decompress_cm(member)
+        if orig[:4] != SNGCTool.MAGIC_SNCG:
+            return None
+        with Image.open(png) as img:
+            raw = tool.encode(img, orig)
+        # 编码结果与原数据相同时保留原压缩数据，省去重新压缩
+        if raw == orig:
+            return None
+        replaced += 1
+        return raw
+
+    output_data = repack_dat(data, name_mapping, transform)
+    with open(dat_output_path, 'wb') as f:
+        f.write(output_data)
+
+    h_output_path = os.path.splitext(dat_output_path)[0] + '.h'
+    if name_mapping and os.path.abspath(h_output_path) != os.path.abspath(base_name + '.h'):
+        create_header_file(h_output_path, {name: i for i, name in name_mapping.items()})
+
+    return replaced
+
+def process_extract(dat_folder, png_folder, indexed=False):
+    tool = SNGCTool(indexed)
+    for dat_file in sorted(Path(dat_folder).glob('*.dat')):
+        try:
+            count = extract_dat_images(str(dat_file), png_folder, tool)
+            print(f"{dat_file.name}: {count}")
+        except Exception as e:
+            print(f"{dat_file.name}: {e}")
+
+def process_write(dat_folder, png_folder, output_folder):
+    os.makedirs(output_folder, exist_ok=True)
+    tool = SNGCTool()
+    for dat_file in sorted(Path(dat_folder).glob('*.dat')):
+        png_dir = Path(png_folder) / dat_file.stem
+        out_path = os.path.join(output_folder, dat_file.name)
+        try:
+            count = pack_dat_images(str(dat_file), str(png_dir), out_path, tool)
+            print(f"{dat_file.name}: {count}")
+        except Exception as e:
+            print(f"{dat_file.name}: {e}")
+
+def main():
+    mode = sys.argv[1].lower() if len(sys.argv) > 1 else ''
+    indexed = '-p' in sys.argv[2:]
+    if indexed:
+        sys.argv.remove('-p')
+
+    if mode == 'e' and len(sys.argv) == 4:
+        process_extract(sys.argv[2], sys.argv[3], indexed)
+    elif mode == 'w' and len(sys.argv) == 5:
+        process_write(sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        print(__doc__.strip())
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -3,19 +3,35 @@
 """
 Script Assembler/Disassembler for _DAT files
 Usage:
-    python script_tool.py e <input_folder> <output_folder>
+    python script_tool.py e <input_folder> <output_folder> [index.db]
     python script_tool.py w <input_folder> <output_folder>
+    python script_tool.py s <input_folder> <index.db> <text>
 """
 
+import io
 import os
 import sys
 import struct
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import BinaryIO, Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import instrument
 
 CHUNK_SIZE = 0x180
 TEXT_OFFSET = 0x18
 TEXT_SIZE = CHUNK_SIZE - TEXT_OFFSET
+TEXT_SEGMENT = 0x48
+
+# 文本段布局: 文本段数 -> ((段偏移, 段大小), ...)，偏移相对TEXT_OFFSET
+TEXT_LAYOUTS = {
+    0: (),
+    1: ((0, TEXT_SIZE),),
+    5: tuple((i * TEXT_SEGMENT, TEXT_SEGMENT) for i in range(5)),
+}
+
+_CHUNK_HEAD = struct.Struct('<Iiii')
+_ICON_IDS = struct.Struct('<4i')
+_EMPTY_CHUNK = bytes(CHUNK_SIZE)
 
 # 唯一的指令定义表: opcode -> (助记符, 文本段数, [arg1启用, arg2启用, arg3启用])
 OPCODES = {
@@ -90,12 +106,14 @@ OPCODES = {
     0x44: ("END_SCRIPT", 0, [True, False, False]),     # 没有PC+1，脚本停止
 }
 
+# 助记符 -> opcode（同名助记符取表中第一个）
+MNEMONIC_TO_OPCODE = {}
+for _op, (_name, _, _) in OPCODES.items():
+    MNEMONIC_TO_OPCODE.setdefault(_name, _op)
+
 def find_opcode_by_mnemonic(mnemonic: str) -> Optional[int]:
     """通过助记符查找opcode数字"""
-    for opcode, (name, _, _) in OPCODES.items():
-        if name == mnemonic:
-            return opcode
-    return None
+    return MNEMONIC_TO_OPCODE.get(mnemonic)
 
 def is_printable(char: str) -> bool:
     """判断字符是否可打印（不需要转义）"""
@@ -168,43 +186,133 @@ def unescape_text(text: str) -> str:
     
     return ''.join(result)
 
+class OpHandler(NamedTuple):
+    """预编译的指令处理信息"""
+    mnemonic: str
+    head: str                           # 指令行模板，str.format(a1, a2, a3)
+    arg_indices: Tuple[int, ...]        # 启用的参数下标
+    segments: Tuple[Tuple[int, int], ...]
+    formatter: Callable
+
+def _decode_segment(data: bytes, start: int, size: int) -> str:
+    return data[start:start + size].decode('utf-16-le', errors='ignore').rstrip('\x00')
+
+def _fmt_plain(h: OpHandler, data: bytes, off: int, a1: int, a2: int, a3: int) -> List[str]:
+    return [h.head.format(a1, a2, a3)]
+
+def _fmt_text(h: OpHandler, data: bytes, off: int, a1: int, a2: int, a3: int) -> List[str]:
+    # TEXT指令（arg1是文本长度）
+    start = off + TEXT_OFFSET
+    if a1 > 0:
+        text = data[start:start + min(a1 * 2, TEXT_SIZE)].decode('utf-16-le', errors='ignore')
+    else:
+        text = _decode_segment(data, start, TEXT_SIZE)
+    return [h.head.format(a1, a2, a3), escape_text(text)]
+
+def _fmt_choice(h: OpHandler, data: bytes, off: int, a1: int, a2: int, a3: int) -> List[str]:
+    text = _decode_segment(data, off + TEXT_OFFSET, TEXT_SIZE)
+    return [h.head.format(a1, a2, a3), escape_text(text)]
+
+def _fmt_msg_show(h: OpHandler, data: bytes, off: int, a1: int, a2: int, a3: int) -> List[str]:
+    start = off + TEXT_OFFSET
+    lines = [h.head.format(a1, a2, a3)]
+    for seg_off, size in h.segments[:a1]:
+        lines.append(escape_text(_decode_segment(data, start + seg_off, size)))
+    return lines
+
+def _fmt_msg_show_ex(h: OpHandler, data: bytes, off: int, a1: int, a2: int, a3: int) -> List[str]:
+    # MSG_SHOW_EX（带图标ID）
+    start = off + TEXT_OFFSET
+    icon_ids = _ICON_IDS.unpack_from(data, off + 8)
+    lines = [h.head.format(a1, a2, a3)]
+    for i, (seg_off, size) in enumerate(h.segments[:a1]):
+        text = escape_text(_decode_segment(data, start + seg_off, size))
+        icon_id = icon_ids[i] if i < 4 else -1
+        lines.append(f'{icon_id} {text}')
+    return lines
+
+# 需要特殊格式化的指令；其余指令只输出 "助记符 参数..."
+_FORMATTERS = {
+    "TEXT": _fmt_text,
+    "DEF_CHOICE": _fmt_choice,
+    "MSG_SHOW": _fmt_msg_show,
+    "MSG_SHOW_EX": _fmt_msg_show_ex,
+}
+
+def shown_segment_count(h: OpHandler, a1: int) -> int:
+    """游戏实际显示的文本段数: MSG_SHOW 系列只显示前 arg1 段（与反汇编输出一致），其余指令为全部"""
+    if h.formatter in (_fmt_msg_show, _fmt_msg_show_ex):
+        return len(h.segments[:a1])
+    return len(h.segments)
+
+def _compile_handler(mnemonic: str, text_count: int, arg_enabled: List[bool]) -> OpHandler:
+    arg_indices = tuple(i for i, enabled in enumerate(arg_enabled) if enabled)
+    if mnemonic == "LABEL":
+        head = "LABEL_{0:03d}:"
+    else:
+        head = mnemonic + ''.join(f' {{{i}}}' for i in arg_indices)
+    return OpHandler(mnemonic, head, arg_indices, TEXT_LAYOUTS[text_count],
+                     _FORMATTERS.get(mnemonic, _fmt_plain))
+
+# opcode -> 预编译处理信息，导入时构建一次
+OP_HANDLERS = {op: _compile_handler(*info) for op, info in OPCODES.items()}
+
+def get_handler(opcode: int) -> OpHandler:
+    """查表获取处理信息，未知opcode按无参数指令处理"""
+    handler = OP_HANDLERS.get(opcode)
+    if handler is None:
+        handler = _compile_handler(f"UNK_{opcode:02X}", 0, [False, False, False])
+    return handler
+
 class ScriptDisassembler:
     def __init__(self, data: bytes):
         self.data = data
         self.chunks = len(data) // CHUNK_SIZE
-        self.labels = {}
-        # 查表获取opcode数字
+        self._labels = None
         self.opcode_label = find_opcode_by_mnemonic("LABEL")
         self.opcode_text = find_opcode_by_mnemonic("TEXT")
-        self.opcode_choice = find_opcode_by_mnemonic("CHOICE")
-        self.opcode_msg_show = find_opcode_by_mnemonic("MSG_SHOW")
-        self.opcode_msg_show_ex = find_opcode_by_mnemonic("MSG_SHOW_EX")
-        self._find_labels()
-        
-    def _find_labels(self):
-        """查找所有LABEL指令"""
-        if self.opcode_label is None:
-            return
-        
+    
+    @property
+    def labels(self) -> dict:
+        """LABEL编号 -> chunk序号，首次访问时才扫描"""
+        if self._labels is None:
+            self._labels = {}
+            if self.opcode_label is not None:
+                for i, _, a1, _, _ in self.iter_refs((self.opcode_label,)):
+                    self._labels[a1] = i
+        return self._labels
+    
+    def iter_refs(self, opcodes) -> Iterator[Tuple[int, int, int, int, int]]:
+        """遍历指定opcode的指令: (chunk序号, opcode, arg1, arg2, arg3)"""
+        wanted = set(opcodes)
         for i in range(self.chunks):
-            op, args, _, _ = self._parse_chunk_basic(i)
-            if op == self.opcode_label:
-                self.labels[args[0]] = i
+            head = _CHUNK_HEAD.unpack_from(self.data, i * CHUNK_SIZE)
+            if head[0] in wanted:
+                yield (i,) + head
+    
+    def iter_texts(self) -> Iterator[Tuple[int, int, int, str]]:
+        """遍历所有显示的非空文本段: (chunk序号, 段序号, opcode, 文本)"""
+        for i in range(self.chunks):
+            off = i * CHUNK_SIZE
+            op, a1, _, _ = _CHUNK_HEAD.unpack_from(self.data, off)
+            handler = OP_HANDLERS.get(op)
+            if handler is None or not handler.segments:
+                continue
+            text_data = self.data[off + TEXT_OFFSET:off + CHUNK_SIZE]
+            char_length = a1 if op == self.opcode_text else 0
+            texts = self._extract_texts(op, text_data, char_length)[:shown_segment_count(handler, a1)]
+            for seg, text in enumerate(texts):
+                if text:
+                    yield i, seg, op, text
     
     def _parse_chunk_basic(self, index: int) -> Tuple[int, Tuple[int, int, int], bytes, bytes]:
         off = index * CHUNK_SIZE
         if off + CHUNK_SIZE > len(self.data):
             raise ValueError(f"Chunk {index} exceeds data size")
         
-        chunk = self.data[off:off + CHUNK_SIZE]
-        
-        op = struct.unpack('<I', chunk[0:4])[0]
-        arg1 = struct.unpack('<i', chunk[4:8])[0]
-        arg2 = struct.unpack('<i', chunk[8:12])[0]
-        arg3 = struct.unpack('<i', chunk[12:16])[0]
-        
-        header = chunk[0:TEXT_OFFSET]
-        text_data = chunk[TEXT_OFFSET:CHUNK_SIZE]
+        op, arg1, arg2, arg3 = _CHUNK_HEAD.unpack_from(self.data, off)
+        header = self.data[off:off + TEXT_OFFSET]
+        text_data = self.data[off + TEXT_OFFSET:off + CHUNK_SIZE]
         
         return op, (arg1, arg2, arg3), header, text_data
     
@@ -218,122 +326,43 @@ class ScriptDisassembler:
         return extracted.decode('utf-16-le', errors='ignore')
     
     def _extract_texts(self, opcode: int, text_data: bytes, char_length: int = 0) -> List[str]:
-        opcode_info = OPCODES.get(opcode, ("UNK", 0, [False, False, False]))
-        text_count = opcode_info[1]
-        texts = []
-        
-        if text_count == 0:
+        handler = OP_HANDLERS.get(opcode)
+        if handler is None:
             return []
-        elif text_count == 1:
-            if char_length > 0:
-                text = self._extract_text_by_length(text_data, char_length)
-            else:
-                text = text_data.decode('utf-16-le', errors='ignore').rstrip('\x00')
-            texts.append(text)
-        elif text_count == 5:
-            offsets = [0x00, 0x48, 0x90, 0xD8, 0x120]
-            sizes = [0x48, 0x48, 0x48, 0x48, 0x48]
-            
-            for i, (off, size) in enumerate(zip(offsets, sizes)):
-                if i == 4:
-                    segment = text_data[off:]
-                else:
-                    segment = text_data[off:off + size]
-                text = segment.decode('utf-16-le', errors='ignore').rstrip('\x00')
-                texts.append(text)
         
-        return texts
+        segments = handler.segments
+        if len(segments) == 1 and char_length > 0:
+            return [self._extract_text_by_length(text_data, char_length)]
+        return [_decode_segment(text_data, off, size) for off, size in segments]
     
     def _format_args(self, opcode: int, a1: int, a2: int, a3: int) -> str:
         """根据参数启用表格式化参数"""
-        opcode_info = OPCODES.get(opcode, ("UNK", 0, [False, False, False]))
-        arg_enabled = opcode_info[2]
-        
-        args = []
-        if arg_enabled[0]:
-            args.append(str(a1))
-        if arg_enabled[1]:
-            args.append(str(a2))
-        if arg_enabled[2]:
-            args.append(str(a3))
-        
-        return ' ' + ' '.join(args) if args else ''
+        handler = OP_HANDLERS.get(opcode)
+        if handler is None or not handler.arg_indices:
+            return ''
+        args = (a1, a2, a3)
+        return ' ' + ' '.join(str(args[i]) for i in handler.arg_indices)
     
     def disasm_instruction(self, index: int) -> List[str]:
-        op, args, header, text_data = self._parse_chunk_basic(index)
-        opcode_info = OPCODES.get(op, (f"UNK_{op:02X}", 0, [False, False, False]))
-        mnemonic = opcode_info[0]
-        a1, a2, a3 = args
-        
-        lines = []
-        
-        # 用数字判断（数字是通过查表获得的）
-        if op == self.opcode_label:
-            # LABEL格式
-            lines.append(f"LABEL_{a1:03d}:")
-            return lines
-        
-        if op == self.opcode_text:
-            # TEXT指令（arg1是文本长度）
-            texts = self._extract_texts(op, text_data, a1)
-            lines.append(mnemonic)
-            if texts:
-                escaped = escape_text(texts[0])
-                lines.append(escaped)
-            return lines
-        
-        if op == self.opcode_choice:
-            # CHOICE
-            texts = self._extract_texts(op, text_data)
-            arg_str = self._format_args(op, a1, a2, a3)
-            lines.append(f'{mnemonic}{arg_str}')
-            if texts:
-                escaped = escape_text(texts[0])
-                lines.append(escaped)
-            return lines
-        
-        if op == self.opcode_msg_show:
-            # MSG_SHOW
-            texts = self._extract_texts(op, text_data)
-            arg_str = self._format_args(op, a1, a2, a3)
-            lines.append(f'{mnemonic}{arg_str}')
-            for text in texts[:a1]:
-                escaped = escape_text(text)
-                lines.append(escaped)
-            return lines
-        
-        if op == self.opcode_msg_show_ex:
-            # MSG_SHOW_EX（带图标ID）
-            texts = self._extract_texts(op, text_data)
-            icon_ids = []
-            for i in range(4):
-                icon_id = struct.unpack('<i', header[8+i*4:12+i*4])[0]
-                icon_ids.append(icon_id)
-            
-            arg_str = self._format_args(op, a1, a2, a3)
-            lines.append(f'{mnemonic}{arg_str}')
-            for i, text in enumerate(texts[:a1], 1):
-                icon_id = icon_ids[i-1] if i <= 4 else -1
-                escaped = escape_text(text)
-                lines.append(f'{icon_id} {escaped}')
-            return lines
-        
-        # 普通指令
-        arg_str = self._format_args(op, a1, a2, a3)
-        lines.append(f'{mnemonic}{arg_str}')
+        off = index * CHUNK_SIZE
+        if off + CHUNK_SIZE > len(self.data):
+            raise ValueError(f"Chunk {index} exceeds data size")
         
-        return lines
+        op, a1, a2, a3 = _CHUNK_HEAD.unpack_from(self.data, off)
+        handler = OP_HANDLERS.get(op) or get_handler(op)
+        return handler.formatter(handler, self.data, off, a1, a2, a3)
+    
+    def to_text(self) -> str:
+        """与 export 写出的 .asm 内容相同"""
+        return ''.join('\n'.join(self.disasm_instruction(i)) + '\n' for i in range(self.chunks))
     
+    @instrument.timed('ScriptDisassembler.export')
     def export(self, filepath: str):
         with open(filepath, 'w', encoding='utf-8') as f:
-            for i in range(self.chunks):
-                lines = self.disasm_instruction(i)
-                for line in lines:
-                    f.write(line + '\n')
+            f.write(self.to_text())
 
 class ScriptAssembler:
     def __init__(self):
-        self.chunks = []
         # 构建助记符->opcode映射表
         self.mnemonic_to_opcode = {v[0]: k for k, v in OPCODES.items()}
         # 查表获取特殊opcode数字
@@ -410,10 +439,8 @@ class ScriptAssembler:
         # 纯文本行
         return {'type': 'text', 'content': line}
     
-    def assemble(self, asm_path: str) -> bytes:
-        with open(asm_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
+    def iter_chunks(self, lines: Iterable[str]) -> Iterator[dict]:
+        """逐行解析，每完成一条指令就产出一个chunk描述"""
         current_chunk = None
         
         for line in lines:
@@ -424,7 +451,7 @@ class ScriptAssembler:
             
             if parsed['type'] == 'instruction':
                 if current_chunk:
-                    self.chunks.append(current_chunk)
+                    yield current_chunk
                 current_chunk = parsed
             
             elif parsed['type'] == 'text':
@@ -456,55 +483,68 @@ class ScriptAssembler:
                     current_chunk['texts'].append(text)
         
         if current_chunk:
-            self.chunks.append(current_chunk)
-        
-        return self._build_binary()
+            yield current_chunk
+    
+    def assemble_stream(self, lines: Iterable[str], out: BinaryIO) -> int:
+        """流式汇编：每个chunk写入复用的缓冲区后直接输出，返回chunk数"""
+        buf = bytearray(CHUNK_SIZE)
+        count = 0
+        for chunk_info in self.iter_chunks(lines):
+            buf[:] = _EMPTY_CHUNK
+            self._pack_chunk(chunk_info, buf, 0)
+            out.write(buf)
+            count += 1
+        return count
+    
+    @instrument.timed('ScriptAssembler.assemble')
+    def assemble(self, asm_path: str) -> bytes:
+        out = io.BytesIO()
+        with open(asm_path, 'r', encoding='utf-8') as f:
+            self.assemble_stream(f, out)
+        return out.getvalue()
+    
+    @instrument.timed('ScriptAssembler.assemble_to')
+    def assemble_to(self, asm_path: str, dat_path: str) -> int:
+        """直接汇编到输出文件: 先写入同目录的临时文件，成功后才替换 dat_path；失败时只删除临时文件，原有输出保持不变"""
+        tmp_path = dat_path + '.tmp'
+        try:
+            with open(asm_path, 'r', encoding='utf-8') as f_in, open(tmp_path, 'wb') as f_out:
+                count = self.assemble_stream(f_in, f_out)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, dat_path)
+        return count
     
-    def _build_binary(self) -> bytes:
-        result = bytearray()
+    def _pack_chunk(self, chunk_info: dict, buf: bytearray, base: int):
+        """把一个chunk写入buf[base:base+CHUNK_SIZE]（该区域须已清零）"""
+        opcode = chunk_info['opcode']
+        args = chunk_info['args']
+        texts = chunk_info['texts']
         
-        for chunk_info in self.chunks:
-            chunk_data = bytearray(CHUNK_SIZE)
-            
-            opcode = chunk_info['opcode']
-            args = chunk_info['args']
-            texts = chunk_info['texts']
-            
-            # TEXT指令 - 用数字判断
-            if self.opcode_text and opcode == self.opcode_text and texts:
-                args[0] = len(texts[0])
-            
-            struct.pack_into('<I', chunk_data, 0, opcode)
-            struct.pack_into('<i', chunk_data, 4, args[0])
-            struct.pack_into('<i', chunk_data, 8, args[1])
-            struct.pack_into('<i', chunk_data, 12, args[2])
-            
-            opcode_info = OPCODES.get(opcode, ("UNK", 0, [False, False, False]))
-            text_count = opcode_info[1]
-            
-            if text_count == 1:
-                if texts:
-                    encoded = self._encode_text_utf16le(texts[0], TEXT_SIZE)
-                    chunk_data[TEXT_OFFSET:TEXT_OFFSET + len(encoded)] = encoded
-            
-            elif text_count == 5:
-                offsets = [TEXT_OFFSET + 0x00, TEXT_OFFSET + 0x48, 
-                          TEXT_OFFSET + 0x90, TEXT_OFFSET + 0xD8, 
-                          TEXT_OFFSET + 0x120]
-                sizes = [0x48, 0x48, 0x48, 0x48, 0x48]
-                
-                for i, (off, size) in enumerate(zip(offsets, sizes)):
-                    if i < len(texts):
-                        encoded = self._encode_text_utf16le(texts[i], size)
-                        chunk_data[off:off + len(encoded)] = encoded
-                
-                # MSG_SHOW_EX - 用数字判断
-                if self.opcode_msg_show_ex and opcode == self.opcode_msg_show_ex:
-                    for i in range(4):
-                        struct.pack_into('<i', chunk_data, 8 + i*4, -1)
-            
-            result.extend(chunk_data)
+        # TEXT指令 - 用数字判断
+        if self.opcode_text and opcode == self.opcode_text and texts:
+            args[0] = len(texts[0])
+        
+        _CHUNK_HEAD.pack_into(buf, base, opcode, args[0], args[1], args[2])
+        
+        handler = OP_HANDLERS.get(opcode)
+        if handler is None:
+            return
+        
+        for (off, size), text in zip(handler.segments, texts):
+            start = base + TEXT_OFFSET + off
+            buf[start:start + size] = self._encode_text_utf16le(text, size)
         
+        # MSG_SHOW_EX - 用数字判断
+        if self.opcode_msg_show_ex and opcode == self.opcode_msg_show_ex:
+            _ICON_IDS.pack_into(buf, base + 8, -1, -1, -1, -1)
+    
+    def _build_binary(self, chunks: List[dict]) -> bytes:
+        result = bytearray(len(chunks) * CHUNK_SIZE)
+        for i, chunk_info in enumerate(chunks):
+            self._pack_chunk(chunk_info, result, i * CHUNK_SIZE)
         return bytes(result)
 
 def convert_dat_to_asm_name(dat_name: str) -> str:
@@ -517,18 +557,25 @@ def convert_asm_to_dat_name(asm_name: str) -> str:
         return asm_name[:-4] + '_DAT'
     return asm_name + '_DAT'
 
-def process_extract(input_folder: str, output_folder: str):
-    input_path = Path(input_folder)
-    output_path = Path(output_folder)
-    output_path.mkdir(parents=True, exist_ok=True)
-    
+def find_dat_files(input_path: Path) -> List[Path]:
     all_files = []
     for root, dirs, files in os.walk(input_path):
         for file in files:
             if file.endswith('_DAT'):
                 all_files.append(Path(root) / file)
+    return all_files
+
+def process_extract(input_folder: str, output_folder: str, index_path: Optional[str] = None):
+    input_path = Path(input_folder)
+    output_path = Path(output_folder)
+    output_path.mkdir(parents=True, exist_ok=True)
+    
+    index = None
+    if index_path:
+        from xref import ScriptIndex
+        index = ScriptIndex(index_path)
     
-    for dat_file in all_files:
+    for dat_file in find_dat_files(input_path):
         try:
             rel_path = dat_file.relative_to(input_path)
             asm_filename = convert_dat_to_asm_name(dat_file.name)
@@ -544,9 +591,15 @@ def process_extract(input_folder: str, output_folder: str):
             
             disasm = ScriptDisassembler(data)
             disasm.export(str(asm_file))
+            
+            if index is not None:
+                index.add_script(rel_path.as_posix(), disasm, dat_file.stat())
         
         except Exception as e:
             print(f"{dat_file.relative_to(input_path)}")
+    
+    if index is not None:
+        index.close()
 
 def process_write(input_folder: str, output_folder: str):
     input_path = Path(input_folder)
@@ -554,6 +607,7 @@ def process_write(input_folder: str, output_folder: str):
     output_path.mkdir(parents=True, exist_ok=True)
     
     asm_files = list(input_path.rglob('*.asm'))
+    assembler = ScriptAssembler()
     
     for asm_file in asm_files:
         try:
@@ -562,20 +616,30 @@ def process_write(input_folder: str, output_folder: str):
             dat_file = output_path / rel_path.parent / dat_filename
             dat_file.parent.mkdir(parents=True, exist_ok=True)
             
-            assembler = ScriptAssembler()
-            data = assembler.assemble(str(asm_file))
-            
-            with open(dat_file, 'wb') as f:
-                f.write(data)
+            assembler.assemble_to(str(asm_file), str(dat_file))
         
         except Exception as e:
             print(f"{asm_file.relative_to(input_path)}")
 
+def process_search(input_folder: str, index_path: str, query: str):
+    """先增量更新索引，再按二元组检索文本"""
+    from xref import ScriptIndex, update_index
+    
+    with ScriptIndex(index_path) as index:
+        update_index(index, input_folder)
+        for rel_path, chunk, segment, text in index.search_text(query):
+            print(f"{rel_path}:{chunk}:{segment} {escape_text(text)}")
+
 def main():
-    if len(sys.argv) != 4:
+    if len(sys.argv) == 5 and sys.argv[1].lower() == 's':
+        process_search(sys.argv[2], sys.argv[3], sys.argv[4])
+        return
+    
+    if len(sys.argv) not in (4, 5):
         print("Usage:")
-        print("  python script_tool.py e <input_folder> <output_folder>")
+        print("  python script_tool.py e <input_folder> <output_folder> [index.db]")
         print("  python script_tool.py w <input_folder> <output_folder>")
+        print("  python script_tool.py s <input_folder> <index.db> <text>")
         sys.exit(1)
     
     mode = sys.argv[1].lower()
@@ -583,7 +647,8 @@ def main():
     output_folder = sys.argv[3]
     
     if mode == 'e':
-        process_extract(input_folder, output_folder)
+        index_path = sys.argv[4] if len(sys.argv) == 5 else None
+        process_extract(input_folder, output_folder, index_path)
     elif mode == 'w':
         process_write(input_folder, output_folder)
     else:
@@ -591,4 +656,5 @@ def main():
         sys.exit(1)
 
 if __name__ == '__main__':
+    instrument.setup_from_argv()
     main()
\ No newline at end of file
@@ -2,9 +2,22 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import math
+import json
+import pickle
+import struct
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image, ImageDraw, ImageFont
-import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+import instrument
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # ================= 核心配置 =================
 l_size = 12
@@ -12,7 +25,14 @@ CONFIG = {
     'input_file':  "font.txt",
     'output_xml':  "new_font.xml",
     'output_png':  "new_font.png",
+    'output_nftr': "new_font.nftr",
+    'output_mode': "xml",           # xml = XML+PNG 交给 NerdFontTerminatoR，nftr = 直接生成二进制，both
+    'dedup_glyphs': True,           # nftr: 相同字形共用序号（XML 格式无法表达，不受影响）
     'font_path':   "simsun.ttc",
+    'glyph_cache': "glyph_cache",   # 字形缓存目录，None 关闭
+    'charset_source': None,         # 脚本目录(_DAT 或 .asm)，设置后按脚本实际用字生成，忽略 input_file
+    'charset_cache': "charset_cache.json",
+    'workers':     0,               # 渲染进程数，0 = CPU 核数
 
     # --- 样式 ---
     'font_size':   l_size,
@@ -37,6 +57,26 @@ CONFIG = {
     'border':      2,
 }
 
+# NFTR 字体信息（XML 与二进制共用）
+NFTR_INFO = {
+    'version':      "1.1",
+    'line_gap':     15,
+    'glyph_width':  15,
+    'glyph_height': 13,
+    'default_width': (0, 15, 15),   # BearingX, Width, Advance
+    'error_char':   0,
+    'depth':        2,
+    'rotation':     "Rot270",
+    'encoding':     "UTF8",
+}
+
+# (Id, FirstChar, LastChar, Type)  Type: 0=连续, 1=查表, 2=扫描
+NFTR_MAPS = [
+    (0, 0x3000, 0x30FC, 1),
+    (1, 0xFF01, 0xFF5E, 1),
+    (2, 0x0000, 0xFFFF, 2),
+]
+
 # 竖排标点映射
 VERT_MAP = {
     '(': '︵', ')': '︶', '（': '︵', '）': '︶',
@@ -51,45 +91,33 @@ VERT_MAP = {
 
 # ================= 工具函数 =================
 
-def add_xml(parent, tag, text=None, **attrs):
-    elem = ET.SubElement(parent, tag, attrs)
-    if text is not None: elem.text = str(text)
-    return elem
-
 def determine_map_id(char_code):
     """复刻原版 Map 分区逻辑"""
     if 0x3000 <= char_code <= 0x30FC: return 0 
     if 0xFF01 <= char_code <= 0xFF5E: return 1 
     return 2 
 
-def indent_xml(elem, level=0):
-    """
-    手动 XML 缩进函数
-    替代 minidom，确保汉字不被转义成 &#xxxxx;
-    """
-    i = "\n" + level * "  "
-    if len(elem):
-        if not elem.text or not elem.text.strip():
-            elem.text = i + "  "
-        if not elem.tail or not elem.tail.strip():
-            elem.tail = i
-        for elem in elem:
-            indent_xml(elem, level + 1)
-        if not elem.tail or not elem.tail.strip():
-            elem.tail = i
-    else:
-        if level and (not elem.tail or not elem.tail.strip()):
-            elem.tail = i
+_lut_cache = {}
 
+def make_2bpp_lut(cfg):
+    """灰度 -> 2bpp 索引的查找表（按阈值缓存）: 0=白 1=浅灰 2=深灰 3=黑"""
+    key = (cfg['threshold_black'], cfg['threshold_dark'], cfg['threshold_light'])
+    lut = _lut_cache.get(key)
+    if lut is None:
+        black, dark, light = key
+        lut = bytes(3 if i < black else 2 if i < dark else 1 if i < light else 0 for i in range(256))
+        _lut_cache[key] = lut
+    return lut
+
+@instrument.timed('quantize_to_2bpp')
 def quantize_to_2bpp(img_gray, cfg):
-    lut = []
-    for i in range(256):
-        if i < cfg['threshold_black']: lut.append(3)
-        elif i < cfg['threshold_dark']: lut.append(2)
-        elif i < cfg['threshold_light']: lut.append(1)
-        else: lut.append(0)
-
-    img_indexed = img_gray.point(lut, mode='P')
+    lut = make_2bpp_lut(cfg)
+
+    if np is not None:
+        indices = np.frombuffer(lut, dtype=np.uint8)[np.asarray(img_gray)]
+        img_indexed = Image.frombytes('P', img_gray.size, indices.tobytes())
+    else:
+        img_indexed = img_gray.point(list(lut), mode='P')
     palette = [
         255, 255, 255,  # 0: White
         170, 170, 170,  # 1: Light Gray
@@ -100,14 +128,30 @@ def quantize_to_2bpp(img_gray, cfg):
     img_indexed.putpalette(palette)
     return img_indexed
 
-def process_glyph(char, font, cfg):
+def pack_2bpp(indices):
+    """2bpp 索引逐行打包，每字节 4 像素，高位在前；像素数不是 4 的倍数时末尾补 0（白），
+    字节数与 CGLP 的 glyph_size 向上取整一致"""
+    pad = -len(indices) % 4
+    if pad:
+        indices = bytes(indices) + bytes(pad)
+    if np is not None:
+        px = np.frombuffer(indices, dtype=np.uint8).reshape(-1, 4)
+        return ((px[:, 0] << 6) | (px[:, 1] << 4) | (px[:, 2] << 2) | px[:, 3]).astype(np.uint8).tobytes()
+    return bytes((indices[i] << 6) | (indices[i + 1] << 4) | (indices[i + 2] << 2) | indices[i + 3]
+                 for i in range(0, len(indices), 4))
+
+def glyph_layout(char, font, cfg):
+    """
+    计算字形的墨迹范围、在旋转画布(pivot)中的绘制位置、裁剪框与 XML 宽度信息。
+    无字形时返回 None。
+    """
     upscale = cfg['upscale']
     box_w, box_h = cfg['box_w'], cfg['box_h']
     safe_w, safe_h = box_w * upscale, box_h * upscale
 
     display_char = VERT_MAP.get(char, char)
     bbox = font.getbbox(display_char)
-    if not bbox: return None, 5, 0, 8
+    if not bbox: return None
 
     ink_w = bbox[2] - bbox[0]
     ink_h = bbox[3] - bbox[1]
@@ -120,44 +164,535 @@ def process_glyph(char, font, cfg):
     target_x = (safe_w - ink_w) / 2 + (cfg['offset_x'] * upscale)
 
     pivot_size = int(max(safe_w, safe_h) * 2.0)
-    img_pivot = Image.new("L", (pivot_size, pivot_size), 255)
-    draw = ImageDraw.Draw(img_pivot)
-    
     off_sx = (pivot_size - safe_w) // 2
     off_sy = (pivot_size - safe_h) // 2
     draw_x = off_sx + target_x - bbox[0]
     draw_y = off_sy + target_y - bbox[1]
 
-    draw.text((draw_x, draw_y), display_char, font=font, fill=0, 
-              stroke_width=cfg['bold_width'], stroke_fill=0)
-
-    if cfg['rotate'] != 0:
-        img_pivot = img_pivot.rotate(cfg['rotate'], resample=Image.BICUBIC, fillcolor=255)
-
     center = pivot_size // 2
     left = center - safe_w // 2
     top  = center - safe_h // 2
-    img_crop = img_pivot.crop((left, top, left + safe_w, top + safe_h))
-    img_final = img_crop.resize((box_w, box_h), resample=Image.LANCZOS)
+    crop_box = (left, top, left + safe_w, top + safe_h)
 
     final_ink_w = ink_w + (cfg['bold_width'] * 2)
     xml_width = int(final_ink_w / upscale)
     xml_bearing = int((box_w - xml_width) / 2)
     if xml_bearing < 0: xml_bearing = 0
+
+    return display_char, bbox, (draw_x, draw_y), pivot_size, crop_box, (xml_width, xml_bearing, box_w)
+
+@instrument.timed('process_glyph')
+def process_glyph(char, font, cfg):
+    """逐字渲染（参考实现）：每个字形单独建 pivot 画布、旋转、裁剪、缩小"""
+    layout = glyph_layout(char, font, cfg)
+    if layout is None: return None, 5, 0, 8
+    display_char, _, draw_xy, pivot_size, crop_box, metrics = layout
+
+    img_pivot = Image.new("L", (pivot_size, pivot_size), 255)
+    draw = ImageDraw.Draw(img_pivot)
+    draw.text(draw_xy, display_char, font=font, fill=0, 
+              stroke_width=cfg['bold_width'], stroke_fill=0)
+
+    if cfg['rotate'] != 0:
+        img_pivot = img_pivot.rotate(cfg['rotate'], resample=Image.BICUBIC, fillcolor=255)
+
+    img_crop = img_pivot.crop(crop_box)
+    img_final = img_crop.resize((cfg['box_w'], cfg['box_h']), resample=Image.LANCZOS)
     
-    return img_final, xml_width, xml_bearing, box_w
+    return (img_final,) + metrics
+
+# 90 度整数倍的旋转在正方形画布上等价于 transpose
+RIGHT_ANGLE_TRANSPOSE = {
+    0: None,
+    90: Image.ROTATE_90,
+    180: Image.ROTATE_180,
+    270: Image.ROTATE_270,
+}
+INVERSE_TRANSPOSE = {
+    None: None,
+    Image.ROTATE_90: Image.ROTATE_270,
+    Image.ROTATE_180: Image.ROTATE_180,
+    Image.ROTATE_270: Image.ROTATE_90,
+}
+
+# 字形之间的安全间隔（抗锯齿/取整误差）
+STRIP_MARGIN = 2
+# 每张长条画布的字形数
+STRIP_BATCH = 256
+
+def transpose_box(method, box, size):
+    """图像 (W, H) 经 method 变换后，box 对应的新区域"""
+    x0, y0, x1, y1 = box
+    w, h = size
+    if method == Image.ROTATE_90:
+        return (y0, w - x1, y1, w - x0)
+    if method == Image.ROTATE_180:
+        return (w - x1, h - y1, w - x0, h - y0)
+    if method == Image.ROTATE_270:
+        return (h - y1, x0, h - y0, x1)
+    return box
+
+@instrument.timed('render_glyph_strip')
+def render_glyph_strip(chars, font, cfg):
+    """
+    批量渲染：把一批字形横向排在一张长条画布上，整条只旋转一次，再逐个裁剪缩小。
+    每个字形只保留 pivot 中最终会被裁剪到的窗口及其墨迹范围，字形之间留出间隔互不覆盖，
+    绘制坐标与 process_glyph 只差整数平移，因此输出逐像素一致。
+    非 90 度整数倍的旋转，以及绘制坐标为负的字形，退回 process_glyph。
+    """
+    angle = cfg['rotate'] % 360
+    if angle not in RIGHT_ANGLE_TRANSPOSE:
+        return [process_glyph(char, font, cfg) for char in chars]
+    method = RIGHT_ANGLE_TRANSPOSE[angle]
+
+    results = [None] * len(chars)
+    placed = []     # (序号, 字符, pivot坐标->长条坐标的x平移, pivot中的窗口, metrics)
+    cursor = 0
+    y_lo, y_hi = None, None
+
+    for i, char in enumerate(chars):
+        layout = glyph_layout(char, font, cfg)
+        if layout is None:
+            results[i] = (None, 5, 0, 8)
+            continue
+        display_char, bbox, (draw_x, draw_y), pivot_size, crop_box, metrics = layout
+        # draw.text 按 int() + modf 拆分坐标，负坐标的小数部分也为负；
+        # 平移到长条的正坐标后小数部分变号，Pillow 取整方向不同，像素随之不同
+        if draw_x < 0 or draw_y < 0:
+            results[i] = process_glyph(char, font, cfg)
+            continue
+
+        # 旋转后裁剪框在旋转前 pivot 中对应的窗口
+        window = transpose_box(INVERSE_TRANSPOSE[method], crop_box, (pivot_size, pivot_size))
+        # 描边向外扩展 bold_width，再留出安全间隔
+        pad = math.ceil(cfg['bold_width']) + STRIP_MARGIN
+        ink_x0 = math.floor(draw_x + bbox[0]) - pad
+        ink_x1 = math.ceil(draw_x + bbox[2]) + pad
+        ink_y0 = math.floor(draw_y + bbox[1]) - pad
+        ink_y1 = math.ceil(draw_y + bbox[3]) + pad
+
+        x0 = min(window[0], ink_x0, math.floor(draw_x))
+        x1 = max(window[2], ink_x1)
+        y0 = min(window[1], ink_y0, math.floor(draw_y))
+        y1 = max(window[3], ink_y1)
+        y_lo = y0 if y_lo is None else min(y_lo, y0)
+        y_hi = y1 if y_hi is None else max(y_hi, y1)
+
+        shift_x = cursor - x0
+        cursor += x1 - x0
+        placed.append((i, display_char, (draw_x, draw_y), shift_x, window, metrics))
+
+    if not placed:
+        return results
+
+    # 统一的 y 平移（所有字形的 pivot 尺寸相同）
+    shift_y = -y_lo
+    strip = Image.new("L", (cursor, y_hi - y_lo), 255)
+    draw = ImageDraw.Draw(strip)
+    for _, display_char, (draw_x, draw_y), shift_x, _, _ in placed:
+        draw.text((draw_x + shift_x, draw_y + shift_y), display_char, font=font, fill=0,
+                  stroke_width=cfg['bold_width'], stroke_fill=0)
+
+    if method is not None:
+        rotated = strip.transpose(method)
+    else:
+        rotated = strip
+
+    for i, _, _, shift_x, window, metrics in placed:
+        box = (window[0] + shift_x, window[1] + shift_y, window[2] + shift_x, window[3] + shift_y)
+        img_crop = rotated.crop(transpose_box(method, box, strip.size))
+        img_final = img_crop.resize((cfg['box_w'], cfg['box_h']), resample=Image.LANCZOS)
+        results[i] = (img_final,) + metrics
+
+    return results
+
+def verify_renderer(chars, font, cfg):
+    """像素比对：批量渲染与逐字参考实现，返回不一致的字符"""
+    mismatched = []
+    for char, fast in zip(chars, render_glyph_strip(chars, font, cfg)):
+        ref = process_glyph(char, font, cfg)
+        same_img = (ref[0] is None and fast[0] is None) or \
+                   (ref[0] is not None and fast[0] is not None and ref[0].tobytes() == fast[0].tobytes())
+        if not same_img or ref[1:] != fast[1:]:
+            mismatched.append(char)
+    return mismatched
+
+# ================= 字形缓存 / 并行渲染 =================
+
+# 影响字形渲染结果的配置项，参与缓存键
+RENDER_KEYS = ('font_path', 'font_size', 'upscale', 'bold_width', 'rotate',
+               'offset_x', 'offset_y', 'box_w', 'box_h')
+# 渲染实现的输出有变化时递增，使旧缓存失效
+RENDER_VERSION = 2
+
+NO_RENDER_CHARS = ('\n', '\r', '\t')
+
+def load_font(cfg):
+    try:
+        return ImageFont.truetype(cfg['font_path'], int(cfg['font_size'] * cfg['upscale']))
+    except:
+        return ImageFont.load_default()
+
+def font_digest(font):
+    """Pillow 实际打开的字体文件的哈希（font_path 可以只是系统字体目录中的文件名）；
+    load_default 的内置字体没有文件路径，返回 'default'"""
+    path = getattr(font, 'path', None)
+    if not isinstance(path, (str, bytes, os.PathLike)) or not os.path.isfile(path):
+        return 'default'
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def glyph_cache_path(cfg, font):
+    """缓存文件按 (字体文件哈希, 渲染参数) 区分，文件内按字符索引"""
+    key = repr((RENDER_VERSION, font_digest(font), tuple(cfg[k] for k in RENDER_KEYS)))
+    return os.path.join(cfg['glyph_cache'], hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pkl')
+
+def load_glyph_cache(path):
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
+
+def save_glyph_cache(path, cache):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+_worker_font = None
+_worker_cfg = None
+
+def _init_worker(cfg):
+    global _worker_font, _worker_cfg
+    _worker_cfg = cfg
+    _worker_font = load_font(cfg)
+
+def _render_batch(chars):
+    """渲染一批字符: [(char, (L模式字节 或 None, width, bearing, advance))]"""
+    results = []
+    for i in range(0, len(chars), STRIP_BATCH):
+        part = chars[i:i + STRIP_BATCH]
+        for char, (g_img, xml_w, xml_bx, xml_ad) in zip(part, render_glyph_strip(part, _worker_font, _worker_cfg)):
+            g_data = g_img.tobytes() if g_img else None
+            results.append((char, (g_data, xml_w, xml_bx, xml_ad)))
+    return results
+
+@instrument.timed('render_glyphs')
+def render_glyphs(chars, cfg):
+    """返回 {char: (字形数据, width, bearing, advance)}，只渲染缓存中没有的字符"""
+    cache_path = glyph_cache_path(cfg, load_font(cfg)) if cfg['glyph_cache'] else None
+    cache = load_glyph_cache(cache_path) if cache_path else {}
+
+    missing = [ch for ch in chars if ch not in cache]
+    print(f"渲染字形: {len(missing)} | 缓存命中: {len(chars) - len(missing)}")
+    if not missing:
+        return cache
+
+    workers = cfg['workers'] or os.cpu_count() or 1
+    if workers <= 1 or len(missing) < 64:
+        _init_worker(cfg)
+        cache.update(_render_batch(missing))
+    else:
+        batch = max(16, math.ceil(len(missing) / (workers * 4)))
+        batches = [missing[i:i + batch] for i in range(0, len(missing), batch)]
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(cfg,)) as pool:
+            for results in pool.map(_render_batch, batches):
+                cache.update(results)
+
+    if cache_path:
+        save_glyph_cache(cache_path, cache)
+    return cache
+
+# ================= NFTR XML =================
+
+class NftrXmlWriter:
+    """
+    流式写出 NerdFontTerminatoR 的 XML：头部、Maps、Widths 在构造时写出，
+    Glyph 逐个追加，内存占用与字形数量无关。
+    输出格式（两空格缩进、<!-- (字符) --> 注释）与 ElementTree 序列化结果逐字节一致。
+    """
+
+    def __init__(self, f, cfg, total):
+        self.f = f
+        self.has_glyphs = False
+        info = NFTR_INFO
+
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        f.write("<NFTR>\n")
+        self._elem(1, "Version", info['version'])
+        self._elem(1, "LineGap", info['line_gap'])
+        self._elem(1, "BoxWidth", cfg['box_w'])
+        self._elem(1, "BoxHeight", cfg['box_h'])
+        self._elem(1, "GlyphWidth", info['glyph_width'])
+        self._elem(1, "GlyphHeight", info['glyph_height'])
+        self._open(1, "DefaultWidth")
+        self._elem(2, "IdRegion", "-1")
+        self._elem(2, "BearingX", info['default_width'][0])
+        self._elem(2, "Width", info['default_width'][1])
+        self._elem(2, "Advance", info['default_width'][2])
+        self._close(1, "DefaultWidth")
+        self._elem(1, "ErrorChar", info['error_char'])
+        self._elem(1, "Depth", info['depth'])
+        self._elem(1, "Rotation", info['rotation'])
+        self._elem(1, "Encoding", info['encoding'])
+
+        # Maps & Widths
+        self._open(1, "Maps")
+        for map_id, first, last, map_type in NFTR_MAPS:
+            self._open(2, "Map")
+            self._elem(3, "Id", map_id)
+            self._elem(3, "FirstChar", format(first, 'X'))
+            self._elem(3, "LastChar", format(last, 'X'))
+            self._elem(3, "Type", map_type)
+            self._close(2, "Map")
+        self._close(1, "Maps")
+
+        self._open(1, "Widths")
+        self._open(2, "Region")
+        self._elem(3, "Id", "0")
+        self._elem(3, "FirstChar", "0")
+        self._elem(3, "LastChar", total - 1)
+        self._close(2, "Region")
+        self._close(1, "Widths")
+
+    def _open(self, level, tag):
+        self.f.write(f"{'  ' * level}<{tag}>\n")
+
+    def _close(self, level, tag):
+        self.f.write(f"{'  ' * level}</{tag}>\n")
+
+    def _elem(self, level, tag, text):
+        self.f.write(f"{'  ' * level}<{tag}>{escape(str(text))}</{tag}>\n")
+
+    def add_glyph(self, idx, char, xml_w, xml_bx, xml_ad):
+        if not self.has_glyphs:
+            self._open(1, "Glyphs")
+            self.has_glyphs = True
+
+        char_code = ord(char)
+
+        # 注释处理
+        comment_txt = char
+        if char == '\n': comment_txt = "\\n"
+        elif char == '\r': comment_txt = "\\r"
+        elif char == '\t': comment_txt = "\\t"
+
+        self._open(2, "Glyph")
+        self.f.write(f"      <!-- ({comment_txt}) -->\n")
+        self._elem(3, "Id", idx)
+        self._open(3, "Width")
+        self._elem(4, "IdRegion", "0")
+        self._elem(4, "BearingX", xml_bx)
+        self._elem(4, "Width", xml_w)
+        self._elem(4, "Advance", xml_ad)
+        self._close(3, "Width")
+        self._elem(3, "Code", format(char_code, 'X'))
+        self._elem(3, "IdMap", determine_map_id(char_code))
+        self._close(2, "Glyph")
+
+    def finish(self):
+        if self.has_glyphs:
+            self._close(1, "Glyphs")
+        else:
+            self.f.write("  <Glyphs></Glyphs>\n")
+        self.f.write("</NFTR>\n")
+
+# ================= NFTR 二进制 =================
+
+# NitroSDK 字体标志: bit0 = 竖排(TBRL)，bit1-2 = 旋转
+NFTR_ROTATION = {'Rot0': 0, 'Rot90': 1, 'Rot180': 2, 'Rot270': 3}
+NFTR_ENCODING = {'UTF8': 0, 'UTF16': 1, 'SJIS': 2, 'CP1252': 3}
+
+def _nftr_block(magic, payload):
+    """块 = 4字节魔数(倒序) + uint32 块大小 + 数据，按 4 字节对齐"""
+    payload += b'\x00' * (-len(payload) % 4)
+    return magic[::-1] + struct.pack('<I', 8 + len(payload)) + payload
+
+@instrument.timed('build_nftr')
+def build_nftr(glyph_data, widths, code_map, cfg):
+    """
+    直接生成 NFTR (v1.1) 二进制，省去 XML/PNG 中间文件。
+      glyph_data: 每个字形按 CGLP 打包好的位图（已是 Rot270 存储方向，与 PNG 中一致）
+      widths:     每个字形的 (BearingX, Width, Advance)
+      code_map:   [(字符码, 字形序号)]，按 NFTR_MAPS 分配到各 CMAP
+    """
+    info = NFTR_INFO
+    box_w, box_h = cfg['box_w'], cfg['box_h']
+    glyph_size = (box_w * box_h * info['depth'] + 7) // 8
+
+    cglp = _nftr_block(b'CGLP', struct.pack(
+        '<BBHBBBB', box_w, box_h, glyph_size, info['glyph_height'], info['glyph_width'],
+        info['depth'], NFTR_ROTATION[info['rotation']] << 1) + b''.join(glyph_data))
+
+    cwdh = _nftr_block(b'CWDH', struct.pack('<HHI', 0, len(widths) - 1, 0) +
+                       b''.join(struct.pack('<bBB', *w) for w in widths))
+
+    # 各 CMAP 的内容，偏移在确定块位置后回填
+    cmap_payloads = []
+    for map_id, first, last, map_type in NFTR_MAPS:
+        entries = sorted((code, idx) for code, idx in code_map if determine_map_id(code) == map_id)
+        if map_type == 1:
+            table = [0xFFFF] * (last - first + 1)
+            for code, idx in entries:
+                table[code - first] = idx
+            data = struct.pack(f'<{len(table)}H', *table)
+        elif map_type == 2:
+            data = struct.pack('<H', len(entries)) + b''.join(struct.pack('<HH', *e) for e in entries)
+        else:
+            data = struct.pack('<H', entries[0][1] if entries else 0)
+        cmap_payloads.append((first, last, map_type, data))
+
+    finf_size = 8 + 20
+    cglp_off = 0x10 + finf_size
+    cwdh_off = cglp_off + len(cglp)
+    cmap_off = cwdh_off + len(cwdh)
+
+    cmaps = []
+    position = cmap_off
+    for i, (first, last, map_type, data) in enumerate(cmap_payloads):
+        block_len = len(_nftr_block(b'CMAP', struct.pack('<HHHHI', 0, 0, 0, 0, 0) + data))
+        next_off = position + block_len + 8 if i + 1 < len(cmap_payloads) else 0
+        cmaps.append(_nftr_block(b'CMAP', struct.pack('<HHHHI', first, last, map_type, 0, next_off) + data))
+        position += block_len
+
+    default_bx, default_w, default_ad = info['default_width']
+    finf = _nftr_block(b'FINF', struct.pack(
+        '<BBHBBBBIII', 0, info['line_gap'], info['error_char'], default_bx, default_w, default_ad,
+        NFTR_ENCODING[info['encoding']], cglp_off + 8, cwdh_off + 8, cmap_off + 8))
+
+    body = finf + cglp + cwdh + b''.join(cmaps)
+    major, minor = (int(v) for v in info['version'].split('.'))
+    header = b'RTFN' + struct.pack('<HHIHH', 0xFEFF, (major << 8) | minor, 0x10 + len(body), 0x10, 3 + len(cmaps))
+    return header + body
+
+@instrument.timed('write_nftr')
+def write_nftr(chars, glyphs, cfg):
+    """
+    量化并打包所有字形后写出 NFTR。
+    dedup_glyphs 开启时，量化后位图与宽度都相同的字符共用一个字形序号，
+    CGLP 与 CWDH 只保留不重复的字形，CMAP 把多个字符码指向同一字形。
+    """
+    lut = make_2bpp_lut(cfg)
+    box_w, box_h = cfg['box_w'], cfg['box_h']
+    blank = bytes(box_w * box_h)
+
+    glyph_data, widths, code_map = [], [], []
+    shared = {}     # (位图, 宽度) -> 字形序号
+    for char in chars:
+        if char in NO_RENDER_CHARS:
+            g_data, xml_w, xml_bx, xml_ad = None, 5, 0, 8
+        else:
+            g_data, xml_w, xml_bx, xml_ad = glyphs[char]
+        # 白底 255 -> 索引 0，与 PNG 量化一致
+        indices = g_data.translate(lut) if g_data else blank
+        packed = pack_2bpp(indices)
+        width = (xml_bx, xml_w, xml_ad)
+
+        key = (packed, width)
+        idx = shared.get(key) if cfg['dedup_glyphs'] else None
+        if idx is None:
+            idx = len(glyph_data)
+            glyph_data.append(packed)
+            widths.append(width)
+            shared[key] = idx
+        if ord(char) <= 0xFFFF:
+            code_map.append((ord(char), idx))
+
+    data = build_nftr(glyph_data, widths, code_map, cfg)
+    with open(cfg['output_nftr'], 'wb') as f:
+        f.write(data)
+    print(f"NFTR: {cfg['output_nftr']} ({len(data)} 字节)")
+
+    merged = len(chars) - len(glyph_data)
+    if merged:
+        saved = merged * (len(glyph_data[0]) + 3)
+        print(f"合并重复字形: {merged} 个 | 字形数 {len(chars)} -> {len(glyph_data)} | 节省约 {saved} 字节")
 
 # ================= 主程序 =================
 
+def read_charset(path):
+    with open(path, 'r', encoding='utf-16') as f:
+        content = f.read()
+    return sorted(list(set(ch for ch in content if ord(ch) != 0xFEFF)), key=ord)
+
+def scan_script_charset(folder, cache_path=None):
+    """
+    扫描脚本目录中所有 _DAT / .asm，收集文本中实际用到的字符。
+    .asm 先汇编为二进制，再与 _DAT 一样按 UTF-16LE 文本槽解码，保证与游戏中的文本一致。
+    每个文件的字符集按 (大小, 修改时间) 缓存，未变化的文件不再解析。
+    """
+    from diasm import CHUNK_SIZE, ScriptAssembler, ScriptDisassembler
+
+    cache = {}
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+
+    assembler = ScriptAssembler()
+    new_cache = {}
+    chars = set()
+    scanned = 0
+
+    for root, dirs, files in os.walk(folder):
+        for name in files:
+            if not (name.endswith('_DAT') or name.endswith('.asm')):
+                continue
+            path = os.path.join(root, name)
+            key = os.path.relpath(path, folder)
+            st = os.stat(path)
+
+            entry = cache.get(key)
+            if entry is None or entry[0] != st.st_size or entry[1] != st.st_mtime:
+                if name.endswith('.asm'):
+                    data = assembler.assemble(path)
+                else:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                file_chars = set()
+                if len(data) % CHUNK_SIZE == 0:
+                    for _, _, _, text in ScriptDisassembler(data).iter_texts():
+                        file_chars.update(text)
+                file_chars.discard('\x00')
+                entry = [st.st_size, st.st_mtime, ''.join(sorted(file_chars))]
+                scanned += 1
+
+            new_cache[key] = entry
+            chars.update(entry[2])
+
+    if cache_path:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(new_cache, f, ensure_ascii=False)
+
+    print(f"脚本文件: {len(new_cache)} | 重新扫描: {scanned}")
+    return sorted(chars, key=ord)
+
+def load_charset(cfg):
+    if cfg['charset_source']:
+        return scan_script_charset(cfg['charset_source'], cfg['charset_cache'])
+    return read_charset(cfg['input_file'])
+
+def verify_main():
+    """python font.py --verify : 批量渲染与参考实现逐像素比对"""
+    c = CONFIG
+    chars = [ch for ch in load_charset(c) if ch not in NO_RENDER_CHARS]
+    mismatched = verify_renderer(chars, load_font(c), c)
+    print(f"比对字符: {len(chars)} | 不一致: {len(mismatched)}")
+    if mismatched:
+        print(''.join(mismatched))
+        sys.exit(1)
+
 def main():
     c = CONFIG
-    if not os.path.exists(c['input_file']):
+    if not c['charset_source'] and not os.path.exists(c['input_file']):
         print(f"错误: 未找到 {c['input_file']}")
         return
 
-    with open(c['input_file'], 'r', encoding='utf-16') as f:
-        content = f.read()
-    chars = sorted(list(set(ch for ch in content if ord(ch) != 0xFEFF)), key=ord)
+    chars = load_charset(c)
     total = len(chars)
     
     print(f"处理字符: {total} | 修复XML注释乱码")
@@ -166,91 +701,49 @@ def main():
     img_w = (c['cols'] * c['box_w']) + ((c['cols'] + 1) * c['border'])
     img_h = (rows * c['box_h']) + ((rows + 1) * c['border'])
 
+    glyphs = render_glyphs([ch for ch in chars if ch not in NO_RENDER_CHARS], c)
+
+    if c['output_mode'] in ('nftr', 'both'):
+        write_nftr(chars, glyphs, c)
+        if c['output_mode'] == 'nftr':
+            return
+
     full_img = Image.new("L", (img_w, img_h), 255)
-    try:
-        font = ImageFont.truetype(c['font_path'], int(c['font_size'] * c['upscale']))
-    except:
-        font = ImageFont.load_default()
-
-    # XML 构建
-    root = ET.Element("NFTR")
-    add_xml(root, "Version", "1.1")
-    add_xml(root, "LineGap", "15")
-    add_xml(root, "BoxWidth", c['box_w'])
-    add_xml(root, "BoxHeight", c['box_h'])
-    add_xml(root, "GlyphWidth", "15")
-    add_xml(root, "GlyphHeight", "13")
-    dw = add_xml(root, "DefaultWidth")
-    add_xml(dw, "IdRegion", "-1")
-    add_xml(dw, "BearingX", "0")
-    add_xml(dw, "Width", "15")
-    add_xml(dw, "Advance", "15")
-    add_xml(root, "ErrorChar", "0")
-    add_xml(root, "Depth", "2")
-    add_xml(root, "Rotation", "Rot270")
-    add_xml(root, "Encoding", "UTF8")
-    
-    # Maps & Widths
-    maps = add_xml(root, "Maps")
-    m0 = add_xml(maps, "Map")
-    add_xml(m0, "Id", "0"), add_xml(m0, "FirstChar", "3000"), add_xml(m0, "LastChar", "30FC"), add_xml(m0, "Type", "1")
-    m1 = add_xml(maps, "Map")
-    add_xml(m1, "Id", "1"), add_xml(m1, "FirstChar", "FF01"), add_xml(m1, "LastChar", "FF5E"), add_xml(m1, "Type", "1")
-    m2 = add_xml(maps, "Map")
-    add_xml(m2, "Id", "2"), add_xml(m2, "FirstChar", "0"), add_xml(m2, "LastChar", "FFFF"), add_xml(m2, "Type", "2")
-
-    widths = add_xml(root, "Widths")
-    r = add_xml(widths, "Region")
-    add_xml(r, "Id", "0"), add_xml(r, "FirstChar", "0"), add_xml(r, "LastChar", str(total - 1))
-    
-    glyphs_node = add_xml(root, "Glyphs")
-
-    for idx, char in enumerate(chars):
-        col = idx % c['cols']
-        row = idx // c['cols']
-        cx = (col * c['box_w']) + ((col + 1) * c['border'])
-        cy = (row * c['box_h']) + ((row + 1) * c['border'])
-
-        if char not in ['\n', '\r', '\t']:
-            g_img, xml_w, xml_bx, xml_ad = process_glyph(char, font, c)
-            if g_img:
-                full_img.paste(g_img, (cx, cy))
-        else:
-            xml_w, xml_bx, xml_ad = 5, 0, 8
 
-        char_code = ord(char)
-        id_map = determine_map_id(char_code)
+    # XML 流式写出
+    with open(c['output_xml'], 'w', encoding='utf-8', errors='xmlcharrefreplace', newline='\n') as xml_file:
+        writer = NftrXmlWriter(xml_file, c, total)
 
-        g = add_xml(glyphs_node, "Glyph")
-        
-        # 注释处理
-        comment_txt = char
-        if char == '\n': comment_txt = "\\n"
-        elif char == '\r': comment_txt = "\\r"
-        elif char == '\t': comment_txt = "\\t"
-        
-        g.append(ET.Comment(f" ({comment_txt}) "))
+        for idx, char in enumerate(chars):
+            col = idx % c['cols']
+            row = idx // c['cols']
+            cx = (col * c['box_w']) + ((col + 1) * c['border'])
+            cy = (row * c['box_h']) + ((row + 1) * c['border'])
 
-        add_xml(g, "Id", idx)
-        w = add_xml(g, "Width")
-        add_xml(w, "IdRegion", "0")
-        add_xml(w, "BearingX", xml_bx)
-        add_xml(w, "Width", xml_w)
-        add_xml(w, "Advance", xml_ad)
-        add_xml(g, "Code", format(char_code, 'X'))
-        add_xml(g, "IdMap", id_map)
+            if char not in NO_RENDER_CHARS:
+                g_data, xml_w, xml_bx, xml_ad = glyphs[char]
+                if g_data:
+                    full_img.paste(Image.frombytes("L", (c['box_w'], c['box_h']), g_data), (cx, cy))
+            else:
+                xml_w, xml_bx, xml_ad = 5, 0, 8
 
-    # 【关键修改】使用自定义缩进函数，不再用 minidom
-    indent_xml(root)
-    tree = ET.ElementTree(root)
+            writer.add_glyph(idx, char, xml_w, xml_bx, xml_ad)
 
-    # xml_declaration=True 会自动加上 <?xml...?> 头
-    tree.write(c['output_xml'], encoding="utf-8", xml_declaration=True, short_empty_elements=False)
+        writer.finish()
 
     print("正在量化颜色...")
     final_img = quantize_to_2bpp(full_img, c)
-    final_img.save(c['output_png'])
+    with instrument.span('png_save'):
+        final_img.save(c['output_png'])
     print(f"完成! XML中文注释已修复。")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    instrument.setup_from_argv()
+    if '--scan' in sys.argv[1:-1]:
+        CONFIG['charset_source'] = sys.argv[sys.argv.index('--scan') + 1]
+    if '--verify' in sys.argv[1:]:
+        verify_main()
+    else:
+        if '--nftr' in sys.argv[1:]:
+            CONFIG['output_mode'] = 'nftr'
+        main()
\ No newline at end of file
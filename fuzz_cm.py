@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CM 压缩格式的往返/差分模糊测试
+Usage:
+    python fuzz_cm.py [--iterations 100] [--seed 1] [--max-size 2048] [--no-cpp]
+    python fuzz_cm.py --replay <失败输入.bin> [--no-cpp]
+
+检查项:
+  - decompress_cm(compress_cm(x)) == x，头部字段与实际长度一致（分级压缩器 fast/lazy/optimal 同样检查）
+  - compress_cm_compatible(x) 与 compress_cm(x) 长度相同（--estimate 依赖这一点）
+  - decompress_cm(c, max_output=k) == x[:k]
+  - 可用 g++ 时编译 pack.cpp / unpack.cpp 中的编解码函数，交叉解压双方的压缩结果，
+    并对损坏的压缩流比较 Python 与 C++ 解压器的结果（同时报错或输出一致）
+  - Python 解压器对任意输入只允许抛出 ValueError
+失败输入保存在 fuzz_failures/，可用 --replay 复现。
+"""
+
+import os
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+from pack import CM_LEVELS, compress_cm, compress_cm_compatible
+from unpack import decompress_cm
+
+WINDOW = 4096
+MAX_MATCH = 18
+FAILURE_DIR = 'fuzz_failures'
+
+# ================= 输入生成 =================
+
+def gen_empty(rng, max_size):
+    return b''
+
+def gen_tiny(rng, max_size):
+    return bytes(rng.getrandbits(8) for _ in range(rng.randrange(1, 4)))
+
+def gen_runs(rng, max_size):
+    """长串相同字节：距离1的重叠匹配"""
+    out = bytearray()
+    while len(out) < max_size:
+        out += bytes([rng.getrandbits(8)]) * rng.randrange(1, 300)
+    return bytes(out[:rng.randrange(1, max_size + 1)])
+
+def gen_period(rng, max_size):
+    """短周期重复：距离小于长度的重叠匹配"""
+    period = bytes(rng.getrandbits(8) for _ in range(rng.randrange(1, 24)))
+    size = rng.randrange(1, max_size + 1)
+    return (period * (size // len(period) + 1))[:size]
+
+def gen_window_edge(rng, max_size):
+    """相同片段相隔约 4096 字节：测试窗口边界（距离 4095/4096/4097）"""
+    head = bytes(rng.randrange(1, 256) for _ in range(MAX_MATCH + rng.randrange(0, 4)))
+    gap = WINDOW + rng.randrange(-3, 4) - len(head)
+    return head + bytes(gap) + head
+
+def gen_random(rng, max_size):
+    """不可压缩数据：全部为字面量"""
+    return bytes(rng.getrandbits(8) for _ in range(rng.randrange(1, max_size + 1)))
+
+def gen_script(rng, max_size):
+    from bench import make_script
+    data = make_script(rng, max_size // 0x180 + 1)
+    return data[:rng.randrange(1, max_size + 1)]
+
+def gen_mixed(rng, max_size):
+    parts = [gen_runs, gen_period, gen_random, gen_tiny]
+    out = bytearray()
+    while len(out) < max_size:
+        out += rng.choice(parts)(rng, max(1, max_size // 4))
+    return bytes(out[:max_size])
+
+GENERATORS = {
+    'empty': gen_empty,
+    'tiny': gen_tiny,
+    'runs': gen_runs,
+    'period': gen_period,
+    'window_edge': gen_window_edge,
+    'random': gen_random,
+    'script': gen_script,
+    'mixed': gen_mixed,
+}
+
+def corrupt(rng, packed):
+    """对合法压缩流做截断/翻转/改头部，用于解压器差分"""
+    data = bytearray(packed)
+    kind = rng.randrange(4)
+    if kind == 0 and data:
+        del data[rng.randrange(len(data)):]
+    elif kind == 1 and len(data) > 12:
+        for _ in range(rng.randrange(1, 4)):
+            data[rng.randrange(12, len(data))] ^= 1 << rng.randrange(8)
+    elif kind == 2 and len(data) >= 12:
+        struct.pack_into('<I', data, 4, struct.unpack_from('<I', data, 4)[0] + rng.randrange(1, 64))
+    elif len(data) >= 12:
+        struct.pack_into('<I', data, 8, rng.randrange(0, len(data)))
+    return bytes(data)
+
+# ================= C++ 实现 =================
+
+HARNESS_SRC = r'''
+#define main cm_tool_main
+#include "%(source)s"
+#undef main
+#include <cstdio>
+#ifdef _WIN32
+#include <io.h>
+#include <fcntl.h>
+#endif
+
+// 输入: [u32 长度][数据]...  输出: [u32 状态 0=成功 1=异常][u32 长度][数据]...
+static bool read_exact(void* p, size_t n) { return n == 0 || fread(p, 1, n, stdin) == n; }
+static uint32_t read_u32(const uint8_t* p) {
+    return (uint32_t)p[0] | ((uint32_t)p[1] << 8) | ((uint32_t)p[2] << 16) | ((uint32_t)p[3] << 24);
+}
+static void write_u32(uint32_t v) {
+    uint8_t b[4] = {uint8_t(v), uint8_t(v >> 8), uint8_t(v >> 16), uint8_t(v >> 24)};
+    fwrite(b, 1, 4, stdout);
+}
+
+int main() {
+#ifdef _WIN32
+    _setmode(_fileno(stdin), _O_BINARY);
+    _setmode(_fileno(stdout), _O_BINARY);
+#endif
+    uint8_t hdr[4];
+    while (read_exact(hdr, 4)) {
+        uint32_t n = read_u32(hdr);
+        std::vector<uint8_t> in(n);
+        if (!read_exact(in.data(), n)) return 1;
+        try {
+            std::vector<uint8_t> out = %(func)s(in);
+            write_u32(0);
+            write_u32(static_cast<uint32_t>(out.size()));
+            fwrite(out.data(), 1, out.size(), stdout);
+        } catch (const std::exception&) {
+            write_u32(1);
+            write_u32(0);
+        }
+    }
+    return 0;
+}
+'''
+
+class CppCodec:
+    """把 pack.cpp / unpack.cpp 的编解码函数编成批处理小程序，通过管道调用"""
+
+    def __init__(self, build_dir):
+        here = os.path.dirname(os.path.abspath(__file__))
+        self.compress_exe = self._build(build_dir, os.path.join(here, 'pack.cpp'), 'compress_cm', 'cm_compress')
+        self.decompress_exe = self._build(build_dir, os.path.join(here, 'unpack.cpp'), 'decompress_cm', 'cm_decompress')
+
+    @staticmethod
+    def _build(build_dir, source, func, name):
+        src_path = os.path.join(build_dir, name + '.cpp')
+        exe_path = os.path.join(build_dir, name + ('.exe' if os.name == 'nt' else ''))
+        with open(src_path, 'w', encoding='utf-8') as f:
+            f.write(HARNESS_SRC % {'source': source.replace('\\', '/'), 'func': func})
+        cxx = os.environ.get('CXX', 'g++')
+        subprocess.run([cxx, '-O2', '-std=c++17', src_path, '-o', exe_path],
+                       check=True, capture_output=True)
+        return exe_path
+
+    @staticmethod
+    def _run(exe, inputs):
+        """返回 [bytes 或 None(异常)]"""
+        payload = b''.join(struct.pack('<I', len(x)) + x for x in inputs)
+        out = subprocess.run([exe], input=payload, check=True, capture_output=True).stdout
+        results, pos = [], 0
+        for _ in inputs:
+            status, size = struct.unpack_from('<II', out, pos)
+            pos += 8
+            results.append(out[pos:pos + size] if status == 0 else None)
+            pos += size
+        return results
+
+    def compress(self, inputs):
+        return self._run(self.compress_exe, inputs)
+
+    def decompress(self, inputs):
+        return self._run(self.decompress_exe, inputs)
+
+def load_cpp_codec(build_dir):
+    cxx = os.environ.get('CXX', 'g++')
+    if shutil.which(cxx) is None:
+        print(f"未找到编译器 {cxx}，跳过 C++ 差分")
+        return None
+    try:
+        return CppCodec(build_dir)
+    except subprocess.CalledProcessError as e:
+        print(f"C++ 编译失败，跳过差分:\n{e.stderr.decode(errors='replace')}")
+        return None
+
+# ================= 检查 =================
+
+def py_decompress_outcome(data, max_output=0):
+    """解压结果；ValueError 视为正常的拒绝(None)，其他异常原样抛出"""
+    try:
+        return decompress_cm(data, max_output)
+    except ValueError:
+        return None
+
+def check_stream(raw, packed):
+    """检查单个压缩结果，返回错误描述列表"""
+    errors = []
+    if len(packed) < 12 or packed[:4] != b'CM\0\0':
+        return [f"头部无效: {packed[:12].hex()}"]
+    out_len, token_len = struct.unpack_from('<II', packed, 4)
+    if out_len != len(raw):
+        errors.append(f"头部长度 {out_len} != {len(raw)}")
+    flag_bytes = len(packed) - 12 - token_len
+    if flag_bytes < 0:
+        errors.append(f"token 区长度 {token_len} 超出数据")
+    else:
+        # 每个 token 1 或 2 字节，各占 1 个标志位
+        tokens_min, tokens_max = (token_len + 1) // 2, token_len
+        if not (tokens_min + 7) // 8 <= flag_bytes <= (tokens_max + 7) // 8:
+            errors.append(f"标志位区 {flag_bytes} 字节与 token 区 {token_len} 字节不符")
+
+    result = py_decompress_outcome(packed)
+    if result != raw:
+        errors.append("往返不一致" if result is not None else "Python 解压拒绝了合法流")
+    return errors
+
+def fuzz(iterations, seed, max_size, cpp):
+    failures = {}   # 用例序号 -> (生成器, 输入, [错误])
+    total_raw = 0
+    timings = {'py_compress': 0.0, 'py_decompress': 0.0}
+    timings.update((f'py_{level}', 0.0) for level, _ in CM_LEVELS)
+    cases = []
+
+    for i in range(iterations):
+        rng = random.Random(f"{seed}:{i}")
+        name = list(GENERATORS)[i % len(GENERATORS)]
+        raw = GENERATORS[name](rng, max_size)
+
+        t0 = time.perf_counter()
+        packed = compress_cm(raw)
+        t1 = time.perf_counter()
+        errors = check_stream(raw, packed)
+        t2 = time.perf_counter()
+        timings['py_compress'] += t1 - t0
+        timings['py_decompress'] += t2 - t1
+        total_raw += len(raw)
+
+        for level, func in CM_LEVELS:
+            t0 = time.perf_counter()
+            level_packed = func(raw)
+            timings[f'py_{level}'] += time.perf_counter() - t0
+            errors += [f"{level}: {e}" for e in check_stream(raw, level_packed)]
+
+        compatible = compress_cm_compatible(raw)
+        errors += [f"compatible: {e}" for e in check_stream(raw, compatible)]
+        if len(compatible) != len(packed):
+            errors.append(f"compatible 长度 {len(compatible)} != compress_cm {len(packed)}")
+
+        if raw:
+            k = rng.randrange(1, len(raw) + 1)
+            if py_decompress_outcome(packed, k) != raw[:k]:
+                errors.append(f"max_output={k} 前缀不一致")
+
+        bad = corrupt(rng, packed)
+        try:
+            py_decompress_outcome(bad)
+        except Exception as e:
+            errors.append(f"损坏流引发非 ValueError 异常: {type(e).__name__}: {e}")
+
+        cases.append((i, name, raw, packed, bad))
+        if errors:
+            failures[i] = (name, raw, errors)
+
+    if cpp is not None:
+        raws = [c[2] for c in cases]
+        t0 = time.perf_counter()
+        cpp_packed = cpp.compress(raws)
+        t1 = time.perf_counter()
+        cpp_of_py = cpp.decompress([c[3] for c in cases])
+        t2 = time.perf_counter()
+        py_of_cpp = [py_decompress_outcome(p) if p is not None else None for p in cpp_packed]
+        cpp_bad = cpp.decompress([c[4] for c in cases])
+        timings['cpp_compress'] = t1 - t0
+        timings['cpp_decompress'] = t2 - t1
+
+        for (i, name, raw, packed, bad), c_packed, c_dec, p_dec, c_bad in zip(
+                cases, cpp_packed, cpp_of_py, py_of_cpp, cpp_bad):
+            errors = []
+            if c_dec != raw:
+                errors.append("C++ 解压 Python 压缩结果不一致")
+            if c_packed is None:
+                errors.append("C++ 压缩异常")
+            else:
+                errors += [f"C++ 压缩: {e}" for e in check_stream(raw, c_packed)]
+                if p_dec != raw:
+                    errors.append("Python 解压 C++ 压缩结果不一致")
+            if py_decompress_outcome(bad) != c_bad:
+                errors.append("损坏流: Python 与 C++ 解压结果不同")
+            if errors:
+                failures.setdefault(i, (name, raw, []))[2].extend(errors)
+
+    return failures, total_raw, timings
+
+def save_failure(i, name, raw):
+    os.makedirs(FAILURE_DIR, exist_ok=True)
+    path = os.path.join(FAILURE_DIR, f"{i}-{name}.bin")
+    with open(path, 'wb') as f:
+        f.write(raw)
+    return path
+
+def replay(path, cpp):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    errors = check_stream(raw, compress_cm(raw))
+    if cpp is not None:
+        c_packed, = cpp.compress([raw])
+        c_dec, = cpp.decompress([compress_cm(raw)])
+        if c_dec != raw:
+            errors.append("C++ 解压 Python 压缩结果不一致")
+        if c_packed is None or py_decompress_outcome(c_packed) != raw:
+            errors.append("Python 解压 C++ 压缩结果不一致")
+    for e in errors:
+        print(f"  {e}")
+    print(f"{path}: {'失败' if errors else '通过'}")
+    return not errors
+
+def main():
+    args = sys.argv[1:]
+    iterations, seed, max_size = 100, 1, 2048
+    use_cpp = True
+    replay_path = None
+
+    while args:
+        arg = args.pop(0)
+        if arg == '--iterations' and args:
+            iterations = int(args.pop(0))
+        elif arg == '--seed' and args:
+            seed = int(args.pop(0))
+        elif arg == '--max-size' and args:
+            max_size = int(args.pop(0))
+        elif arg == '--replay' and args:
+            replay_path = args.pop(0)
+        elif arg == '--no-cpp':
+            use_cpp = False
+        else:
+            print(__doc__.strip())
+            sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as build_dir:
+        cpp = load_cpp_codec(build_dir) if use_cpp else None
+
+        if replay_path:
+            sys.exit(0 if replay(replay_path, cpp) else 1)
+
+        failures, total_raw, timings = fuzz(iterations, seed, max_size, cpp)
+
+    print(f"用例: {iterations} | 原始数据: {total_raw} 字节 | C++ 差分: {'是' if cpp else '否'}")
+    for name, seconds in timings.items():
+        rate = total_raw / seconds / 1e6 if seconds else 0
+        print(f"  {name:<15} {seconds:8.3f} s {rate:10.3f} MB/s")
+
+    if failures:
+        for i, (name, raw, errors) in sorted(failures.items()):
+            path = save_failure(i, name, raw)
+            print(f"失败 #{i} [{name}] {len(raw)} 字节 -> {path}")
+            for e in errors:
+                print(f"  {e}")
+        sys.exit(1)
+    print("全部通过")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+各工具共用的计时/计数记录（默认关闭，关闭时只多一次函数调用）
+
+命令行加 --trace <文件> 开启:
+    python unpack.py <dat_folder> <output_folder> --trace trace.jsonl
+    python pack.py <input_folder> <output_folder> --trace trace.json
+
+  *.json  -> Chrome trace（chrome://tracing 或 Perfetto 打开）
+  其他    -> JSON Lines，每行一个事件
+结束时额外打印按名称汇总的调用次数、耗时、输入/输出字节与压缩率。
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+_events = []
+_counters = {}
+_trace_path = None
+_t0 = time.perf_counter()
+
+def enabled() -> bool:
+    return _trace_path is not None
+
+def _now_us() -> float:
+    return (time.perf_counter() - _t0) * 1e6
+
+def _size(value):
+    return len(value) if isinstance(value, (bytes, bytearray, memoryview)) else None
+
+def record(name, start_us, dur_us, **fields):
+    _events.append({
+        'name': name,
+        'ts': start_us,
+        'dur': dur_us,
+        'pid': os.getpid(),
+        'tid': threading.get_ident(),
+        'args': {k: v for k, v in fields.items() if v is not None},
+    })
+
+def count(name, n=1):
+    """累加计数器（如处理的文件数、字形数）"""
+    if _trace_path is None:
+        return
+    _counters[name] = _counters.get(name, 0) + n
+    _events.append({'name': name, 'ph': 'C', 'ts': _now_us(), 'pid': os.getpid(),
+                    'args': {name: _counters[name]}})
+
+@contextmanager
+def span(name, **fields):
+    """计时一段代码；fields 可在块内通过返回的 dict 补充（如 bytes_out）"""
+    if _trace_path is None:
+        yield fields
+        return
+    start = _now_us()
+    try:
+        yield fields
+    finally:
+        record(name, start, _now_us() - start, **fields)
+
+def timed(name=None):
+    """
+    函数计时装饰器。第一个 bytes 类参数记为 bytes_in，bytes 类返回值记为 bytes_out。
+    """
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _trace_path is None:
+                return func(*args, **kwargs)
+            bytes_in = next((n for n in map(_size, args) if n is not None), None)
+            start = _now_us()
+            result = func(*args, **kwargs)
+            record(label, start, _now_us() - start, bytes_in=bytes_in, bytes_out=_size(result))
+            return result
+        return wrapper
+    return decorator
+
+def summarize():
+    """按名称汇总: {name: {calls, ms, bytes_in, bytes_out}}"""
+    totals = {}
+    for ev in _events:
+        if ev.get('ph') == 'C':
+            continue
+        t = totals.setdefault(ev['name'], {'calls': 0, 'ms': 0.0, 'bytes_in': 0, 'bytes_out': 0})
+        t['calls'] += 1
+        t['ms'] += ev['dur'] / 1000
+        t['bytes_in'] += ev['args'].get('bytes_in', 0)
+        t['bytes_out'] += ev['args'].get('bytes_out', 0)
+    return totals
+
+def print_summary(file=sys.stderr):
+    totals = summarize()
+    if not totals and not _counters:
+        return
+    print(f"\n{'名称':<36}{'次数':>8}{'耗时ms':>12}{'输入':>12}{'输出':>12}{'比率':>8}", file=file)
+    for name, t in sorted(totals.items(), key=lambda kv: -kv[1]['ms']):
+        ratio = f"{t['bytes_out'] / t['bytes_in']:.3f}" if t['bytes_in'] and t['bytes_out'] else ''
+        print(f"{name:<36}{t['calls']:>8}{t['ms']:>12.1f}{t['bytes_in'] or '':>12}{t['bytes_out'] or '':>12}{ratio:>8}",
+              file=file)
+    for name, value in sorted(_counters.items()):
+        print(f"{name:<36}{value:>8}", file=file)
+
+def write_trace(path):
+    if path.endswith('.json'):
+        events = [dict(ev, ph=ev.get('ph', 'X')) for ev in _events]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            for ev in _events:
+                f.write(json.dumps(ev, ensure_ascii=False) + '\n')
+
+def _finish():
+    write_trace(_trace_path)
+    print_summary()
+    print(f"trace: {_trace_path} ({len(_events)} 事件)", file=sys.stderr)
+
+def enable(path):
+    global _trace_path
+    if _trace_path is None:
+        atexit.register(_finish)
+    _trace_path = path
+
+def setup_from_argv(argv=None):
+    """从命令行取出 --trace <文件> 并开启记录，其余参数原样留给工具自身解析"""
+    argv = sys.argv if argv is None else argv
+    if '--trace' in argv[1:-1]:
+        i = argv.index('--trace')
+        enable(argv[i + 1])
+        del argv[i:i + 2]
@@ -1,16 +1,22 @@
 import os
 import re
+import math
+import random
 import struct
+import time
 from pathlib import Path
 import sys
 
+import instrument
+
+@instrument.timed('compress_cm')
 def compress_cm(data: bytes) -> bytes:
     """
     压缩数据为 'CM' 格式。
     使用简单的LZ77算法实现。
     """
     if not data:
-        return b'CM' + struct.pack('<II', 0, 0)
+        return b'CM\x00\x00' + struct.pack('<II', 0, 0)
     
     out_len = len(data)
     tokens = bytearray()
@@ -73,6 +79,260 @@ def compress_cm(data: bytes) -> bytes:
     
     return header + tokens + flag_bytes
 
+# ================= 分级压缩器（--budget 使用） =================
+# 输出同为 CM 格式，fast < lazy < optimal 依次更慢、压缩率更高。
+# 与 compress_cm 不同，这里允许重叠匹配（距离 < 长度），窗口为完整的 4096。
+
+CM_WINDOW = 4096
+CM_MIN_MATCH = 3
+CM_MAX_MATCH = 18
+
+def _pack_cm(out_len, tokens, flags):
+    """头部 + token 区 + 标志位区（LSB-first）"""
+    flag_bytes = bytearray((len(flags) + 7) // 8)
+    for i, bit in enumerate(flags):
+        if bit:
+            flag_bytes[i >> 3] |= 1 << (i & 7)
+    return b'CM\x00\x00' + struct.pack('<II', out_len, len(tokens)) + bytes(tokens) + bytes(flag_bytes)
+
+class _MatchFinder:
+    """以开头3字节为键的哈希链，查找窗口内的最长匹配"""
+
+    def __init__(self, data, max_chain, window=CM_WINDOW, overlap=True):
+        self.data = data
+        self.max_chain = max_chain
+        self.window = window
+        self.overlap = overlap
+        self.head = {}
+        self.prev = [-1] * len(data)
+        self.inserted = 0
+
+    def _insert_upto(self, pos):
+        data, head, prev = self.data, self.head, self.prev
+        for i in range(self.inserted, min(pos, len(data) - 2)):
+            key = data[i:i + 3]
+            prev[i] = head.get(key, -1)
+            head[key] = i
+        self.inserted = max(self.inserted, pos)
+
+    def longest(self, i):
+        """返回 (长度, 距离)；没有 >=3 的匹配时长度为 0"""
+        data = self.data
+        limit = min(CM_MAX_MATCH, len(data) - i)
+        if limit < CM_MIN_MATCH:
+            return 0, 0
+        self._insert_upto(i)
+
+        best_len = best_dist = 0
+        p = self.head.get(data[i:i + 3], -1)
+        chain = self.max_chain
+        while p >= 0 and i - p <= self.window and chain:
+            cap = limit if self.overlap else min(limit, i - p)
+            # 先比较能让匹配变长的那个字节，不可能更长的候选直接跳过
+            if CM_MIN_MATCH <= cap > best_len and data[p + best_len] == data[i + best_len]:
+                n = CM_MIN_MATCH
+                while n < cap and data[p + n] == data[i + n]:
+                    n += 1
+                if n > best_len:
+                    best_len, best_dist = n, i - p
+                    if n == limit:
+                        break
+            p = self.prev[p]
+            chain -= 1
+        return best_len, best_dist
+
+def _compress_greedy(data, max_chain, lazy, window=CM_WINDOW, overlap=True):
+    data = bytes(data)
+    n = len(data)
+    finder = _MatchFinder(data, max_chain, window, overlap)
+    tokens = bytearray()
+    flags = []
+    ahead = None    # lazy: 上一轮向后看一位的结果
+
+    i = 0
+    while i < n:
+        if ahead is not None and ahead[0] == i:
+            _, length, dist = ahead
+        else:
+            length, dist = finder.longest(i)
+        ahead = None
+        if lazy and CM_MIN_MATCH <= length < CM_MAX_MATCH and i + 1 < n:
+            ahead = (i + 1,) + finder.longest(i + 1)
+            if ahead[1] > length:
+                length = 0
+
+        if length >= CM_MIN_MATCH:
+            tokens += (((length - CM_MIN_MATCH) << 12) | (dist - 1)).to_bytes(2, 'little')
+            flags.append(1)
+            i += length
+        else:
+            tokens.append(data[i])
+            flags.append(0)
+            i += 1
+    return _pack_cm(n, tokens, flags)
+
+@instrument.timed('compress_cm_fast')
+def compress_cm_fast(data: bytes) -> bytes:
+    """贪心解析，每个位置只看哈希链上最近的 8 个候选"""
+    return _compress_greedy(data, max_chain=8, lazy=False)
+
+@instrument.timed('compress_cm_lazy')
+def compress_cm_lazy(data: bytes) -> bytes:
+    """完整哈希链 + 延迟一位匹配（下一位置匹配更长时先输出字面量）"""
+    return _compress_greedy(data, max_chain=CM_WINDOW, lazy=True)
+
+@instrument.timed('compress_cm_optimal')
+def compress_cm_optimal(data: bytes) -> bytes:
+    """
+    最优解析：字面量 9 bit、匹配 17 bit，从后向前动态规划求总长最小的切分。
+    任一位置最长匹配为 L 时，3..L 的任意长度都可用同一距离取得。
+    """
+    data = bytes(data)
+    n = len(data)
+    finder = _MatchFinder(data, max_chain=CM_WINDOW)
+    matches = [finder.longest(i) for i in range(n)]
+
+    cost = [0] * (n + 1)
+    step = [1] * (n + 1)
+    for i in range(n - 1, -1, -1):
+        best, pick = 9 + cost[i + 1], 1
+        longest = matches[i][0]
+        for length in range(CM_MIN_MATCH, longest + 1):
+            c = 17 + cost[i + length]
+            if c < best:
+                best, pick = c, length
+        cost[i], step[i] = best, pick
+
+    tokens = bytearray()
+    flags = []
+    i = 0
+    while i < n:
+        length = step[i]
+        if length >= CM_MIN_MATCH:
+            tokens += (((length - CM_MIN_MATCH) << 12) | (matches[i][1] - 1)).to_bytes(2, 'little')
+            flags.append(1)
+        else:
+            tokens.append(data[i])
+            flags.append(0)
+        i += length
+    return _pack_cm(n, tokens, flags)
+
+def compress_cm_compatible(data: bytes) -> bytes:
+    """
+    与 compress_cm 相同的解析（贪心最长匹配、不重叠、距离 <= 4095），输出长度与之完全一致，
+    仅同长匹配的距离选择可能不同。用哈希链代替逐位置扫描整个窗口，供 --estimate 抽样使用。
+    """
+    return _compress_greedy(data, max_chain=CM_WINDOW, lazy=False, window=CM_WINDOW - 1, overlap=False)
+
+CM_LEVELS = (
+    ('fast', compress_cm_fast),
+    ('lazy', compress_cm_lazy),
+    ('optimal', compress_cm_optimal),
+)
+
+# 升到该档的预期收益（占当前压缩后大小的比例）与相对 fast 的每字节耗时倍数，运行中按实测修正
+LEVEL_PRIOR_GAIN = {'lazy': 0.03, 'optimal': 0.005}
+LEVEL_PRIOR_COST = {'lazy': 6.0, 'optimal': 40.0}
+
+def dat_size(sizes):
+    """成员压缩后大小为 sizes 时，build_dat 输出的总大小"""
+    return (8 + len(sizes) * 4 + 31) // 32 * 32 + sum((size + 31) // 32 * 32 for size in sizes)
+
+def compress_to_budget(raws, budget):
+    """
+    先全部用 fast 压缩；对齐后的总大小超出 budget 时，每次挑 预期节省字节/预期耗时 最高的成员
+    升一档重新压缩，直到不超预算或所有成员都已是最高档。
+    返回 (压缩结果列表, 各成员采用的档位名, .dat 总大小)
+    """
+    names = [name for name, _ in CM_LEVELS]
+    fast = CM_LEVELS[0][1]
+
+    start = time.perf_counter()
+    packed = [fast(raw) for raw in raws]
+    fast_spb = (time.perf_counter() - start) / max(1, sum(map(len, raws)))
+
+    sizes = [len(c) for c in packed]
+    tried = [0] * len(raws)     # 已尝试到的档位
+    used = [0] * len(raws)      # 实际采用结果的档位
+    # 每档: [样本数, 收益比例之和, 每字节耗时之和]，先验按一个样本计
+    stats = {name: [1, LEVEL_PRIOR_GAIN[name], fast_spb * LEVEL_PRIOR_COST[name]] for name in names[1:]}
+
+    total = dat_size(sizes)
+    while total > budget:
+        best, best_rate = None, -1.0
+        for i, raw in enumerate(raws):
+            if tried[i] + 1 >= len(CM_LEVELS) or not raw:
+                continue
+            n, gain_sum, spb_sum = stats[names[tried[i] + 1]]
+            rate = (sizes[i] * gain_sum / n) / (len(raw) * spb_sum / n)
+            if rate > best_rate:
+                best, best_rate = i, rate
+        if best is None:
+            break
+
+        level = tried[best] + 1
+        name, func = CM_LEVELS[level]
+        t = time.perf_counter()
+        candidate = func(raws[best])
+        elapsed = time.perf_counter() - t
+
+        st = stats[name]
+        st[0] += 1
+        st[1] += max(0, sizes[best] - len(candidate)) / sizes[best]
+        st[2] += elapsed / len(raws[best])
+
+        tried[best] = level
+        if len(candidate) < sizes[best]:
+            packed[best], sizes[best], used[best] = candidate, len(candidate), level
+            total = dat_size(sizes)
+
+    return packed, [names[level] for level in used], total
+
+def build_dat(compressed_files):
+    """
+    把已压缩的成员拼成.dat（与unpack.py读取的布局一致）:
+      - 0x00: uint32 文件数量
+      - 0x04: uint32 数据起始地址/32
+      - 0x08: uint32[文件数量] 各文件结束地址/32
+      - 数据区从索引表之后的32字节边界开始，每个文件按32字节对齐
+    """
+    file_count = len(compressed_files)
+    header_size = 8 + file_count * 4
+    data_start = (header_size + 31) // 32 * 32
+    
+    end_values = []
+    current_position = data_start
+    for compressed_data in compressed_files:
+        current_position += (len(compressed_data) + 31) // 32 * 32
+        end_values.append(current_position // 32)
+    
+    output_data = bytearray(current_position)
+    struct.pack_into(f'<II{file_count}I', output_data, 0, file_count, data_start // 32, *end_values)
+    
+    position = data_start
+    for compressed_data, end_value in zip(compressed_files, end_values):
+        output_data[position:position + len(compressed_data)] = compressed_data
+        position = end_value * 32
+    
+    return bytes(output_data)
+
+def repack_dat(data, name_mapping, transform):
+    """
+    在内存中重建.dat: 对每个成员调用 transform(序号, 名称, 压缩数据)，
+    返回新的未压缩数据则重新压缩替换，返回None则原样保留压缩数据。
+    """
+    from unpack import read_dat_index
+    
+    compressed_files = []
+    for i, (start, end) in enumerate(read_dat_index(data)):
+        member = data[start:end] if start < end else b''
+        raw = transform(i, name_mapping.get(i), member)
+        if raw is None:
+            compressed_files.append(member)
+        else:
+            compressed_files.append(compress_cm(raw))
+    return build_dat(compressed_files)
+
 def parse_header_file(h_file_path):
     """解析.h文件获取文件名到文件ID的映射"""
     name_to_id = {}
@@ -98,15 +358,8 @@ def create_header_file(output_path, file_mapping):
         for name, file_id in sorted(file_mapping.items(), key=lambda x: x[1]):
             f.write(f"#define {name} {file_id}\n")
 
-def pack_dat_file(input_folder, dat_output_path, h_output_path=None):
-    """将文件夹中的文件打包成.dat文件"""
-    input_path = Path(input_folder)
-    
-    if not input_path.exists():
-        print(f"错误: 输入文件夹 {input_folder} 不存在")
-        return False
-    
-    # 获取所有文件并排序
+def collect_pack_files(input_path):
+    """列出文件夹中 "序号.名称" / "序号" 格式的文件，返回 (按序号排序的文件列表, 名称->序号)"""
     files = []
     file_mapping = {}
     
@@ -133,10 +386,6 @@ def pack_dat_file(input_folder, dat_output_path, h_output_path=None):
                 print(f"警告: 跳过无效文件名 {filename}")
                 continue
     
-    if not files:
-        print(f"错误: 在 {input_folder} 中没有找到有效文件")
-        return False
-    
     # 按ID排序
     files.sort(key=lambda x: x['id'])
     
@@ -147,56 +396,55 @@ def pack_dat_file(input_folder, dat_output_path, h_output_path=None):
             print(f"警告: 文件ID不连续，期望 {expected_id}，实际 {f['id']}")
         expected_id = f['id'] + 1
     
-    file_count = len(files)
-    print(f"准备打包 {file_count} 个文件")
-    
-    # 压缩所有文件
-    compressed_files = []
-    for f in files:
-        with open(f['path'], 'rb') as fp:
-            raw_data = fp.read()
-        compressed_data = compress_cm(raw_data)
-        compressed_files.append(compressed_data)
-        print(f"  压缩文件 {f['id']}: {f['name'] or '(无名)'} ({len(raw_data)} -> {len(compressed_data)} 字节)")
-    
-    # 计算索引表
-    current_position = 0x800  # 第一个文件从0x800开始
-    index_values = []
-    
-    for i, compressed_data in enumerate(compressed_files):
-        if i > 0:  # 第一个文件不需要索引值（总是在0x800）
-            # 计算索引值（位置除以32）
-            index_value = current_position // 32
-            index_values.append(index_value)
-        
-        # 对齐到32字节边界
-        file_size = len(compressed_data)
-        aligned_size = (file_size + 31) // 32 * 32
-        current_position += aligned_size
+    return files, file_mapping
+
+@instrument.timed('pack_dat_file')
+def pack_dat_file(input_folder, dat_output_path, h_output_path=None, budget=None):
+    """
+    将文件夹中的文件打包成.dat文件。
+    给出 budget（字节）时按预算逐级提高压缩强度，超出预算返回 False（仍会写出结果）。
+    """
+    input_path = Path(input_folder)
     
-    # 构建DAT文件
-    output_data = bytearray()
+    if not input_path.exists():
+        print(f"错误: 输入文件夹 {input_folder} 不存在")
+        return False
     
-    # 写入文件头
-    output_data.extend(struct.pack('<I', file_count))  # 文件数量
-    output_data.extend(struct.pack('<I', 0x20))        # 固定值（通常是0x20）
+    files, file_mapping = collect_pack_files(input_path)
+    if not files:
+        print(f"错误: 在 {input_folder} 中没有找到有效文件")
+        return False
     
-    # 写入索引表
-    for value in index_values:
-        output_data.extend(struct.pack('<I', value))
+    file_count = len(files)
+    print(f"准备打包 {file_count} 个文件")
     
-    # 填充到0x800
-    while len(output_data) < 0x800:
-        output_data.append(0)
+    raws = []
+    for f in files:
+        with instrument.span('file_read') as ev:
+            with open(f['path'], 'rb') as fp:
+                raw_data = fp.read()
+            ev['bytes_in'] = len(raw_data)
+        raws.append(raw_data)
     
-    # 写入压缩的文件数据
-    for compressed_data in compressed_files:
-        start_pos = len(output_data)
-        output_data.extend(compressed_data)
-        
-        # 对齐到32字节边界
-        while len(output_data) % 32 != 0:
-            output_data.append(0)
+    # 压缩所有文件
+    if budget is None:
+        compressed_files = []
+        for f, raw_data in zip(files, raws):
+            compressed_data = compress_cm(raw_data)
+            instrument.count('members_packed')
+            compressed_files.append(compressed_data)
+            print(f"  压缩文件 {f['id']}: {f['name'] or '(无名)'} ({len(raw_data)} -> {len(compressed_data)} 字节)")
+    else:
+        start = time.perf_counter()
+        compressed_files, levels, _ = compress_to_budget(raws, budget)
+        elapsed = time.perf_counter() - start
+        for f, raw_data, compressed_data, level in zip(files, raws, compressed_files, levels):
+            instrument.count('members_packed')
+            print(f"  压缩文件 {f['id']}: {f['name'] or '(无名)'} ({len(raw_data)} -> {len(compressed_data)} 字节, {level})")
+        counts = ', '.join(f"{name} {levels.count(name)}" for name, _ in CM_LEVELS)
+        print(f"压缩档位: {counts} | 耗时 {elapsed:.2f} 秒")
+    
+    output_data = build_dat(compressed_files)
     
     # 写入DAT文件
     with open(dat_output_path, 'wb') as f:
@@ -204,14 +452,121 @@ def pack_dat_file(input_folder, dat_output_path, h_output_path=None):
     
     print(f"成功创建 {dat_output_path} ({len(output_data)} 字节)")
     
+    if budget is not None:
+        headroom = budget - len(output_data)
+        if headroom >= 0:
+            print(f"预算 {budget} 字节，剩余 {headroom} 字节")
+        else:
+            print(f"错误: 超出预算 {-headroom} 字节 (预算 {budget})")
+    
     # 创建.h文件（如果需要）
     if h_output_path and file_mapping:
         create_header_file(h_output_path, file_mapping)
         print(f"成功创建 {h_output_path}")
     
-    return True
+    return budget is None or len(output_data) <= budget
+
+def resolve_budget(budget, folder_name):
+    """--budget 可以是字节数，或原始.dat所在文件夹（以同名原文件大小为预算）"""
+    if budget is None:
+        return None
+    if os.path.isdir(budget):
+        orig = os.path.join(budget, f"{folder_name}.dat")
+        return os.path.getsize(orig) if os.path.exists(orig) else None
+    return int(budget)
+
+# ================= 大小预估（--estimate） =================
+# 抽样窗口用 compress_cm_compatible 压缩：解析与 compress_cm 一致，抽到的窗口大小即为真实大小，
+# 误差只来自抽样本身和 32 字节对齐。
+
+ESTIMATE_WINDOW = 2048      # 抽样窗口
+ESTIMATE_WARMUP = CM_WINDOW # 窗口前补一整个滑动窗口的上文，与完整压缩时可见的历史一致
+ESTIMATE_SAMPLES = 8        # 每个成员最多抽几个窗口
+
+def _window_cost(raw, start, end, compressor):
+    """[start, end) 在有上文时压缩后的增量字节数"""
+    warm = max(0, start - ESTIMATE_WARMUP)
+    if warm == start:
+        return len(compressor(raw[start:end])) - 12
+    return len(compressor(raw[warm:end])) - len(compressor(raw[warm:start]))
+
+def estimate_member(raw, rng, compressor=compress_cm_compatible):
+    """
+    估计成员压缩后大小，返回 (估计值, 标准差)。
+    开头没有上文、压缩率明显偏低，单独完整压缩；其余部分分层抽样。
+    """
+    n = len(raw)
+    head = min(n, ESTIMATE_WARMUP)
+    head_cost = len(compressor(raw[:head]))
+    rest = n - head
+    if rest <= ESTIMATE_WINDOW * 2:
+        return float(head_cost + _window_cost(raw, head, n, compressor)) if rest else float(head_cost), 0.0
+
+    # 分层抽样：把剩余部分均分为 k 段，每段内随机取一个窗口
+    k = min(ESTIMATE_SAMPLES, rest // ESTIMATE_WINDOW)
+    stratum = rest / k
+    ratios = []
+    for j in range(k):
+        lo = head + int(j * stratum)
+        hi = max(lo, head + int((j + 1) * stratum) - ESTIMATE_WINDOW)
+        start = rng.randrange(lo, hi + 1)
+        ratios.append(_window_cost(raw, start, start + ESTIMATE_WINDOW, compressor) / ESTIMATE_WINDOW)
+
+    mean = sum(ratios) / k
+    var = sum((r - mean) ** 2 for r in ratios) / (k - 1) if k > 1 else mean ** 2
+    return head_cost + mean * rest, math.sqrt(var / k) * rest
+
+def estimate_dat_size(raws, rng):
+    """
+    预估 build_dat(compress_cm(...)) 的大小，返回 (估计值, 标准差)。
+    方差 = 各成员抽样误差 + 32 字节对齐的舍入（每成员按均匀分布计）
+    """
+    members = [estimate_member(raw, rng) for raw in raws]
+    header = (8 + len(raws) * 4 + 31) // 32 * 32
+    estimate = header + sum(est for est, _ in members) + 15.5 * len(raws)
+    variance = sum(sd ** 2 for _, sd in members) + len(raws) * 32 ** 2 / 12
+    return estimate, math.sqrt(variance)
+
+def estimate_folder(input_folder, budget=None, check=False, seed=0):
+    """--estimate: 只读不写，打印预估大小与 95% 区间；check 时再做一次完整压缩核对"""
+    files, _ = collect_pack_files(Path(input_folder))
+    if not files:
+        print(f"错误: 在 {input_folder} 中没有找到有效文件")
+        return None
+    raws = [f['path'].read_bytes() for f in files]
+    raw_total = sum(map(len, raws))
+
+    start = time.perf_counter()
+    estimate, sd = estimate_dat_size(raws, random.Random(seed))
+    elapsed = time.perf_counter() - start
+    low, high = estimate - 2 * sd, estimate + 2 * sd
+    print(f"预计 {estimate:.0f} ± {2 * sd:.0f} 字节 ({low:.0f} ~ {high:.0f}) | 原始 {raw_total} 字节 | 用时 {elapsed:.2f} 秒")
+
+    if budget is not None:
+        print(f"预算 {budget} 字节，预计剩余 {budget - estimate:.0f} ± {2 * sd:.0f} 字节")
+
+    if not check:
+        return estimate, sd, None
 
-def pack_all_folders(input_dir, output_dir="packed"):
+    start = time.perf_counter()
+    actual = len(build_dat([compress_cm(raw) for raw in raws]))
+    full = time.perf_counter() - start
+    error = (estimate - actual) / actual * 100
+    inside = '区间内' if low <= actual <= high else '区间外'
+    print(f"实际 {actual} 字节 | 误差 {error:+.2f}% ({inside}) | 完整压缩用时 {full:.2f} 秒 "
+          f"(预估用时占 {elapsed / full * 100:.1f}%)")
+    return estimate, sd, actual
+
+def estimate_all_folders(input_dir, budget=None, check=False):
+    folders = sorted(f for f in Path(input_dir).iterdir() if f.is_dir())
+    if not folders:
+        print(f"在 {input_dir} 中没有找到子文件夹")
+        return
+    for folder in folders:
+        print(f"\n{folder.name}")
+        estimate_folder(str(folder), resolve_budget(budget, folder.name), check)
+
+def pack_all_folders(input_dir, output_dir="packed", budget=None):
     """打包指定文件夹内的所有子文件夹"""
     input_path = Path(input_dir)
     
@@ -228,6 +583,7 @@ def pack_all_folders(input_dir, output_dir="packed"):
     
     print(f"找到 {len(folders)} 个文件夹待打包")
     os.makedirs(output_dir, exist_ok=True)
+    over_budget = []
     
     for folder in folders:
         folder_name = folder.name
@@ -238,16 +594,40 @@ def pack_all_folders(input_dir, output_dir="packed"):
         print("-" * 50)
         
         try:
-            pack_dat_file(str(folder), dat_output, h_output)
+            folder_budget = resolve_budget(budget, folder_name)
+            if not pack_dat_file(str(folder), dat_output, h_output, folder_budget) and folder_budget is not None:
+                over_budget.append(folder_name)
         except Exception as e:
             print(f"打包 {folder_name} 时出错: {e}")
             continue
+    
+    if budget is not None:
+        print(f"\n超出预算: {len(over_budget)} 个{' (' + ', '.join(over_budget) + ')' if over_budget else ''}")
+    return over_budget
 
 if __name__ == "__main__":
+    instrument.setup_from_argv()
+    budget = None
+    if '--budget' in sys.argv[1:-1]:
+        i = sys.argv.index('--budget')
+        budget = sys.argv[i + 1]
+        del sys.argv[i:i + 2]
+    
+    if '--estimate' in sys.argv[1:]:
+        check = '--check' in sys.argv[1:]
+        args = [a for a in sys.argv[1:] if a not in ('--estimate', '--check')]
+        if len(args) != 1:
+            print("用法: python pack_dat.py <输入文件夹> --estimate [--check] [--budget <字节数|原.dat文件夹>]")
+            sys.exit(1)
+        estimate_all_folders(args[0], budget, check)
+        sys.exit(0)
+    
     if len(sys.argv) < 3:
-        print("用法: python pack_dat.py <输入文件夹> <输出文件夹>")
+        print("用法: python pack_dat.py <输入文件夹> <输出文件夹> [--budget <字节数|原.dat文件夹>]")
         print("  输入文件夹: 包含解包后的子文件夹")
         print("  输出文件夹: 生成的DAT文件存放位置")
+        print("  --budget: 每个.dat的大小上限；给文件夹时以其中同名原.dat的大小为上限")
+        print("  python pack_dat.py <输入文件夹> --estimate [--check]: 抽样预估各.dat大小，--check 与完整压缩结果核对")
         sys.exit(1)
     
     input_directory = sys.argv[1]
@@ -256,5 +636,7 @@ if __name__ == "__main__":
     print("DAT文件封包工具")
     print("=" * 70)
     
-    pack_all_folders(input_directory, output_directory)
-    print("\n封包完成!")
\ No newline at end of file
+    over_budget = pack_all_folders(input_directory, output_directory, budget)
+    print("\n封包完成!")
+    if over_budget:
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+_DAT 脚本的 chunk 级差分补丁（按 0x180 字节 chunk 比较，只保存变动的 chunk）
+Usage:
+    python script_patch.py d <旧文件或目录> <新文件或目录> <补丁>
+    python script_patch.py a <补丁> <旧文件或目录> <输出文件或目录>
+    python script_patch.py i <补丁>
+
+目录模式按相对路径匹配其中所有 *_DAT 文件（与 diasm.py 的查找规则相同），
+内容相同的文件不写入补丁；新目录中新增的脚本整体作为插入保存，删除的脚本记为删除条目。
+应用时输出路径与旧路径不同则得到完整的新版本: 补丁未涉及的 *_DAT 文件原样复制到输出，删除的不复制；
+输出路径与旧路径相同则只改写补丁中的文件，并删除补丁中记为删除的文件。
+
+补丁格式（小端）:
+    'SCPT' + uint16 版本 + zlib(正文)
+    正文: uint32 条目数，每个条目:
+        uint16 路径长度 + 路径(UTF-8)
+        uint32 旧chunk数, uint32 新chunk数, 旧内容 blake2b-16, 新内容 blake2b-16
+        （新chunk数为 0xFFFFFFFF 表示删除该文件，此时新内容哈希全零、没有操作；版本 2 起）
+        uint32 操作数，每个操作: uint8 类型(R/I/D), uint32 旧起始chunk, uint32 旧chunk数, uint32 新chunk数,
+                                 新chunk数 * 0x180 字节数据
+应用时先校验旧内容哈希，拼接后再校验新内容哈希。
+"""
+
+import hashlib
+import shutil
+import struct
+import sys
+import zlib
+from difflib import SequenceMatcher
+from pathlib import Path
+
+from diasm import CHUNK_SIZE, find_dat_files
+
+PATCH_MAGIC = b'SCPT'
+PATCH_VERSION = 2
+# 新chunk数取该值表示文件在新版本中被删除
+DELETED = 0xFFFFFFFF
+
+OP_REPLACE = ord('R')
+OP_INSERT = ord('I')
+OP_DELETE = ord('D')
+_OP_TAGS = {'replace': OP_REPLACE, 'insert': OP_INSERT, 'delete': OP_DELETE}
+
+_ENTRY_HEAD = struct.Struct('<II16s16sI')
+_OP_HEAD = struct.Struct('<BIII')
+
+def digest(data) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+def chunk_hashes(data):
+    if len(data) % CHUNK_SIZE:
+        raise ValueError(f"长度 {len(data)} 不是 0x{CHUNK_SIZE:X} 的整数倍")
+    view = memoryview(data)
+    return [hashlib.blake2b(view[i:i + CHUNK_SIZE], digest_size=8).digest()
+            for i in range(0, len(data), CHUNK_SIZE)]
+
+def diff_chunks(old, new):
+    """返回 [(类型, 旧起始chunk, 旧chunk数, 新chunk数据)]"""
+    matcher = SequenceMatcher(None, chunk_hashes(old), chunk_hashes(new), autojunk=False)
+    ops = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            ops.append((_OP_TAGS[tag], i1, i2 - i1, bytes(new[j1 * CHUNK_SIZE:j2 * CHUNK_SIZE])))
+    return ops
+
+def apply_chunks(old, ops):
+    """按顺序拼接 未变动的旧片段 + 操作中的新数据"""
+    view = memoryview(old)
+    parts = []
+    pos = 0
+    for _, start, count, data in ops:
+        if start < pos or (start + count) * CHUNK_SIZE > len(old):
+            raise ValueError(f"操作越界: chunk {start}+{count}")
+        parts.append(view[pos * CHUNK_SIZE:start * CHUNK_SIZE])
+        parts.append(data)
+        pos = start + count
+    parts.append(view[pos * CHUNK_SIZE:])
+    return b''.join(parts)
+
+class ScriptPatch:
+    """补丁中的条目: 路径 -> (旧chunk数, 新chunk数, 旧哈希, 新哈希, 操作列表)"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, path, old, new):
+        """old 为空表示新增文件；内容相同时不记录，返回是否记录"""
+        if old == new:
+            return False
+        self.entries[path] = (len(old) // CHUNK_SIZE, len(new) // CHUNK_SIZE,
+                              digest(old), digest(new), diff_chunks(old, new))
+        return True
+
+    def remove(self, path, old):
+        """记录删除的文件（仍校验旧内容）"""
+        self.entries[path] = (len(old) // CHUNK_SIZE, DELETED, digest(old), bytes(16), [])
+
+    def is_removed(self, path) -> bool:
+        return self.entries[path][1] == DELETED
+
+    def apply(self, path, old):
+        """返回新内容；删除条目返回 None"""
+        old_chunks, new_chunks, old_digest, new_digest, ops = self.entries[path]
+        if new_chunks == DELETED:
+            if digest(old) != old_digest:
+                raise ValueError("原文件与补丁不匹配，不删除")
+            return None
+        if len(old) != old_chunks * CHUNK_SIZE or digest(old) != old_digest:
+            raise ValueError("原文件与补丁不匹配")
+        data = apply_chunks(old, ops)
+        if len(data) != new_chunks * CHUNK_SIZE or digest(data) != new_digest:
+            raise ValueError("应用后校验失败")
+        return data
+
+    def to_bytes(self) -> bytes:
+        body = bytearray(struct.pack('<I', len(self.entries)))
+        for path, (old_chunks, new_chunks, old_digest, new_digest, ops) in self.entries.items():
+            name = path.encode('utf-8')
+            body += struct.pack('<H', len(name)) + name
+            body += _ENTRY_HEAD.pack(old_chunks, new_chunks, old_digest, new_digest, len(ops))
+            for op, start, count, data in ops:
+                body += _OP_HEAD.pack(op, start, count, len(data) // CHUNK_SIZE) + data
+        return PATCH_MAGIC + struct.pack('<H', PATCH_VERSION) + zlib.compress(bytes(body), 9)
+
+    @classmethod
+    def from_bytes(cls, raw):
+        if raw[:4] != PATCH_MAGIC:
+            raise ValueError("不是脚本补丁文件")
+        try:
+            return cls._parse(raw)
+        except (zlib.error, struct.error, UnicodeDecodeError) as e:
+            raise ValueError(f"不是有效补丁: {e}") from e
+
+    @classmethod
+    def _parse(cls, raw):
+        version, = struct.unpack_from('<H', raw, 4)
+        if version not in (1, PATCH_VERSION):     # 版本 1 没有删除条目，其余格式相同
+            raise ValueError(f"不支持的补丁版本 {version}")
+        body = memoryview(zlib.decompress(raw[6:]))
+
+        patch = cls()
+        count, = struct.unpack_from('<I', body, 0)
+        pos = 4
+        for _ in range(count):
+            name_len, = struct.unpack_from('<H', body, pos)
+            path = bytes(body[pos + 2:pos + 2 + name_len]).decode('utf-8')
+            pos += 2 + name_len
+            old_chunks, new_chunks, old_digest, new_digest, op_count = _ENTRY_HEAD.unpack_from(body, pos)
+            pos += _ENTRY_HEAD.size
+            ops = []
+            for _ in range(op_count):
+                op, start, old_count, new_count = _OP_HEAD.unpack_from(body, pos)
+                pos += _OP_HEAD.size
+                data = body[pos:pos + new_count * CHUNK_SIZE]
+                if len(data) != new_count * CHUNK_SIZE:
+                    raise ValueError("不是有效补丁: 数据不完整")
+                ops.append((op, start, old_count, data))
+                pos += new_count * CHUNK_SIZE
+            patch.entries[path] = (old_chunks, new_chunks, old_digest, new_digest, ops)
+        return patch
+
+def _script_files(root):
+    """文件 -> {'': 路径}；目录 -> {相对路径: 路径}"""
+    root = Path(root)
+    if root.is_file():
+        return {'': root}
+    return {p.relative_to(root).as_posix(): p for p in find_dat_files(root)}
+
+def _output_path(output, rel):
+    return Path(output) / rel if rel else Path(output)
+
+def make_patch(old_root, new_root, patch_path):
+    old_files = _script_files(old_root)
+    new_files = _script_files(new_root)
+    patch = ScriptPatch()
+    for rel, new_path in sorted(new_files.items()):
+        old = old_files[rel].read_bytes() if rel in old_files else b''
+        try:
+            if patch.add(rel, old, new_path.read_bytes()):
+                _, new_chunks, _, _, ops = patch.entries[rel]
+                changed = sum(len(data) for *_, data in ops) // CHUNK_SIZE
+                print(f"{rel or new_path.name}: {len(ops)} 处, {changed}/{new_chunks} chunk")
+        except ValueError as e:
+            print(f"{rel or new_path.name}: {e}")
+    for rel in sorted(set(old_files) - set(new_files)):
+        patch.remove(rel, old_files[rel].read_bytes())
+        print(f"{rel}: 删除")
+
+    raw = patch.to_bytes()
+    with open(patch_path, 'wb') as f:
+        f.write(raw)
+    print(f"补丁: {patch_path} ({len(patch.entries)} 个文件, {len(raw)} 字节)")
+
+def load_patch(patch_path):
+    """读取补丁；文件无效时打印原因并返回 None"""
+    try:
+        with open(patch_path, 'rb') as f:
+            return ScriptPatch.from_bytes(f.read())
+    except (OSError, ValueError) as e:
+        print(f"{patch_path}: {e}")
+        return None
+
+def apply_patch(patch_path, old_root, output):
+    patch = load_patch(patch_path)
+    if patch is None:
+        return False
+    old_files = _script_files(old_root)
+    in_place = Path(output).resolve() == Path(old_root).resolve()
+    applied = copied = failed = 0
+    for rel in patch.entries:
+        try:
+            if patch.is_removed(rel) and rel not in old_files:
+                applied += 1    # 已删除
+                continue
+            old = old_files[rel].read_bytes() if rel in old_files else b''
+            data = patch.apply(rel, old)
+            out_path = _output_path(output, rel)
+            if data is None:
+                if in_place:
+                    out_path.unlink()
+            else:
+                out_path.parent.mkdir(parents=True, exist_ok=True)
+                out_path.write_bytes(data)
+            applied += 1
+        except (ValueError, OSError) as e:
+            print(f"{rel or old_root}: {e}")
+            failed += 1
+
+    if not in_place:
+        for rel, path in sorted(old_files.items()):
+            if rel in patch.entries:
+                continue
+            try:
+                out_path = _output_path(output, rel)
+                out_path.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(path, out_path)
+                copied += 1
+            except OSError as e:
+                print(f"{rel or old_root}: {e}")
+                failed += 1
+    print(f"应用: {applied} | 复制未变动: {copied} | 失败: {failed}")
+    return failed == 0
+
+def print_patch(patch_path):
+    patch = load_patch(patch_path)
+    if patch is None:
+        return False
+    for rel, (old_chunks, new_chunks, _, _, ops) in patch.entries.items():
+        if new_chunks == DELETED:
+            print(f"{rel}: 删除 ({old_chunks} chunk)")
+            continue
+        print(f"{rel or '(单文件)'}: {old_chunks} -> {new_chunks} chunk")
+        for op, start, count, data in ops:
+            print(f"  {chr(op)} @{start} -{count} +{len(data) // CHUNK_SIZE}")
+    return True
+
+def main():
+    mode = sys.argv[1].lower() if len(sys.argv) > 1 else ''
+
+    if mode == 'd' and len(sys.argv) == 5:
+        make_patch(sys.argv[2], sys.argv[3], sys.argv[4])
+    elif mode == 'a' and len(sys.argv) == 5:
+        if not apply_patch(sys.argv[2], sys.argv[3], sys.argv[4]):
+            sys.exit(1)
+    elif mode == 'i' and len(sys.argv) == 3:
+        if not print_patch(sys.argv[2]):
+            sys.exit(1)
+    else:
+        print(__doc__.strip())
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
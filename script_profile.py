@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+_DAT 脚本语料统计（用于分析 UNK_xx 等未知指令）
+Usage:
+    python script_profile.py <脚本目录> [命令] [--cache profile.npz] [--top 20]
+
+命令:
+    hist                      各 opcode 的出现次数与所在文件数（默认）
+    op <助记符|编号>          该 opcode 三个参数的取值分布，以及前后相邻的 opcode
+    ngram <N> [助记符|编号]   最常见的 N 元 opcode 序列（可只看包含某 opcode 的）
+    cooc <助记符|编号>        与该 opcode 出现在同一文件中的 opcode 及提升度
+
+所有 chunk 头部读入一个 NumPy 结构化数组，统计均为整体向量运算。
+--cache: 把数组存为 .npz，各文件大小与修改时间未变时直接读取缓存。
+"""
+
+import os
+import sys
+import time
+
+from diasm import CHUNK_SIZE, OPCODES, find_dat_files, find_opcode_by_mnemonic, get_handler
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_TOP = 20
+
+if np is not None:
+    # 按 chunk 解读原始字节（itemsize = 0x180，只取头部 16 字节）
+    CHUNK_HEAD_DTYPE = np.dtype({
+        'names': ['op', 'a1', 'a2', 'a3'],
+        'formats': ['<u4', '<i4', '<i4', '<i4'],
+        'offsets': [0, 4, 8, 12],
+        'itemsize': CHUNK_SIZE,
+    })
+    # 语料数组：每行一个 chunk
+    CORPUS_DTYPE = np.dtype([('file', '<u4'), ('chunk', '<u4'), ('op', '<u4'),
+                             ('a1', '<i4'), ('a2', '<i4'), ('a3', '<i4')])
+
+ARG_FIELDS = ('a1', 'a2', 'a3')
+
+def op_name(op) -> str:
+    return get_handler(int(op)).mnemonic
+
+def parse_op(text) -> int:
+    """助记符（含 UNK_xx）或数字（十进制 / 0x 十六进制）"""
+    op = find_opcode_by_mnemonic(text)
+    try:
+        if op is None and text.upper().startswith('UNK_'):
+            op = int(text[4:], 16)
+        if op is None:
+            op = int(text, 0)
+    except ValueError:
+        raise ValueError(f"未知的 opcode: {text}") from None
+    return op
+
+class ScriptCorpus:
+    """所有脚本的 chunk 头部: chunks 为 CORPUS_DTYPE 数组，file 列是 files 的下标，按文件、chunk 顺序排列"""
+
+    def __init__(self, files, chunks):
+        self.files = files
+        self.chunks = chunks
+        self._dense = None
+
+    @staticmethod
+    def _stamps(paths):
+        return np.array([(st.st_size, st.st_mtime_ns) for st in map(os.stat, paths)], dtype='<i8').reshape(-1, 2)
+
+    @classmethod
+    def load(cls, root, cache_path=None):
+        root = os.path.abspath(root)
+        paths = sorted(str(p) for p in find_dat_files(root))
+        files = [os.path.relpath(p, root).replace(os.sep, '/') for p in paths]
+        stamps = cls._stamps(paths)
+
+        if cache_path and os.path.exists(cache_path):
+            with np.load(cache_path, allow_pickle=False) as cached:
+                if list(cached['files']) == files and np.array_equal(cached['stamps'], stamps):
+                    return cls(files, cached['chunks'])
+
+        heads = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                data = f.read()
+            heads.append(np.frombuffer(data, dtype=CHUNK_HEAD_DTYPE, count=len(data) // CHUNK_SIZE))
+
+        chunks = np.empty(sum(map(len, heads)), dtype=CORPUS_DTYPE)
+        pos = 0
+        for i, head in enumerate(heads):
+            block = chunks[pos:pos + len(head)]
+            block['file'] = i
+            block['chunk'] = np.arange(len(head))
+            for field in ('op',) + ARG_FIELDS:
+                block[field] = head[field]
+            pos += len(head)
+
+        if cache_path:
+            # 传文件对象: 传路径时 np.savez 会给没有 .npz 后缀的文件名补上后缀，之后按原名永远读不到
+            with open(cache_path, 'wb') as f:
+                np.savez(f, files=np.array(files), stamps=stamps, chunks=chunks)
+        return cls(files, chunks)
+
+    @property
+    def dense(self):
+        """(出现过的 opcode, 每个 chunk 的 opcode 在其中的下标)，n-gram 编码用"""
+        if self._dense is None:
+            self._dense = np.unique(self.chunks['op'], return_inverse=True)
+        return self._dense
+
+    def histogram(self):
+        """[(opcode, 次数, 文件数)]，按次数降序"""
+        ops, counts = np.unique(self.chunks['op'], return_counts=True)
+        pairs = np.unique(self.chunks['file'].astype(np.int64) << 32 | self.chunks['op'])
+        files_per_op = np.unique(pairs & 0xFFFFFFFF, return_counts=True)[1]
+        order = np.argsort(-counts, kind='stable')
+        return [(int(ops[i]), int(counts[i]), int(files_per_op[i])) for i in order]
+
+    def arg_stats(self, op, top=DEFAULT_TOP):
+        """{参数名: (不同取值数, 最小, 最大, [(取值, 次数)...])}"""
+        sel = self.chunks[self.chunks['op'] == op]
+        stats = {}
+        for field in ARG_FIELDS:
+            if len(sel) == 0:
+                stats[field] = (0, 0, 0, [])
+                continue
+            values, counts = np.unique(sel[field], return_counts=True)
+            order = np.argsort(-counts, kind='stable')[:top]
+            stats[field] = (len(values), int(values[0]), int(values[-1]),
+                            [(int(values[i]), int(counts[i])) for i in order])
+        return stats
+
+    def neighbours(self, op, offset, top=DEFAULT_TOP):
+        """op 之前（offset<0）或之后（offset>0）第 |offset| 个 opcode 的分布（不跨文件）"""
+        idx = np.flatnonzero(self.chunks['op'] == op) + offset
+        idx = idx[(idx >= 0) & (idx < len(self.chunks))]
+        idx = idx[self.chunks['file'][idx] == self.chunks['file'][idx - offset]]
+        ops, counts = np.unique(self.chunks['op'][idx], return_counts=True)
+        order = np.argsort(-counts, kind='stable')[:top]
+        return [(int(ops[i]), int(counts[i])) for i in order]
+
+    def ngrams(self, n, containing=None, top=DEFAULT_TOP):
+        """最常见的 n 元 opcode 序列 [((op, ...), 次数)]，不跨文件"""
+        if n < 1:
+            raise ValueError(f"N 必须 >= 1: {n}")
+        ops, ids = self.dense
+        total = len(self.chunks) - n + 1
+        if total <= 0:
+            return []
+        files = self.chunks['file']
+        starts = np.flatnonzero(files[:total] == files[n - 1:])   # 首尾同属一个文件即整段在文件内
+        if containing is not None:
+            mask = np.zeros(len(starts), dtype=bool)
+            for j in range(n):
+                mask |= self.chunks['op'][starts + j] == containing
+            starts = starts[mask]
+
+        base = len(ops)
+        if base ** n < 2 ** 63:
+            # 编码为 int64 后一维 unique，比按行 unique 快得多
+            codes = np.zeros(len(starts), dtype=np.int64)
+            for j in range(n):
+                codes = codes * base + ids[starts + j]
+            values, counts = np.unique(codes, return_counts=True)
+            grams = np.empty((len(values), n), dtype=np.int64)
+            for j in range(n - 1, -1, -1):
+                values, grams[:, j] = np.divmod(values, base)
+        else:
+            # base**n 超出 int64 时编码会溢出，改为按行 unique
+            grams, counts = np.unique(np.stack([ids[starts + j] for j in range(n)], axis=1),
+                                      axis=0, return_counts=True)
+
+        order = np.argsort(-counts, kind='stable')[:top]
+        return [(tuple(int(op) for op in ops[grams[i]]), int(counts[i])) for i in order]
+
+    def cooccurrence(self, op, top=DEFAULT_TOP):
+        """与 op 同文件出现的 opcode: [(opcode, 共同出现的文件数, 提升度)]，提升度 = P(B|A) / P(B)"""
+        ops, ids = self.dense
+        presence = np.zeros((len(self.files), len(ops)), dtype=bool)
+        presence[self.chunks['file'], ids] = True
+        k = np.searchsorted(ops, op)
+        if k >= len(ops) or ops[k] != op:
+            return []
+        with_op = presence[presence[:, k]]
+        together = with_op.sum(axis=0)
+        lift = (together / len(with_op)) / (presence.sum(axis=0) / len(presence))
+        order = np.argsort(-together, kind='stable')
+        return [(int(ops[i]), int(together[i]), float(lift[i])) for i in order if i != k][:top]
+
+# ================= 输出 =================
+
+def fmt_op(op) -> str:
+    return f"0x{op:02X} {op_name(op):<16}"
+
+def print_histogram(corpus):
+    total = len(corpus.chunks)
+    print(f"{'opcode':<22}{'次数':>10}{'占比':>9}{'文件数':>8}")
+    for op, count, files in corpus.histogram():
+        print(f"{fmt_op(op):<22}{count:>10}{count / total:>9.2%}{files:>8}")
+    unused = sorted(set(OPCODES) - set(int(o) for o in corpus.dense[0]))
+    if unused:
+        print(f"未出现: {', '.join(op_name(op) for op in unused)}")
+
+def print_op(corpus, op, top):
+    count = int((corpus.chunks['op'] == op).sum())
+    print(f"{fmt_op(op)}共 {count} 次")
+    for field, (distinct, lo, hi, common) in corpus.arg_stats(op, top).items():
+        values = ', '.join(f"{v}×{c}" for v, c in common)
+        print(f"  {field}: {distinct} 种取值, 范围 [{lo}, {hi}]  {values}")
+    for label, offset in (('前', -1), ('后', 1)):
+        print(f"  {label}一条:")
+        for other, n in corpus.neighbours(op, offset, top):
+            print(f"    {fmt_op(other)}{n:>8}")
+
+def print_ngrams(corpus, n, containing, top):
+    for gram, count in corpus.ngrams(n, containing, top):
+        print(f"{count:>8}  {' '.join(op_name(op) for op in gram)}")
+
+def print_cooccurrence(corpus, op, top):
+    print(f"{'opcode':<22}{'共同文件数':>10}{'提升度':>8}")
+    for other, together, lift in corpus.cooccurrence(op, top):
+        print(f"{fmt_op(other):<22}{together:>10}{lift:>8.2f}")
+
+def main():
+    if np is None:
+        print("需要 numpy: pip install numpy")
+        sys.exit(1)
+
+    args = sys.argv[1:]
+    cache_path = None
+    top = DEFAULT_TOP
+    positional = []
+    while args:
+        arg = args.pop(0)
+        if arg == '--cache' and args:
+            cache_path = args.pop(0)
+        elif arg == '--top' and args:
+            top = int(args.pop(0))
+        else:
+            positional.append(arg)
+
+    if not positional:
+        print(__doc__.strip())
+        sys.exit(1)
+    root, command, rest = positional[0], (positional[1:2] or ['hist'])[0].lower(), positional[2:]
+
+    start = time.perf_counter()
+    corpus = ScriptCorpus.load(root, cache_path)
+    loaded = time.perf_counter()
+    print(f"{len(corpus.files)} 个文件, {len(corpus.chunks)} 个 chunk (读取 {loaded - start:.2f} 秒)\n")
+
+    try:
+        if command == 'hist' and not rest:
+            print_histogram(corpus)
+        elif command == 'op' and len(rest) == 1:
+            print_op(corpus, parse_op(rest[0]), top)
+        elif command == 'ngram' and len(rest) in (1, 2):
+            print_ngrams(corpus, int(rest[0]), parse_op(rest[1]) if len(rest) == 2 else None, top)
+        elif command == 'cooc' and len(rest) == 1:
+            print_cooccurrence(corpus, parse_op(rest[0]), top)
+        else:
+            print(__doc__.strip())
+            sys.exit(1)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    print(f"\n统计用时 {time.perf_counter() - loaded:.3f} 秒")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""汇编失败时不破坏已有的 _DAT 输出"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import diasm
+
+def test_failed_assemble_keeps_existing_output(tmp_path):
+    (tmp_path / 'in').mkdir()
+    (tmp_path / 'out').mkdir()
+    (tmp_path / 'in' / 'x.asm').write_bytes(b'TEXT\n\xff\xfe\xfa\n')
+    existing = b'\x01' * diasm.CHUNK_SIZE
+    (tmp_path / 'out' / 'x_DAT').write_bytes(existing)
+
+    diasm.process_write(str(tmp_path / 'in'), str(tmp_path / 'out'))
+    assert (tmp_path / 'out' / 'x_DAT').read_bytes() == existing
+    assert os.listdir(tmp_path / 'out') == ['x_DAT']
+
+def test_assemble_to_replaces_output(tmp_path):
+    data = b'\x00' * diasm.CHUNK_SIZE
+    diasm.ScriptDisassembler(data).export(str(tmp_path / 'x.asm'))
+    (tmp_path / 'x_DAT').write_bytes(b'\x01' * diasm.CHUNK_SIZE * 2)
+
+    assert diasm.ScriptAssembler().assemble_to(str(tmp_path / 'x.asm'), str(tmp_path / 'x_DAT')) == 1
+    assert (tmp_path / 'x_DAT').read_bytes() == data
+    assert sorted(os.listdir(tmp_path)) == ['x.asm', 'x_DAT']
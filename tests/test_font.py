@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""render_glyph_strip 与逐字参考实现 process_glyph 的逐像素比对"""
+
+import io
+import os
+import struct
+import sys
+from types import SimpleNamespace
+
+import pytest
+from PIL import ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import font
+
+# 0x20-0xFF: 含 , . ¸ · 等墨迹远离基线、绘制坐标可能为负的字形
+CHARS = [chr(c) for c in range(0x20, 0x100) if chr(c) not in font.NO_RENDER_CHARS]
+
+ROTATIONS = (0, 90, 180, 270, -90, 45)
+OFFSETS = ((0.0, 0.0), (0.0, 3.0), (0.0, -1.0), (0.0, -2.5), (0.3, -2.7), (0.3, 0.0))
+
+@pytest.fixture(scope='module')
+def glyph_font():
+    cfg = font.CONFIG
+    size = int(cfg['font_size'] * cfg['upscale'])
+    if os.path.exists(cfg['font_path']):
+        return ImageFont.truetype(cfg['font_path'], size)
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        pytest.skip("需要 FreeType 版 Pillow (>= 10.1) 或 CONFIG 中的字体")
+
+@pytest.mark.parametrize('offset_x, offset_y', OFFSETS)
+@pytest.mark.parametrize('rotate', ROTATIONS)
+def test_strip_matches_process_glyph(glyph_font, rotate, offset_x, offset_y):
+    cfg = dict(font.CONFIG, rotate=rotate, offset_x=offset_x, offset_y=offset_y)
+    mismatched = []
+    for char, fast in zip(CHARS, font.render_glyph_strip(CHARS, glyph_font, cfg)):
+        ref = font.process_glyph(char, glyph_font, cfg)
+        ref_pixels = ref[0].tobytes() if ref[0] is not None else None
+        fast_pixels = fast[0].tobytes() if fast[0] is not None else None
+        if ref_pixels != fast_pixels or ref[1:] != fast[1:]:
+            mismatched.append(char)
+    assert not mismatched, ''.join(mismatched)
+
+def test_glyph_cache_key_follows_opened_font(tmp_path):
+    # font_path 只写文件名时由 Pillow 在系统字体目录中找到，键应取决于实际打开的文件
+    cfg = dict(font.CONFIG, glyph_cache=str(tmp_path), font_path='simsun.ttc')
+    a, b = tmp_path / 'a.ttf', tmp_path / 'b.ttf'
+    a.write_bytes(b'font a')
+    b.write_bytes(b'font b')
+    key_a = font.glyph_cache_path(cfg, SimpleNamespace(path=str(a)))
+    key_b = font.glyph_cache_path(cfg, SimpleNamespace(path=str(b)))
+    key_default = font.glyph_cache_path(cfg, SimpleNamespace(path=io.BytesIO()))
+    assert len({key_a, key_b, key_default}) == 3
+    assert font.glyph_cache_path(dict(cfg, font_path='msyh.ttc'), SimpleNamespace(path=io.BytesIO())) != key_default
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_pack_2bpp_pads_partial_byte(monkeypatch, use_numpy):
+    if not use_numpy:
+        monkeypatch.setattr(font, 'np', None)
+    elif font.np is None:
+        pytest.skip("需要 numpy")
+    # 11x11 = 121 像素，CGLP 每字形 31 字节，最后一字节只有 1 个像素
+    indices = bytes([3, 2, 1, 0] * 30 + [3])
+    packed = font.pack_2bpp(indices)
+    assert len(packed) == (11 * 11 * 2 + 7) // 8
+    assert packed[:30] == bytes([0b11100100]) * 30
+    assert packed[30] == 0b11000000
+
+def test_write_nftr_with_odd_box_size(tmp_path):
+    cfg = dict(font.CONFIG, box_w=11, box_h=11, output_nftr=str(tmp_path / 'f.nftr'))
+    glyphs = {'A': (bytes([0] * 121), 5, 1, 7), 'B': (bytes([255] * 121), 4, 0, 6)}
+    font.write_nftr(['A', 'B'], glyphs, cfg)
+    data = (tmp_path / 'f.nftr').read_bytes()
+    cglp = 0x10 + 8 + 20
+    assert data[cglp:cglp + 4] == b'CGLP'[::-1]
+    block_size, box_w, box_h, glyph_size = struct.unpack_from('<IBBH', data, cglp + 4)
+    assert (box_w, box_h, glyph_size) == (11, 11, 31)
+    assert block_size == 8 + (8 + 2 * 31 + 3) // 4 * 4     # 块按 4 字节对齐
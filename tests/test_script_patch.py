@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""补丁应用到新目录时得到完整的新版本"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import script_patch
+from diasm import CHUNK_SIZE
+
+def chunks(*values):
+    return b''.join(bytes([v]) * CHUNK_SIZE for v in values)
+
+def write_tree(root, files):
+    for rel, data in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+def read_tree(root):
+    return {p.relative_to(root).as_posix(): p.read_bytes() for p in root.rglob('*') if p.is_file()}
+
+def test_apply_to_fresh_output_copies_unchanged(tmp_path):
+    old = {'a_DAT': chunks(1, 2, 3), 'sub/b_DAT': chunks(4, 5), 'sub/c_DAT': chunks(6)}
+    new = dict(old, **{'a_DAT': chunks(1, 9, 3, 7), 'd_DAT': chunks(8)})
+    write_tree(tmp_path / 'old', old)
+    write_tree(tmp_path / 'new', new)
+
+    patch_path = tmp_path / 'p.scpt'
+    script_patch.make_patch(tmp_path / 'old', tmp_path / 'new', patch_path)
+    assert set(script_patch.ScriptPatch.from_bytes(patch_path.read_bytes()).entries) == {'a_DAT', 'd_DAT'}
+
+    assert script_patch.apply_patch(patch_path, tmp_path / 'old', tmp_path / 'out')
+    assert read_tree(tmp_path / 'out') == new
+
+def test_apply_in_place_rewrites_only_patched(tmp_path):
+    old = {'a_DAT': chunks(1, 2), 'b_DAT': chunks(3)}
+    new = dict(old, a_DAT=chunks(1, 4))
+    write_tree(tmp_path / 'old', old)
+    write_tree(tmp_path / 'new', new)
+    patch_path = tmp_path / 'p.scpt'
+    script_patch.make_patch(tmp_path / 'old', tmp_path / 'new', patch_path)
+
+    before = (tmp_path / 'old' / 'b_DAT').stat().st_mtime_ns
+    assert script_patch.apply_patch(patch_path, tmp_path / 'old', tmp_path / 'old')
+    assert read_tree(tmp_path / 'old') == new
+    assert (tmp_path / 'old' / 'b_DAT').stat().st_mtime_ns == before
+
+def test_deleted_scripts_stay_deleted(tmp_path):
+    old = {'a_DAT': chunks(1), 'gone_DAT': chunks(2), 'sub/gone_DAT': chunks(3)}
+    new = {'a_DAT': chunks(1, 4)}
+    write_tree(tmp_path / 'old', old)
+    write_tree(tmp_path / 'new', new)
+    patch_path = tmp_path / 'p.scpt'
+    script_patch.make_patch(tmp_path / 'old', tmp_path / 'new', patch_path)
+
+    assert script_patch.apply_patch(patch_path, tmp_path / 'old', tmp_path / 'out')
+    assert read_tree(tmp_path / 'out') == new
+
+    assert script_patch.apply_patch(patch_path, tmp_path / 'old', tmp_path / 'old')
+    assert {rel: data for rel, data in read_tree(tmp_path / 'old').items()} == new
+
+def test_corrupt_patch_is_reported(tmp_path, capsys):
+    write_tree(tmp_path / 'old', {'a_DAT': chunks(1)})
+    write_tree(tmp_path / 'new', {'a_DAT': chunks(2)})
+    patch_path = tmp_path / 'p.scpt'
+    script_patch.make_patch(tmp_path / 'old', tmp_path / 'new', patch_path)
+    raw = patch_path.read_bytes()
+
+    for broken in (raw[:len(raw) // 2], raw[:6] + b'\x00' * 16, raw[:5]):
+        patch_path.write_bytes(broken)
+        assert not script_patch.apply_patch(patch_path, tmp_path / 'old', tmp_path / 'out')
+        assert '不是有效补丁' in capsys.readouterr().out
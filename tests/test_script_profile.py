@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""n-gram 统计与逐个计数的结果一致（含超出 int64 编码范围的 N）"""
+
+import os
+import sys
+from collections import Counter
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import script_profile
+from script_profile import CORPUS_DTYPE, ScriptCorpus
+
+def make_corpus(file_ops):
+    chunks = np.zeros(sum(map(len, file_ops)), dtype=CORPUS_DTYPE)
+    pos = 0
+    for i, ops in enumerate(file_ops):
+        block = chunks[pos:pos + len(ops)]
+        block['file'] = i
+        block['chunk'] = np.arange(len(ops))
+        block['op'] = ops
+        pos += len(ops)
+    return ScriptCorpus([f'{i}_DAT' for i in range(len(file_ops))], chunks)
+
+def expected_ngrams(file_ops, n, containing=None):
+    counts = Counter()
+    for ops in file_ops:
+        for i in range(len(ops) - n + 1):
+            gram = tuple(ops[i:i + n])
+            if containing is None or containing in gram:
+                counts[gram] += 1
+    return counts
+
+@pytest.mark.parametrize('n', [1, 2, 3, 10, 11, 12])
+def test_ngrams_match_counter(n):
+    rng = np.random.default_rng(n)
+    # 70 种 opcode: n >= 11 时 70**n 超出 int64，走按行 unique
+    file_ops = [[int(op) for op in rng.integers(0, 70, size)] for size in (400, 3, 250)]
+    file_ops[1] = [5, 5, 5]
+    corpus = make_corpus(file_ops)
+    for containing in (None, 5):
+        result = corpus.ngrams(n, containing, top=10 ** 6)
+        assert dict(result) == expected_ngrams(file_ops, n, containing)
+
+def test_ngrams_rejects_non_positive_n():
+    corpus = make_corpus([[1, 2, 3]])
+    with pytest.raises(ValueError):
+        corpus.ngrams(0)
+
+def test_cache_without_npz_suffix_is_reused(tmp_path):
+    scripts = tmp_path / 'scripts'
+    scripts.mkdir()
+    (scripts / 'a_DAT').write_bytes(bytes(0x180 * 3))
+    cache = tmp_path / 'profile.cache'
+    ScriptCorpus.load(scripts, str(cache))
+    assert cache.exists() and not (tmp_path / 'profile.cache.npz').exists()
+
+    # 改写缓存中的数组，命中缓存时应读到改写后的值
+    with np.load(cache) as cached:
+        content = dict(cached)
+    content['chunks']['op'] = 0x7F
+    with open(cache, 'wb') as f:
+        np.savez(f, **content)
+    assert set(ScriptCorpus.load(scripts, str(cache)).chunks['op']) == {0x7F}
+
+def test_unknown_opcode_is_reported(tmp_path, monkeypatch, capsys):
+    with pytest.raises(ValueError):
+        script_profile.parse_op('NOT_AN_OP')
+    (tmp_path / 'a_DAT').write_bytes(bytes(0x180))
+    for command in ('op', 'cooc', 'ngram'):
+        args = [command, '2', 'NOT_AN_OP'] if command == 'ngram' else [command, 'NOT_AN_OP']
+        monkeypatch.setattr(sys, 'argv', ['script_profile.py', str(tmp_path)] + args)
+        with pytest.raises(SystemExit) as exc:
+            script_profile.main()
+        assert exc.value.code == 1
+        assert '未知的 opcode: NOT_AN_OP' in capsys.readouterr().out
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""文本表只覆盖游戏实际显示的文本段"""
+
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_inject
+from diasm import CHUNK_SIZE, TEXT_OFFSET, TEXT_SEGMENT, ScriptDisassembler, find_opcode_by_mnemonic
+
+def msg_show_chunk(shown, texts):
+    chunk = bytearray(CHUNK_SIZE)
+    struct.pack_into('<Iiii', chunk, 0, find_opcode_by_mnemonic("MSG_SHOW"), shown, 0, 0)
+    for i, text in enumerate(texts):
+        encoded = text.encode('utf-16-le')
+        start = TEXT_OFFSET + i * TEXT_SEGMENT
+        chunk[start:start + len(encoded)] = encoded
+    return chunk
+
+def test_export_skips_segments_past_arg1():
+    data = bytes(msg_show_chunk(2, ['a', 'b', 'left', 'over', 'x']))
+    rows = text_inject.collect_texts('t_DAT', data)
+    assert [(row['segment'], row['original']) for row in rows] == [(0, 'a'), (1, 'b')]
+    # 与反汇编输出一致
+    assert ScriptDisassembler(data).to_text().splitlines()[1:3] == ['a', 'b']
+
+def test_inject_rejects_hidden_segment():
+    data = msg_show_chunk(2, ['a', 'b', 'left'])
+    with pytest.raises(ValueError):
+        text_inject.text_slot(memoryview(data), 0, 2)
+
+    rows = [{'file': 't_DAT', 'chunk': 0, 'segment': 2, 'op': 'MSG_SHOW', 'original': 'left', 'text': 'new'},
+            {'file': 't_DAT', 'chunk': 0, 'segment': 1, 'op': 'MSG_SHOW', 'original': 'b', 'text': 'c'}]
+    original = bytes(data)
+    written, errors = text_inject.inject_file(data, rows)
+    assert (written, len(errors)) == (1, 1)
+    hidden = TEXT_OFFSET + 2 * TEXT_SEGMENT
+    assert data[hidden:] == original[hidden:]
+
+def test_write_to_output_copies_untouched_scripts(tmp_path):
+    root = tmp_path / 'in'
+    (root / 'sub').mkdir(parents=True)
+    (root / 'a_DAT').write_bytes(bytes(msg_show_chunk(1, ['hello'])))
+    (root / 'sub' / 'b_DAT').write_bytes(bytes(msg_show_chunk(1, ['world'])))
+    (root / 'c_DAT').write_bytes(bytes(CHUNK_SIZE))     # 没有文本
+    table = tmp_path / 't.json'
+    text_inject.export_table(root, table)
+    rows = [row for row in text_inject.load_table(table) if row['file'] == 'a_DAT']
+    rows[0]['text'] = 'hi'
+    text_inject.save_table(rows, table)     # 只保留一个文件的行
+
+    assert text_inject.write_table(table, root, tmp_path / 'out')
+    out = tmp_path / 'out'
+    assert sorted(p.relative_to(out).as_posix() for p in out.rglob('*_DAT')) == ['a_DAT', 'c_DAT', 'sub/b_DAT']
+    assert text_inject.collect_texts('a_DAT', (out / 'a_DAT').read_bytes())[0]['text'] == 'hi'
+    assert (out / 'sub' / 'b_DAT').read_bytes() == (root / 'sub' / 'b_DAT').read_bytes()
+
+def test_single_file_rejects_ambiguous_basename(tmp_path):
+    script = tmp_path / 'a_DAT'
+    script.write_bytes(bytes(msg_show_chunk(1, ['hello'])))
+    rows = [{'file': f'{d}/a_DAT', 'chunk': 0, 'segment': 0, 'op': 'MSG_SHOW', 'original': 'hello', 'text': d}
+            for d in ('x', 'y')]
+    table = tmp_path / 't.json'
+    text_inject.save_table(rows, table)
+    assert not text_inject.write_table(table, script, tmp_path / 'out_DAT')
+    assert not (tmp_path / 'out_DAT').exists()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""全文检索结果与逐条匹配一致，且候选文本分批读取"""
+
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diasm import CHUNK_SIZE, TEXT_OFFSET, ScriptDisassembler, find_opcode_by_mnemonic
+from xref import QUERY_BATCH, ScriptIndex
+
+def text_script(texts):
+    data = bytearray(CHUNK_SIZE * len(texts))
+    for i, text in enumerate(texts):
+        encoded = text.encode('utf-16-le')
+        struct.pack_into('<Iiii', data, i * CHUNK_SIZE, find_opcode_by_mnemonic("TEXT"), len(encoded) // 2, 0, 0)
+        start = i * CHUNK_SIZE + TEXT_OFFSET
+        data[start:start + len(encoded)] = encoded
+    return bytes(data)
+
+def test_search_text_batches_candidates():
+    scripts = {f'{k}_DAT': [f'行{k}-{i} 你好' if i % 3 else f'Line {i} 世界' for i in range(400)]
+               for k in range(3)}
+    with ScriptIndex(':memory:') as index:
+        for rel_path, texts in scripts.items():
+            index.add_script(rel_path, ScriptDisassembler(text_script(texts)))
+
+        statements = []
+        index.conn.set_trace_callback(statements.append)
+        for query in ('你', '你好', 'line 1', '世', 'x'):
+            statements.clear()
+            expected = sorted((rel_path, i, 0, text) for rel_path, texts in scripts.items()
+                              for i, text in enumerate(texts) if query in text.lower())
+            assert index.search_text(query) == expected
+            assert len(statements) <= 2 + len(expected) // QUERY_BATCH + len(query)
+
+def test_search_single_char_at_code_point_edges():
+    texts = ['a\U0010ffff', '\ud7ff\ue000', '\U0010ffffb', 'plain']
+    with ScriptIndex(':memory:') as index:
+        index.add_script('x_DAT', ScriptDisassembler(text_script(texts)))
+        assert [row[1] for row in index.search_text('\U0010ffff')] == [0, 2]
+        assert [row[1] for row in index.search_text('\ud7ff')] == [1]
+        assert [row[1] for row in index.search_text('\ue000')] == [1]
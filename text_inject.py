@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+_DAT 脚本文本表导出 / 原位写回（不经过 .asm 汇编）
+Usage:
+    python text_inject.py e <脚本文件或目录> <文本表.tsv|.json>
+    python text_inject.py w <文本表.tsv|.json> <脚本文件或目录> [输出文件或目录]
+
+文本表每行以 (file, chunk, segment) 为键，另有 op（助记符，仅供参考）、original（导出时的原文）、text（译文）。
+导出时 text 与 original 相同；写回时只处理 text 与 original 不同的行:
+  - 当前文件中该位置的文本必须仍等于 original，否则视为文本表过期并跳过
+  - 文本以 UTF-16LE 写入对应文本段（TEXT/DEF_CHOICE 为 TEXT_OFFSET 起的整段，MSG_SHOW 系列为 0x48 字节一段），
+    段内其余字节清零；TEXT 指令同时更新 arg1（文本长度）
+  - MSG_SHOW 系列只导出、只允许写入前 arg1 段（游戏与 diasm.py e 都不显示其后的残留文本）
+  - 超出文本段长度的行报错跳过，不截断
+其余字节保持不变。TSV 中的文本按 .asm 的规则转义（\\n、<XXXX> 等）。
+不给输出路径时直接覆盖原文件；输出路径与原路径不同时，没有改动的 *_DAT 文件原样复制，输出为完整的脚本目录。
+单个文件时按文件名匹配文本表中的行，文本表中有多个同名文件时报错，需改用目录。
+"""
+
+import json
+import shutil
+import struct
+import sys
+from pathlib import Path
+
+from diasm import (CHUNK_SIZE, OP_HANDLERS, TEXT_OFFSET, ScriptDisassembler, escape_text,
+                   find_dat_files, find_opcode_by_mnemonic, get_handler, shown_segment_count,
+                   unescape_text)
+
+FIELDS = ('file', 'chunk', 'segment', 'op', 'original', 'text')
+OPCODE_TEXT = find_opcode_by_mnemonic("TEXT")
+
+def script_files(root):
+    """文件 -> {文件名: 路径}；目录 -> {相对路径: 路径}（文本表中的 file 列）"""
+    root = Path(root)
+    if root.is_file():
+        return {root.name: root}
+    return {p.relative_to(root).as_posix(): p for p in find_dat_files(root)}
+
+def collect_texts(rel_path, data):
+    disasm = ScriptDisassembler(data)
+    return [{'file': rel_path, 'chunk': chunk, 'segment': segment, 'op': get_handler(op).mnemonic,
+             'original': text, 'text': text}
+            for chunk, segment, op, text in disasm.iter_texts()]
+
+def save_table(rows, table_path):
+    if str(table_path).endswith('.json'):
+        with open(table_path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=1)
+        return
+    # escape_text 已转义制表符与换行，按行、按制表符切分即可
+    with open(table_path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write('\t'.join(FIELDS) + '\n')
+        for row in rows:
+            f.write(f"{row['file']}\t{row['chunk']}\t{row['segment']}\t{row['op']}\t"
+                    f"{escape_text(row['original'])}\t{escape_text(row['text'])}\n")
+
+def load_table(table_path):
+    if str(table_path).endswith('.json'):
+        with open(table_path, 'r', encoding='utf-8') as f:
+            rows = json.load(f)
+    else:
+        with open(table_path, 'r', encoding='utf-8-sig') as f:
+            lines = [line.rstrip('\r\n') for line in f]
+        header = lines[0].split('\t')
+        rows = []
+        for line in lines[1:]:
+            if not line:
+                continue
+            row = dict(zip(header, line.split('\t')))
+            row['original'] = unescape_text(row['original'])
+            row['text'] = unescape_text(row.get('text', ''))
+            rows.append(row)
+    for row in rows:
+        row['chunk'] = int(row['chunk'])
+        row['segment'] = int(row['segment'])
+    return rows
+
+def text_slot(view, chunk, segment):
+    """返回 (opcode, 文本段起始, 文本段大小)；该指令没有这一段或这一段不显示时抛出 ValueError"""
+    base = chunk * CHUNK_SIZE
+    if chunk < 0 or base + CHUNK_SIZE > len(view):
+        raise ValueError(f"chunk {chunk} 超出文件范围")
+    op, a1 = struct.unpack_from('<Ii', view, base)
+    handler = OP_HANDLERS.get(op)
+    if handler is None or not 0 <= segment < len(handler.segments):
+        raise ValueError(f"chunk {chunk} ({get_handler(op).mnemonic}) 没有文本段 {segment}")
+    if segment >= shown_segment_count(handler, a1):
+        raise ValueError(f"chunk {chunk} ({handler.mnemonic}) 段 {segment} 不显示（arg1={a1}）")
+    off, size = handler.segments[segment]
+    return op, base + TEXT_OFFSET + off, size
+
+def inject_text(view, chunk, segment, text):
+    """把 text 写入 view（可写 memoryview）中的文本段，只改动该段与 TEXT 的 arg1"""
+    op, start, size = text_slot(view, chunk, segment)
+    encoded = text.encode('utf-16-le')
+    if len(encoded) > size:
+        raise ValueError(f"chunk {chunk} 段 {segment}: 文本 {len(encoded) // 2} 字，超出 {size // 2} 字")
+    view[start:start + size] = encoded.ljust(size, b'\x00')
+    if op == OPCODE_TEXT:
+        struct.pack_into('<i', view, chunk * CHUNK_SIZE + 4, len(encoded) // 2)
+
+def inject_file(data, rows):
+    """按文本表修改 data（bytearray），返回 (写入数, [错误信息])"""
+    current = {(chunk, segment): text for chunk, segment, _, text in ScriptDisassembler(data).iter_texts()}
+    view = memoryview(data)
+    written = 0
+    errors = []
+    for row in rows:
+        if row['text'] == row['original']:
+            continue
+        key = (row['chunk'], row['segment'])
+        try:
+            text_slot(view, *key)   # 先报告没有这一段 / 这一段不显示，而不是“原文已变化”
+            if current.get(key, '') == row['text']:
+                continue    # 已写入过
+            if current.get(key, '') != row['original']:
+                errors.append(f"chunk {key[0]} 段 {key[1]}: 原文已变化，文本表可能已过期")
+                continue
+            inject_text(view, row['chunk'], row['segment'], row['text'])
+            written += 1
+        except ValueError as e:
+            errors.append(str(e))
+    view.release()
+    return written, errors
+
+def export_table(root, table_path):
+    rows = []
+    for rel_path, path in sorted(script_files(root).items()):
+        data = path.read_bytes()
+        if len(data) == 0 or len(data) % CHUNK_SIZE != 0:
+            print(f"{rel_path}: 不是脚本文件")
+            continue
+        rows += collect_texts(rel_path, data)
+    save_table(rows, table_path)
+    print(f"文本表: {table_path} ({len(rows)} 行)")
+
+def write_table(table_path, root, output=None):
+    by_file = {}
+    for row in load_table(table_path):
+        by_file.setdefault(row['file'], []).append(row)
+
+    files = script_files(root)
+    single = Path(root).is_file()
+    if single:
+        # 单个文件: 只取文本表中同名文件的行；不同目录下的同名文件无法区分
+        name = Path(root).name
+        matched = sorted(rel for rel in by_file if Path(rel).name == name)
+        if len(matched) > 1:
+            print(f"{name}: 文本表中有多个同名文件 ({', '.join(matched)})，请对目录写回")
+            return False
+        by_file = {name: by_file[rel] for rel in matched}
+    total = failed = 0
+    for rel_path, rows in by_file.items():
+        path = files.get(rel_path)
+        if path is None:
+            print(f"{rel_path}: 文件不存在")
+            failed += len(rows)
+            continue
+        data = bytearray(path.read_bytes())
+        written, errors = inject_file(data, rows)
+        for e in errors:
+            print(f"{rel_path}: {e}")
+        total += written
+        failed += len(errors)
+        if not written and output is None:
+            continue
+
+        if output is None:
+            out_path = path
+        else:
+            out_path = Path(output) if single else Path(output) / rel_path
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_bytes(data)
+
+    if output is not None and Path(output).resolve() != Path(root).resolve():
+        for rel_path, path in files.items():
+            if rel_path in by_file:
+                continue
+            out_path = Path(output) if single else Path(output) / rel_path
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(path, out_path)
+
+    print(f"写入: {total} | 失败: {failed}")
+    return failed == 0
+
+def main():
+    mode = sys.argv[1].lower() if len(sys.argv) > 1 else ''
+
+    if mode == 'e' and len(sys.argv) == 4:
+        export_table(sys.argv[2], sys.argv[3])
+    elif mode == 'w' and len(sys.argv) in (4, 5):
+        output = sys.argv[4] if len(sys.argv) == 5 else None
+        if not write_table(sys.argv[2], sys.argv[3], output):
+            sys.exit(1)
+    else:
+        print(__doc__.strip())
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
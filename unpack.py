@@ -1,9 +1,14 @@
 import os
 import re
+import mmap
+import fnmatch
 import struct
 from pathlib import Path
 import sys
 
+import instrument
+
+@instrument.timed('decompress_cm')
 def decompress_cm(data: bytes, max_output: int = 0) -> bytes:
     """
     解压 'CM' 格式数据。
@@ -105,67 +110,102 @@ def parse_header_file(h_file_path):
     
     return name_mapping
 
-def extract_dat_file(dat_file_path, output_dir):
-    """解包单个.dat文件"""
+def read_dat_index(data):
+    """
+    读取.dat索引表，返回每个成员的 (起始, 结束) 地址列表。
+      - 0x00: uint32 文件数量
+      - 0x04: uint32 数据起始地址/32
+      - 0x08: uint32[文件数量] 各文件结束地址/32
+    第 i 个文件从上一个文件的结束位置开始；起始>=结束 表示无效成员。
+    """
+    if len(data) < 12:
+        raise ValueError("文件太小")
+    
+    file_count, data_start_value = struct.unpack_from('<II', data, 0)
+    if file_count == 0 or file_count > 1000:
+        raise ValueError(f"文件数量异常 ({file_count})")
+    if 8 + file_count * 4 > len(data):
+        raise ValueError("索引表数据不足")
+    
+    members = []
+    current_start = data_start_value * 32
+    for end_value in struct.unpack_from(f'<{file_count}I', data, 8):
+        file_end = end_value * 32
+        members.append((current_start, file_end))
+        current_start = file_end
+    return members
+
+def parse_selector(text):
+    """
+    成员选择器 -> 判断函数 (序号, 名称) -> bool
+      5        序号
+      3-10     序号范围（含两端）
+      *_SNCG   通配符（匹配 .h 中的名称）
+      S1_DAT   .h 中的名称
+    """
+    if text.isdigit():
+        index = int(text)
+        return lambda i, name: i == index
+    m = re.fullmatch(r'(\d+)-(\d+)', text)
+    if m:
+        lo, hi = int(m.group(1)), int(m.group(2))
+        return lambda i, name: lo <= i <= hi
+    if any(c in text for c in '*?['):
+        return lambda i, name: name is not None and fnmatch.fnmatchcase(name, text)
+    return lambda i, name: name == text
+
+def select_members(members, name_mapping, selectors):
+    """按选择器过滤 [(序号, 起始, 结束)]；selectors 为空时全选"""
+    tests = [parse_selector(s) for s in selectors]
+    return [(i, start, end) for i, (start, end) in enumerate(members)
+            if not tests or any(test(i, name_mapping.get(i)) for test in tests)]
+
+@instrument.timed('extract_dat_file')
+def extract_dat_file(dat_file_path, output_dir, selectors=()):
+    """解包单个.dat文件；给出 selectors 时只切出并解压匹配的成员"""
     print(f"处理文件: {dat_file_path}")
     
     with open(dat_file_path, 'rb') as f:
         data = f.read()
     
-    if len(data) < 12:
-        print(f"错误: {dat_file_path} 文件太小")
+    try:
+        members = read_dat_index(data)
+    except ValueError as e:
+        print(f"错误: {dat_file_path} {e}")
         return
     
-    # 读取索引表头部
-    file_count = struct.unpack('<I', data[0:4])[0]
-    data_start_value = struct.unpack('<I', data[4:8])[0]
-    
-    # 计算实际的数据起始地址
-    data_start_address = data_start_value * 32
-    
-    print(f"文件数量: {file_count}")
-    print(f"数据起始地址: 0x{data_start_address:08X} (值: {data_start_value})")
-    
-    if file_count == 0 or file_count > 1000:
-        print(f"错误: 文件数量异常 ({file_count})")
-        return
+    data_start_address = members[0][0]
+    print(f"文件数量: {len(members)}")
+    print(f"数据起始地址: 0x{data_start_address:08X} (值: {data_start_address // 32})")
     
     # 查找对应的.h文件
     base_name = os.path.splitext(dat_file_path)[0]
     h_file_path = base_name + '.h'
     name_mapping = parse_header_file(h_file_path)
     
+    selected = select_members(members, name_mapping, selectors)
+    if selectors:
+        print(f"选中成员: {len(selected)}/{len(members)}")
+        if not selected:
+            print("-" * 70)
+            return
+    
     # 创建输出文件夹
     folder_name = os.path.basename(base_name)
     output_folder = os.path.join(output_dir, folder_name)
     os.makedirs(output_folder, exist_ok=True)
     
-    # 读取文件结束位置索引表
-    end_positions = []
-    for i in range(file_count):
-        offset = 8 + i * 4
-        if offset + 4 <= len(data):
-            end_value = struct.unpack('<I', data[offset:offset+4])[0]
-            end_position = end_value * 32  # 乘以32得到实际地址
-            end_positions.append(end_position)
-        else:
-            print(f"错误: 索引表数据不足")
-            return
-    
+    end_positions = [end for _, end in members]
     print(f"结束位置值: {[pos//32 for pos in end_positions[:10]]}{'...' if len(end_positions) > 10 else ''}")
     
     # 提取文件
     extracted_count = 0
-    current_start = data_start_address
     
-    for i in range(file_count):
-        file_start = current_start
-        file_end = end_positions[i]
+    for i, file_start, file_end in selected:
         file_size = file_end - file_start
         
         if file_start >= len(data) or file_size <= 0:
             print(f"跳过无效文件 {i}: 起始位置 0x{file_start:X}, 结束位置 0x{file_end:X}, 大小 {file_size}")
-            current_start = file_end  # 下一个文件从这个文件的结束位置开始
             continue
         
         if file_end > len(data):
@@ -185,30 +225,27 @@ def extract_dat_file(dat_file_path, output_dir):
         output_path = os.path.join(output_folder, filename)
         try:
             decompressed_data = decompress_cm(file_data)
-            with open(output_path, 'wb') as f:
-                f.write(decompressed_data)
+            with instrument.span('file_write', bytes_out=len(decompressed_data)):
+                with open(output_path, 'wb') as f:
+                    f.write(decompressed_data)
+            instrument.count('members_extracted')
             print(f"  文件 {i:3d}: {filename:<25} (0x{file_start:08X} - 0x{file_end:08X}, {file_size:6d} 字节)")
+            extracted_count += 1
         except Exception as e:
             print(f"  文件 {i:3d}: 解压失败 - {e}")
-            # 可选：保存原始压缩数据
-            # with open(output_path + '.compressed', 'wb') as f:
-            #     f.write(file_data)
-        
-        extracted_count += 1
-        current_start = file_end  # 下一个文件从当前文件的结束位置开始
     
     print(f"完成! 提取了 {extracted_count} 个文件到 {output_folder}")
     print("-" * 70)
 
-def process_all_dat_files(input_dir, output_dir="extracted"):
-    """处理指定文件夹内所有的.dat文件"""
+def process_all_dat_files(input_dir, output_dir="extracted", selectors=()):
+    """处理指定文件夹内所有的.dat文件（也可直接给出单个.dat）"""
     input_path = Path(input_dir)
     
     if not input_path.exists():
         print(f"错误: 输入文件夹 {input_dir} 不存在")
         return
     
-    dat_files = list(input_path.glob("*.dat"))
+    dat_files = [input_path] if input_path.is_file() else list(input_path.glob("*.dat"))
     
     if not dat_files:
         print(f"在 {input_dir} 中没有找到.dat文件")
@@ -219,17 +256,134 @@ def process_all_dat_files(input_dir, output_dir="extracted"):
     
     for dat_file in dat_files:
         try:
-            extract_dat_file(str(dat_file), output_dir)
+            extract_dat_file(str(dat_file), output_dir, selectors)
         except Exception as e:
             print(f"处理 {dat_file} 时出错: {e}")
             continue
 
+CM_HEADER_SIZE = 12
+
+def read_cm_header(buf, offset=0):
+    """读取成员的 CM 头部，返回 (解压后长度, token 区长度)"""
+    if bytes(buf[offset:offset + 2]) != b'CM':
+        raise ValueError("魔数不匹配，期望 'CM'")
+    return struct.unpack_from('<II', buf, offset + 4)
+
+def sniff_magic(buf, start, end, size=4):
+    """
+    只解出成员开头 size 字节（用于识别 SNCG/SNSC 等格式）。
+    开头 size 字节至多用到 size 个 token(2*size 字节) 和 1 个标志字节，
+    拼成一个小的 CM 流交给 decompress_cm，不读取成员其余部分。
+    """
+    out_len, token_len = read_cm_header(buf, start)
+    if out_len == 0:
+        return b''
+    tokens_at = start + CM_HEADER_SIZE
+    flags_at = tokens_at + token_len
+    if flags_at >= end:
+        raise ValueError("数据长度不足：token 区越界")
+    k = min(token_len, 2 * size)
+    mini = (b'CM\x00\x00' + struct.pack('<II', out_len, k)
+            + bytes(buf[tokens_at:tokens_at + k]) + bytes(buf[flags_at:flags_at + 1]))
+    return decompress_cm(mini, min(size, out_len))
+
+def format_magic(magic):
+    if len(magic) == 4 and all(0x20 < c < 0x7F for c in magic):
+        return magic.decode('ascii')
+    return magic.hex()
+
+def inspect_dat_file(dat_file_path):
+    """
+    只读取索引表与各成员的 CM 头部。
+    返回 [(序号, 名称, 起始, 结束, 解压后长度, 魔数)]，无效成员的长度与魔数为 None。
+    """
+    name_mapping = parse_header_file(os.path.splitext(dat_file_path)[0] + '.h')
+    rows = []
+    with open(dat_file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i, (start, end) in enumerate(read_dat_index(mm)):
+            out_len = magic = None
+            if start < end <= len(mm):
+                try:
+                    out_len, _ = read_cm_header(mm, start)
+                    magic = format_magic(sniff_magic(mm, start, end))
+                except (ValueError, struct.error) as e:
+                    magic = f"错误: {e}"
+            rows.append((i, name_mapping.get(i, ''), start, end, out_len, magic))
+    return rows
+
+def verify_member(task):
+    """完整解压一个成员并核对长度，返回 (序号, 错误信息或 None)"""
+    dat_file_path, i, start, end = task
+    try:
+        with open(dat_file_path, 'rb') as f:
+            f.seek(start)
+            member = f.read(end - start)
+        out_len, _ = read_cm_header(member)
+        data = decompress_cm(member)
+        if len(data) != out_len:
+            return i, f"长度 {len(data)} != 头部 {out_len}"
+        return i, None
+    except Exception as e:
+        return i, str(e)
+
+def verify_dat_file(dat_file_path, rows, jobs=0):
+    """多进程完整解压校验，返回 {序号: 错误信息}"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    tasks = [(dat_file_path, i, start, end) for i, _, start, end, out_len, _ in rows if out_len is not None]
+    if len(tasks) < 2 or jobs == 1:
+        results = map(verify_member, tasks)
+        return {i: err for i, err in results if err}
+    with ProcessPoolExecutor(max_workers=jobs or None) as pool:
+        return {i: err for i, err in pool.map(verify_member, tasks, chunksize=8) if err}
+
+def process_inspect(path, verify=False, jobs=0):
+    """列出 .dat（或文件夹内所有 .dat）的成员信息"""
+    target = Path(path)
+    dat_files = sorted(target.glob("*.dat")) if target.is_dir() else [target]
+
+    for dat_file in dat_files:
+        try:
+            rows = inspect_dat_file(str(dat_file))
+        except (OSError, ValueError) as e:
+            print(f"{dat_file}: {e}")
+            continue
+        errors = verify_dat_file(str(dat_file), rows, jobs) if verify else {}
+
+        packed_total = sum(end - start for _, _, start, end, out_len, _ in rows if out_len is not None)
+        raw_total = sum(out_len for *_, out_len, _ in rows if out_len is not None)
+        print(f"{dat_file} ({len(rows)} 个成员, {packed_total} -> {raw_total} 字节)")
+        for i, name, start, end, out_len, magic in rows:
+            if out_len is None and magic is None:
+                print(f"  {i:4d}  {name:<28} (无效: 0x{start:X} - 0x{end:X})")
+                continue
+            size = f"{out_len:8d}" if out_len is not None else f"{'-':>8}"
+            status = ''
+            if verify:
+                status = f"  NG {errors[i]}" if i in errors else "  OK"
+            print(f"  {i:4d}  {name:<28} {end - start:8d} {size}  {magic}{status}")
+        if verify:
+            print(f"  校验: {len(errors)} 个错误")
+
 if __name__ == "__main__":
+    instrument.setup_from_argv()
+    if len(sys.argv) >= 3 and sys.argv[1].lower() == 'inspect':
+        args = sys.argv[2:]
+        verify = '--verify' in args
+        jobs = int(args[args.index('--jobs') + 1]) if '--jobs' in args[:-1] else 0
+        process_inspect(args[0], verify, jobs)
+        sys.exit(0)
+    if len(sys.argv) < 3:
+        print("用法: python unpack.py <输入文件夹或.dat> <输出文件夹> [选择器...]")
+        print("      选择器: 序号(5) / 范围(3-10) / .h名称(S1_DAT) / 通配符(*_SNCG)")
+        print("      python unpack.py inspect <.dat文件或文件夹> [--verify] [--jobs N]")
+        sys.exit(1)
+
     input_directory = sys.argv[1]  # 当前文件夹，你可以修改为包含.dat文件的文件夹路径
     output_directory = sys.argv[2]  # 输出文件夹
     
     print("DAT文件解包工具 (修正版 - 结束位置)")
     print("=" * 70)
     
-    process_all_dat_files(input_directory, output_directory)
+    process_all_dat_files(input_directory, output_directory, sys.argv[3:])
     print("\n解包完成!")
\ No newline at end of file
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+_DAT脚本交叉引用索引 (SQLite)
+Usage:
+    python xref.py build <input_folder> <index.db>
+    python xref.py label <index.db> <label_id>
+    python xref.py flag  <index.db> <flag_id>
+    python xref.py func  <index.db> <func_id>
+    python xref.py file  <index.db> <rel_path>
+    python xref.py find  <index.db> <text>
+"""
+
+import os
+import sys
+import sqlite3
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from diasm import (CHUNK_SIZE, OPCODES, ScriptDisassembler, escape_text,
+                   find_dat_files, find_opcode_by_mnemonic)
+
+# 查询类别 -> 相关指令（均以arg1作为键）
+XREF_KINDS = {
+    'label': ("LABEL", "JUMP"),
+    'func': ("CALL_FUNC",),
+    'flag': ("SET_FLAG", "CLEAR_FLAG", "IF_FLAG"),
+    'cond': ("IF_EQ", "IF_CHECK"),
+}
+
+XREF_OPCODES = tuple(find_opcode_by_mnemonic(m) for names in XREF_KINDS.values() for m in names)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS refs (
+    file_id INTEGER NOT NULL,
+    chunk INTEGER NOT NULL,
+    opcode INTEGER NOT NULL,
+    a1 INTEGER NOT NULL,
+    a2 INTEGER NOT NULL,
+    a3 INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refs_key ON refs(opcode, a1);
+CREATE INDEX IF NOT EXISTS refs_file ON refs(file_id);
+CREATE TABLE IF NOT EXISTS texts (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
+    chunk INTEGER NOT NULL,
+    segment INTEGER NOT NULL,
+    opcode INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS texts_file ON texts(file_id);
+CREATE TABLE IF NOT EXISTS grams (
+    gram TEXT NOT NULL,
+    text_id INTEGER NOT NULL,
+    PRIMARY KEY (gram, text_id)
+) WITHOUT ROWID;
+'''
+
+# IN (...) 每批的参数个数（低于旧版 SQLite 999 个参数的上限）
+QUERY_BATCH = 500
+
+# 文本末尾追加的哨兵，保证每个字符都作为某个二元组的首字出现（单字查询用）
+GRAM_END = '\x00'
+# 最大的码位，单字查询的上界
+GRAM_MAX = '\U0010ffff'
+
+def normalize_text(text: str) -> str:
+    return text.lower()
+
+def text_grams(text: str) -> set:
+    """文本的二元组集合（CJK按字切分，不分词）"""
+    text = normalize_text(text) + GRAM_END
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+class ScriptIndex:
+    def __init__(self, db_path: str):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def remove_script(self, rel_path: str):
+        row = self.conn.execute('SELECT id FROM files WHERE path = ?', (rel_path,)).fetchone()
+        if row is None:
+            return
+        self.conn.execute('DELETE FROM refs WHERE file_id = ?', row)
+        # grams按(gram, text_id)为主键，逐条删除旧文本的二元组
+        old_texts = self.conn.execute('SELECT id, text FROM texts WHERE file_id = ?', row).fetchall()
+        self.conn.executemany('DELETE FROM grams WHERE gram = ? AND text_id = ?',
+                              ((g, text_id) for text_id, text in old_texts for g in text_grams(text)))
+        self.conn.execute('DELETE FROM texts WHERE file_id = ?', row)
+        self.conn.execute('DELETE FROM files WHERE id = ?', row)
+
+    def add_script(self, rel_path: str, disasm: ScriptDisassembler, st: Optional[os.stat_result] = None):
+        """记录一个脚本的引用与文本位置（覆盖同路径的旧记录）"""
+        self.remove_script(rel_path)
+        size = st.st_size if st else len(disasm.data)
+        mtime = st.st_mtime if st else 0.0
+        cur = self.conn.execute('INSERT INTO files (path, size, mtime) VALUES (?, ?, ?)',
+                                (rel_path, size, mtime))
+        file_id = cur.lastrowid
+
+        self.conn.executemany('INSERT INTO refs VALUES (?, ?, ?, ?, ?, ?)',
+                              ((file_id,) + ref for ref in disasm.iter_refs(XREF_OPCODES)))
+        for chunk, segment, opcode, text in disasm.iter_texts():
+            cur = self.conn.execute('INSERT INTO texts (file_id, chunk, segment, opcode, text) VALUES (?, ?, ?, ?, ?)',
+                                    (file_id, chunk, segment, opcode, text))
+            self.conn.executemany('INSERT INTO grams VALUES (?, ?)',
+                                  ((g, cur.lastrowid) for g in text_grams(text)))
+
+    def is_current(self, rel_path: str, st: os.stat_result) -> bool:
+        """索引中的记录是否与文件的大小/修改时间一致"""
+        row = self.conn.execute('SELECT size, mtime FROM files WHERE path = ?', (rel_path,)).fetchone()
+        return row is not None and row[0] == st.st_size and row[1] == st.st_mtime
+
+    def indexed_paths(self) -> List[str]:
+        return [path for path, in self.conn.execute('SELECT path FROM files')]
+
+    def search_text(self, query: str) -> List[Tuple[str, int, int, str]]:
+        """全文检索: [(文件, chunk序号, 段序号, 文本)]"""
+        query = normalize_text(query)
+        if not query:
+            return []
+
+        if len(query) == 1:
+            # 单字: 查所有以该字开头的二元组。二元组定长两字，上界取 该字 + U+10FFFF，
+            # 不构造“下一个字符”（U+10FFFF 没有下一个，U+D7FF 的下一个是代理项）
+            rows = self.conn.execute('SELECT text_id FROM grams WHERE gram BETWEEN ? AND ?',
+                                     (query, query + GRAM_MAX))
+            candidates = {text_id for text_id, in rows}
+        else:
+            posting = []
+            for g in {query[i:i + 2] for i in range(len(query) - 1)}:
+                rows = self.conn.execute('SELECT text_id FROM grams WHERE gram = ?', (g,))
+                posting.append({text_id for text_id, in rows})
+            posting.sort(key=len)
+            candidates = set.intersection(*posting)
+
+        results = []
+        candidates = sorted(candidates)
+        for i in range(0, len(candidates), QUERY_BATCH):
+            batch = candidates[i:i + QUERY_BATCH]
+            rows = self.conn.execute(
+                f'SELECT f.path, t.chunk, t.segment, t.text FROM texts t '
+                f'JOIN files f ON f.id = t.file_id WHERE t.id IN ({",".join("?" * len(batch))})', batch)
+            # 二元组只是候选，需确认连续出现
+            results += [row for row in rows if query in normalize_text(row[3])]
+        results.sort()
+        return results
+
+    def find_refs(self, kind: str, value: int) -> List[Tuple[str, int, str, int, int, int]]:
+        """按类别查询: [(文件, chunk序号, 助记符, arg1, arg2, arg3)]"""
+        opcodes = [find_opcode_by_mnemonic(m) for m in XREF_KINDS[kind]]
+        marks = ','.join('?' * len(opcodes))
+        rows = self.conn.execute(
+            f'SELECT f.path, r.chunk, r.opcode, r.a1, r.a2, r.a3 FROM refs r '
+            f'JOIN files f ON f.id = r.file_id '
+            f'WHERE r.opcode IN ({marks}) AND r.a1 = ? ORDER BY f.path, r.chunk',
+            opcodes + [value])
+        return [(path, chunk, OPCODES[op][0], a1, a2, a3) for path, chunk, op, a1, a2, a3 in rows]
+
+    def file_refs(self, rel_path: str) -> List[Tuple[int, str, int, int, int]]:
+        rows = self.conn.execute(
+            'SELECT r.chunk, r.opcode, r.a1, r.a2, r.a3 FROM refs r '
+            'JOIN files f ON f.id = r.file_id WHERE f.path = ? ORDER BY r.chunk', (rel_path,))
+        return [(chunk, OPCODES[op][0], a1, a2, a3) for chunk, op, a1, a2, a3 in rows]
+
+def update_index(index: ScriptIndex, input_folder: str) -> int:
+    """增量更新：只重建大小/修改时间变化的脚本，并移除已删除的脚本。返回更新的文件数"""
+    input_path = Path(input_folder)
+    seen = set()
+    updated = 0
+
+    for dat_file in find_dat_files(input_path):
+        rel_path = dat_file.relative_to(input_path)
+        key = rel_path.as_posix()
+        seen.add(key)
+        st = dat_file.stat()
+        if index.is_current(key, st):
+            continue
+
+        with open(dat_file, 'rb') as f:
+            data = f.read()
+
+        if len(data) == 0 or len(data) % CHUNK_SIZE != 0:
+            print(f"{rel_path}")
+            index.remove_script(key)
+            continue
+
+        index.add_script(key, ScriptDisassembler(data), st)
+        updated += 1
+
+    for key in index.indexed_paths():
+        if key not in seen:
+            index.remove_script(key)
+
+    index.conn.commit()
+    return updated
+
+def build_index(input_folder: str, db_path: str):
+    with ScriptIndex(db_path) as index:
+        update_index(index, input_folder)
+
+def main():
+    if len(sys.argv) != 4:
+        print(__doc__.strip())
+        sys.exit(1)
+
+    mode = sys.argv[1].lower()
+
+    if mode == 'build':
+        build_index(sys.argv[2], sys.argv[3])
+    elif mode in XREF_KINDS:
+        with ScriptIndex(sys.argv[2]) as index:
+            for path, chunk, mnemonic, a1, a2, a3 in index.find_refs(mode, int(sys.argv[3])):
+                print(f"{path}:{chunk} {mnemonic} {a1} {a2} {a3}")
+    elif mode == 'find':
+        with ScriptIndex(sys.argv[2]) as index:
+            for path, chunk, segment, text in index.search_text(sys.argv[3]):
+                print(f"{path}:{chunk}:{segment} {escape_text(text)}")
+    elif mode == 'file':
+        with ScriptIndex(sys.argv[2]) as index:
+            for chunk, mnemonic, a1, a2, a3 in index.file_refs(sys.argv[3]):
+                print(f"{chunk} {mnemonic} {a1} {a2} {a3}")
+    else:
+        print(f"Invalid mode: {mode}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()